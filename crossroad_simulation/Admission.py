@@ -0,0 +1,242 @@
+import math
+import multiprocessing
+from collections import deque
+
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.Transport import TransportEmpty, TransportFull
+from crossroad_simulation.Vehicle import Vehicle
+
+POLICIES = ["drop-newest", "drop-oldest", "spill", "block"]
+COUNTERS = ["accepted", "dropped", "spilled", "blocked"]
+ACCEPTED, DROPPED, SPILLED, BLOCKED = range(len(COUNTERS))
+ADMIT, EVICT, HOLD, DROP = range(4)  # Decisions of the admission of a vehicle
+MAX_VEHICLES_IN_QUEUE = 5  # Maximum queue size per direction
+SPILL_CAPACITY = 8  # Vehicles a generator holds per direction with the 'spill' policy
+DIRECTIONS = list(Direction)
+
+
+class Admission:
+	"""
+	Admission control of the traffic queues, shared by the generators and the Coordinator.
+	A normal vehicle arriving at a full queue is handled by the policy:
+	- drop-newest: the arriving vehicle is dropped.
+	- drop-oldest: the oldest normal vehicle of the queue is dropped to make room.
+	- spill: the generator holds the vehicle in a bounded local buffer and retries at the next ticks, dropping it when the buffer is full.
+	- block: the generator holds the vehicle and draws no arrival until it entered the queue.
+	Priority vehicles are never dropped nor evicted, they enter the queue over its capacity.
+
+	The capacity check and the send happen under a lock shared with the Coordinator's receive, so concurrent generators cannot overfill a queue.
+	The counters are exact: every vehicle offered is either accepted, dropped or still held by its generator,
+	and a vehicle evicted by drop-oldest is moved from accepted to dropped.
+	"""
+
+	def __init__(self, policy="drop-newest", capacity=MAX_VEHICLES_IN_QUEUE, spill_capacity=SPILL_CAPACITY):
+		"""
+		Creates the shared lock and counters.
+
+		:param policy: One of POLICIES.
+		:param capacity: Normal vehicles a queue holds.
+		:param spill_capacity: Vehicles a generator holds per direction with the 'spill' policy.
+		:raises ValueError: If the policy or a capacity is invalid.
+		"""
+		if policy not in POLICIES:
+			raise ValueError(f"Unknown admission policy: {policy}, expected one of {POLICIES}")
+		if capacity < 1 or spill_capacity < 0:
+			raise ValueError(f"Invalid admission capacities: queue {capacity}, spill {spill_capacity}")
+		self.policy = policy
+		self.capacity = capacity
+		self.spill_capacity = spill_capacity
+		self.lock = multiprocessing.Lock()
+		self.counters = multiprocessing.Array("q", len(DIRECTIONS) * len(COUNTERS), lock=False)
+
+	@property
+	def hold_capacity(self):
+		"""
+		:return: Vehicles a generator holds per direction, it draws no arrival while it holds one with the 'block' policy.
+		"""
+		return {"spill": self.spill_capacity, "block": 1}.get(self.policy, 0)
+
+	def count(self, direction: Direction, counter: int, delta=1):
+		"""
+		Updates a counter, the caller holds the lock.
+
+		:param direction: Direction of the queue.
+		:param counter: Index of the counter, see COUNTERS.
+		:param delta: Value added to the counter.
+		"""
+		self.counters[DIRECTIONS.index(direction) * len(COUNTERS) + counter] += delta
+
+	def totals(self):
+		"""
+		:return: Dictionary of the counters of each direction.
+		"""
+		with self.lock:
+			values = list(self.counters)
+		return {direction: dict(zip(COUNTERS, values[index * len(COUNTERS):(index + 1) * len(COUNTERS)])) for index, direction in enumerate(DIRECTIONS)}
+
+	def decide(self, vehicle: Vehicle, depth: int, held, hold_capacity) -> int:
+		"""
+		Applies the policy to an arriving vehicle.
+
+		:param vehicle: Arriving vehicle.
+		:param depth: Vehicles waiting in its queue.
+		:param held: Vehicles of the same direction already held, a normal vehicle cannot overtake them.
+		:param hold_capacity: Vehicles that may be held.
+		:return: ADMIT, EVICT, HOLD or DROP.
+		"""
+		if vehicle.type == "priority" or (not held and depth < self.capacity):
+			return ADMIT
+		if self.policy == "drop-oldest":
+			return EVICT
+		return HOLD if len(held) < hold_capacity else DROP
+
+	def offer(self, transport, vehicle: Vehicle, held: deque):
+		"""
+		Offers a vehicle of a generator to its queue.
+
+		:param transport: Transport of the queue.
+		:param vehicle: Arriving vehicle.
+		:param held: Vehicles of the direction held by the generator.
+		:return: True if the vehicle entered the queue.
+		"""
+		with self.lock:
+			decision = self.decide(vehicle, transport.depth(), held, self.hold_capacity)
+			if decision == EVICT:
+				decision = ADMIT if self.evict(transport) else DROP
+			if decision == ADMIT:
+				return self.send(transport, vehicle, held)
+			if decision == HOLD:
+				held.append(vehicle)
+				self.count(vehicle.source, SPILLED)
+			else:
+				self.count(vehicle.source, DROPPED)
+			return False
+
+	def send(self, transport, vehicle: Vehicle, held: deque, retry=False):
+		"""
+		Sends an admitted vehicle, the caller holds the lock.
+		A vehicle the transport itself cannot take is held if it is a priority vehicle or a retry, dropped otherwise.
+
+		:param transport: Transport of the queue.
+		:param vehicle: Admitted vehicle.
+		:param held: Vehicles of the direction held by the generator.
+		:param retry: Whether the vehicle comes from the front of held.
+		:return: True if the vehicle entered the queue.
+		"""
+		try:
+			transport.send(str(vehicle).encode(), block=False)
+		except TransportFull:
+			if retry:
+				held.appendleft(vehicle)
+			elif vehicle.type == "priority":
+				held.append(vehicle)
+				self.count(vehicle.source, SPILLED)
+			else:
+				self.count(vehicle.source, DROPPED)
+			return False
+		self.count(vehicle.source, ACCEPTED)
+		return True
+
+	def evict(self, transport):
+		"""
+		Drops the oldest normal vehicle of a queue, the caller holds the lock.
+
+		:param transport: Transport of the queue.
+		:return: True if a vehicle was evicted, False if the queue only holds priority vehicles.
+		"""
+		messages = []
+		try:
+			while True:
+				messages.append(transport.receive(block=False))
+		except TransportEmpty:
+			pass
+		vehicles = [Vehicle.str_to_vehicle(message.decode()) for message in messages]
+		index = next((index for index, vehicle in enumerate(vehicles) if vehicle.type != "priority"), None)
+		if index is not None:
+			del messages[index]
+			self.count(vehicles[index].source, ACCEPTED, -1)
+			self.count(vehicles[index].source, DROPPED)
+		for message in messages:
+			transport.send(message, block=False)
+		return index is not None
+
+	def retry(self, traffic_queues, held):
+		"""
+		Sends the vehicles a generator holds, oldest first, while their queue has room.
+
+		:param traffic_queues: Dictionary of Transport instances for each direction.
+		:param held: Dictionary of the vehicles held by the generator for each direction.
+		:return: True if the generator must not draw an arrival this tick, i.e. it still holds a vehicle with the 'block' policy.
+		"""
+		blocked = False
+		with self.lock:
+			for direction, vehicles in held.items():
+				while vehicles and (vehicles[0].type == "priority" or traffic_queues[direction].depth() < self.capacity):
+					if not self.send(traffic_queues[direction], vehicles.popleft(), vehicles, retry=True):
+						break
+				if vehicles and self.policy == "block":
+					self.count(direction, BLOCKED)
+					blocked = True
+		return blocked
+
+	def receive(self, transport):
+		"""
+		Receives the first vehicle of a queue for the Coordinator.
+
+		:param transport: Transport of the queue.
+		:return: Message of the vehicle.
+		:raises TransportEmpty: If the queue is empty.
+		"""
+		with self.lock:
+			return transport.receive(block=False)
+
+	def replay(self, direction: Direction, arrivals: deque, waiting: deque, held: deque, tick: int):
+		"""
+		Admits the arrivals of a tick to a queue replayed by the Coordinator when macro-stepping.
+		The generators drew the arrivals ahead and cannot stop, so the 'block' policy holds them without bound.
+
+		:param direction: Direction of the queue.
+		:param arrivals: Arrivals of the direction stamped with their tick, the ones of the tick are consumed.
+		:param waiting: Vehicles of the replayed queue.
+		:param held: Vehicles of the direction held back by the policy.
+		:param tick: Tick to replay.
+		"""
+		hold_capacity = math.inf if self.policy == "block" else self.hold_capacity
+		with self.lock:
+			while held and (held[0].type == "priority" or len(waiting) < self.capacity):
+				waiting.append(held.popleft())
+				self.count(direction, ACCEPTED)
+			if held and self.policy == "block":
+				self.count(direction, BLOCKED)
+			while arrivals and (arrivals[0].tick is None or arrivals[0].tick <= tick):
+				vehicle = arrivals.popleft()
+				decision = self.decide(vehicle, len(waiting), held, hold_capacity)
+				if decision == EVICT:
+					oldest = next((queued for queued in waiting if queued.type != "priority"), None)
+					decision = DROP if oldest is None else ADMIT
+					if oldest is not None:
+						waiting.remove(oldest)
+						self.count(direction, ACCEPTED, -1)
+						self.count(direction, DROPPED)
+				if decision == ADMIT:
+					waiting.append(vehicle)
+					self.count(direction, ACCEPTED)
+				elif decision == HOLD:
+					held.append(vehicle)
+					self.count(direction, SPILLED)
+				else:
+					self.count(direction, DROPPED)
+
+	def command(self, line: str) -> str:
+		"""
+		Applies a textual control command: 'status'.
+
+		:param line: Command line without its 'admission' prefix.
+		:return: Reply with the counters of each direction.
+		:raises ValueError: If the command is unknown.
+		"""
+		command = line.strip() or "status"
+		if command == "status":
+			counters = " ".join(f"{direction.value}:" + ",".join(f"{name}={value}" for name, value in totals.items()) for direction, totals in self.totals().items())
+			return f"policy={self.policy} capacity={self.capacity} {counters}"
+		raise ValueError(f"Unknown admission command: {command}")
@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import pickle
+import zlib
+
+VERSION = 3  # 3: the traffic lights store the phase countdown left after the checkpointed step
+PARTIES = 4  # TrafficLights, both traffic generators and the Coordinator
+
+
+def save(path, checkpoint: dict):
+	"""
+	Writes a checkpoint atomically in a compressed pickle file.
+
+	:param path: Path of the checkpoint file.
+	:param checkpoint: Checkpoint dictionary, as assembled by the Coordinator.
+	"""
+	temporary_path = f"{path}.tmp"
+	with open(temporary_path, "wb") as file:
+		file.write(zlib.compress(pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL), 1))
+	os.replace(temporary_path, path)
+
+
+def load(path) -> dict:
+	"""
+	Reads a checkpoint file written by save.
+
+	:param path: Path of the checkpoint file.
+	:return: Checkpoint dictionary.
+	:raises ValueError: If the file was written by an incompatible version.
+	"""
+	with open(path, "rb") as file:
+		checkpoint = pickle.loads(zlib.decompress(file.read()))
+	if checkpoint.get("version") != VERSION:
+		raise ValueError(f"Unsupported checkpoint version: {checkpoint.get('version')}")
+	return checkpoint
+
+
+class Checkpointer:
+	"""
+	Takes full-state checkpoints of the simulation at tick boundaries.
+	- Every component calls contribute() at the start of next() on checkpoint ticks,
+	  which parks it on a barrier until the Coordinator has written the file.
+	- The Coordinator adds its own state, the SysV queue contents and the lights, then saves.
+	"""
+
+	def __init__(self, manager, directory, interval, params=None, start_tick=0, parties=PARTIES):
+		"""
+		Initialize the checkpointer.
+
+		:param manager: multiprocessing.Manager used to share the component states.
+		:param directory: Directory of the checkpoint files.
+		:param interval: Number of ticks between two checkpoints, 0 to disable them.
+		:param params: Simulation parameters stored along the state, to resume with the same ones.
+		:param start_tick: Tick the simulation starts or resumes at, no checkpoint is taken at it.
+		:param parties: Number of components taking part in a checkpoint.
+		"""
+		self.directory = directory
+		self.interval = interval
+		self.params = dict(params or {})
+		self.start_tick = start_tick
+		self.parts = manager.dict()
+		self.barrier = multiprocessing.Barrier(parties)
+		os.makedirs(directory, exist_ok=True)
+
+	def due(self, tick: int) -> bool:
+		"""
+		:param tick: Current tick of the caller.
+		:return: True if a checkpoint must be taken at this tick.
+		"""
+		return self.interval > 0 and tick > self.start_tick and tick % self.interval == 0
+
+	def horizon(self, tick: int) -> int:
+		"""
+		:param tick: First tick of a step.
+		:return: Number of ticks from this tick up to the next checkpoint tick included.
+		"""
+		due = max(tick, self.start_tick + 1)
+		due += -due % self.interval
+		return due - tick + 1
+
+	def path(self, tick: int):
+		"""
+		:param tick: Tick of the checkpoint.
+		:return: Path of the checkpoint file of this tick.
+		"""
+		return os.path.join(self.directory, f"checkpoint_{tick:010d}.ckpt")
+
+	def contribute(self, component: str, state: dict):
+		"""
+		Publishes the state of a component and waits until the checkpoint is written.
+
+		:param component: Name of the component.
+		:param state: Picklable state of the component.
+		"""
+		self.parts[component] = state
+		self.barrier.wait()
+		self.barrier.wait()
+
+	def collect(self, component: str, state: dict, assemble):
+		"""
+		Called by the Coordinator: waits for the other components, then writes the checkpoint.
+
+		:param component: Name of the Coordinator component.
+		:param state: State of the Coordinator.
+		:param assemble: Callable returning the rest of the checkpoint (queues, lights...) while everyone is parked.
+		:return: Path of the written checkpoint.
+		"""
+		self.parts[component] = state
+		self.barrier.wait()
+		try:
+			checkpoint = assemble()
+			checkpoint["version"] = VERSION
+			checkpoint["params"] = self.params
+			checkpoint["components"] = dict(self.parts)
+			path = self.path(state["tick"])
+			save(path, checkpoint)
+		finally:
+			self.barrier.wait()
+		return path
@@ -0,0 +1,115 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+POLL_DELAY = 0.0005  # Seconds between two checks of the snapshot ring for the first tick
+FIELDS = ["date", "start_method", "run", "import_s", "first_tick_s", "warm_first_tick_s"]
+
+
+def first_tick(manager):
+	"""
+	Starts a headless simulation and stops it once its first tick was published.
+
+	:param manager: multiprocessing.Manager of the simulation.
+	:return: Wall-clock time of the first published snapshot.
+	"""
+	from crossroad_simulation.Simulation import Simulation
+	from crossroad_simulation.TimeManager import TimeManager
+
+	simulation = Simulation(manager, TimeManager("afap", 0), display=False)
+	simulation.start()
+	try:
+		snapshot = simulation.coordinator.snapshots.latest()
+		while snapshot is None:
+			time.sleep(POLL_DELAY)
+			snapshot = simulation.coordinator.snapshots.latest()
+	finally:
+		simulation.stop()
+		simulation.close()
+	return snapshot.timestamp
+
+
+def measure(start_method: str, launched: float):
+	"""
+	Child side of the benchmark: starts two headless simulations in a row and reports when their first tick was published.
+	The second one is what every later run of a long-lived launcher pays, e.g. the forkserver is already up.
+
+	:param start_method: Start method of the simulation processes.
+	:param launched: Wall-clock time the child interpreter was launched at.
+	:return: Dictionary of the seconds from the launch to the end of the imports and to the first published snapshot,
+	and from the creation of the second simulation to its first published snapshot.
+	"""
+	from crossroad_simulation.Simulation import set_start_method
+
+	imported = time.time()
+	set_start_method(start_method)
+
+	with multiprocessing.Manager() as manager:
+		cold = first_tick(manager)
+		created = time.time()
+		warm = first_tick(manager)
+	return {"import_s": imported - launched, "first_tick_s": cold - launched, "warm_first_tick_s": warm - created}
+
+
+def launch(start_method: str):
+	"""
+	Runs one cold start in a fresh interpreter.
+
+	:param start_method: Start method of the simulation processes.
+	:return: Measures of the child, see measure().
+	"""
+	command = [sys.executable, "-m", "crossroad_simulation.ColdStart", "--child", start_method, str(time.time())]
+	output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+	return json.loads(output.splitlines()[-1])
+
+
+def benchmark(start_methods, runs: int, output=None):
+	"""
+	Measures the cold start of each start method, appending every run to a CSV file so it can be tracked over time.
+
+	:param start_methods: Start methods to measure.
+	:param runs: Number of cold starts per start method.
+	:param output: CSV file the runs are appended to, None to skip it.
+	:return: Dictionary of the list of measures per start method.
+	"""
+	results = {start_method: [] for start_method in start_methods}
+	date = time.strftime("%Y-%m-%dT%H:%M:%S")
+	for run in range(runs):
+		for start_method in start_methods:
+			results[start_method].append(launch(start_method))
+
+	if output is not None:
+		new = not os.path.exists(output)
+		with open(output, "a", newline="") as file:
+			writer = csv.DictWriter(file, fieldnames=FIELDS)
+			if new:
+				writer.writeheader()
+			for start_method, measures in results.items():
+				writer.writerows({"date": date, "start_method": start_method, "run": run, **measure} for run, measure in enumerate(measures))
+	return results
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Cold start to first tick of a headless simulation per process start method.")
+	parser.add_argument("--runs", type=int, default=10, help="Cold starts per start method.")
+	parser.add_argument("--output", default="coldstart.csv", help="CSV file the runs are appended to.")
+	parser.add_argument("--child", nargs=2, metavar=("START_METHOD", "LAUNCHED"), help=argparse.SUPPRESS)
+	parser.add_argument("start_methods", nargs="*", default=multiprocessing.get_all_start_methods(), help="Start methods to measure.")
+	args = parser.parse_args()
+
+	if args.child:
+		print(json.dumps(measure(args.child[0], float(args.child[1]))))
+		raise SystemExit
+
+	print(f"{'method':<11} {'import p50':>11} {'first tick p50':>15} {'first tick max':>15} {'warm p50':>11}")
+	for start_method, measures in benchmark(args.start_methods, args.runs, args.output).items():
+		imports = [measure["import_s"] * 1000 for measure in measures]
+		first_ticks = [measure["first_tick_s"] * 1000 for measure in measures]
+		warm_ticks = [measure["warm_first_tick_s"] * 1000 for measure in measures]
+		print(f"{start_method:<11} {statistics.median(imports):>9.1f}ms {statistics.median(first_ticks):>13.1f}ms {max(first_ticks):>13.1f}ms {statistics.median(warm_ticks):>9.1f}ms")
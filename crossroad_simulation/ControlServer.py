@@ -0,0 +1,120 @@
+import argparse
+import os
+import socket
+import sys
+import threading
+
+from crossroad_simulation.RunRegistry import DEFAULT_DIRECTORY, find_socket
+
+DEFAULT_PATH = "/tmp/crossroad_control.sock"
+BUFFERSIZE = 1024
+
+
+class ControlServer(threading.Thread):
+	"""
+	Control channel of a running simulation.
+	Listens on a Unix domain socket and dispatches each received line '<target> <command...>'
+	to the handler registered for <target>, then sends the handler's reply back.
+	"""
+
+	def __init__(self, path=DEFAULT_PATH, handlers=None):
+		"""
+		Initialize the control server.
+
+		:param path: Path of the Unix domain socket.
+		:param handlers: Dictionary of callables taking the rest of the command line and returning a reply.
+		"""
+		super().__init__(daemon=True)
+		self.path = path
+		self.handlers = dict(handlers or {})
+		self.server_socket = None
+
+	def register(self, target, handler):
+		"""
+		Registers the handler of a command target.
+
+		:param target: First word of the commands handled.
+		:param handler: Callable taking the rest of the command line and returning a reply.
+		"""
+		self.handlers[target] = handler
+
+	def dispatch(self, line: str) -> str:
+		"""
+		Executes a single command line.
+
+		:param line: Command line.
+		:return: Reply of the handler, or an error message.
+		"""
+		target, _, command = line.strip().partition(" ")
+		if target not in self.handlers:
+			return f"error: unknown target '{target}', expected one of {sorted(self.handlers)}"
+		try:
+			return str(self.handlers[target](command))
+		except (ValueError, IndexError) as e:
+			return f"error: {e}"
+		except Exception as e:
+			# Any failure of a handler is reported to the client, the server thread must outlive it
+			return f"error: {type(e).__name__}: {e}"
+
+	def run(self):
+		"""
+		Serves control connections until the process exits.
+		"""
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as self.server_socket:
+			self.server_socket.bind(self.path)
+			self.server_socket.listen(1)
+			while True:
+				conn, _ = self.server_socket.accept()
+				try:
+					with conn, conn.makefile("rw") as stream:
+						for line in stream:
+							if line.strip():
+								stream.write(self.dispatch(line) + "\n")
+								stream.flush()
+				except OSError:
+					pass  # The client went away before reading its reply, e.g. BrokenPipeError
+
+	def close(self):
+		"""
+		Removes the socket file.
+		"""
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+
+
+def send_command(line: str, path=DEFAULT_PATH) -> str:
+	"""
+	Sends a command to a running ControlServer.
+
+	:param line: Command line, e.g. 'clock factor 10'.
+	:param path: Path of the Unix domain socket.
+	:return: Reply of the server.
+	"""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+		client_socket.connect(path)
+		client_socket.sendall((line.strip() + "\n").encode())
+		reply = b""
+		while not reply.endswith(b"\n"):
+			data = client_socket.recv(BUFFERSIZE)
+			if not data:
+				break
+			reply += data
+	return reply.decode().strip()
+
+
+if __name__ == "__main__":
+	# Usage: python -m crossroad_simulation.ControlServer [--run RUN_ID] clock factor 10
+	parser = argparse.ArgumentParser(description="Sends a command to a running simulation.")
+	parser.add_argument("--run", help="ID of the run, may be omitted when a single run is alive.")
+	parser.add_argument("--run-dir", default=DEFAULT_DIRECTORY, help="Directory of the run registry.")
+	parser.add_argument("--path", help="Path of the control socket, instead of looking the run up.")
+	parser.add_argument("command", nargs=argparse.REMAINDER, help="Command, e.g. 'clock factor 10'.")
+	args = parser.parse_args()
+
+	try:
+		path = args.path or find_socket("control", args.run, args.run_dir)
+	except ValueError as e:
+		sys.exit(f"error: {e}")
+	print(send_command(" ".join(args.command), path))
@@ -2,64 +2,144 @@ import multiprocessing
 import os
 import random
 import signal
-import socket
-import threading
 import time
-import sysv_ipc
+from collections import deque
 
 from typing import Dict, List
+from crossroad_simulation.Admission import Admission
 from crossroad_simulation.Vehicle import Vehicle
 from crossroad_simulation.Direction import Direction
+from crossroad_simulation.EventLog import EventLog, DEBUG, OFF, handle_termination
 from crossroad_simulation.LightColor import LightColor
+from crossroad_simulation.Profiler import NullProfiler
+from crossroad_simulation.SnapshotRing import SnapshotRing
 from crossroad_simulation.TimeManager import TimeManager
 from crossroad_simulation.TimeManipulator import TimeManipulator
+from crossroad_simulation.Transport import TransportEmpty
 
-HOST = "localhost"
-PORT = 14750
+DRAIN_DELAY = 0.001  # Seconds between two drains of the transports while waiting for the generators of a macro-step
 
 
 class Coordinator(multiprocessing.Process, TimeManipulator):
     """
     Manages vehicle movement at the intersection.
-    - Uses SysV message queues for inter-process communication.
+    - Receives the vehicles through the Transport of each direction (SysV message queues by default), under the admission control.
+    - Stops taking vehicles from a queue while its road is full, so the backpressure reaches the generators.
     - Handles normal traffic based on traffic light rules.
     - Detects priority vehicles and signals the traffic lights immediately.
+    - Publishes the state of the crossroad every tick in a shared memory SnapshotRing, and in an optional display channel.
+    - Assembles and writes the full-state checkpoints of the simulation.
+    - When macro-stepping, replays every tick of the agreed step from the arrivals stamped by the generators.
+    - Reads the SignalSchedule of the traffic lights to anticipate their next phase change.
     """
+    COMPONENT = "coordinator"
 
-    def __init__(self, coordinator_event: multiprocessing.Event, lights_event: multiprocessing.Event, lights_state: dict, light_pid: int, traffic_queues, traffic_generators, time_manager: TimeManager = TimeManager("auto", 0)) -> None:
+    def __init__(self, tick_barrier: multiprocessing.Barrier, lights_event: multiprocessing.Event, lights_state: dict, light_pid, traffic_queues, traffic_generators, time_manager: TimeManager = None, seed=None, checkpointer=None, profiler=None, stats=None, event_log: EventLog = EventLog(level=OFF), display_channel=None, macro_step=None, admission=None, road_capacity=0, schedule=None) -> None:
         """
-        Initialize the coordinator with SysV message queues and traffic lights.
+        Initialize the coordinator with the traffic transports and traffic lights.
 
-        :param coordinator_event: Event to coordinate with the main process.
+        :param tick_barrier: Barrier every component waits on at the end of a tick.
         :param lights_event: Event to signal traffic light changes.
         :param lights_state: Dictionary representing the state of the traffic lights.
-        :param light_pid: Process ID of the traffic lights process.
-        :param traffic_queues: Dictionary of message queues for each direction.
+        :param light_pid: Shared multiprocessing.Value of the process ID of the traffic lights, published once they handle signals.
+        :param traffic_queues: Dictionary of Transport instances for each direction.
         :param traffic_generators: List of traffic generator events.
-        :param time_manager: Instance of TimeManager to manage simulation time.
+        :param time_manager: Instance of TimeManager to manage simulation time, an "auto" clock if None.
+        :param seed: Seed of the random generator of the process, None to keep the inherited one.
+        :param checkpointer: Optional Checkpointer writing full-state checkpoints.
+        :param profiler: Optional Profiler recording the spans of the process.
+        :param stats: Optional AcceptStats counting the accepted vehicles and their queueing latency.
+        :param event_log: EventLog receiving the structured events of the coordinator.
+        :param display_channel: Optional SnapshotChannel carrying the snapshots to the display instead of the ring.
+        :param macro_step: Optional MacroStep letting the components advance several ticks per synchronization.
+        :param admission: Admission control of the traffic queues shared with the generators, a 'drop-newest' one if None.
+        :param road_capacity: Vehicles a road holds before the coordinator stops taking vehicles from its queue, 0 for unbounded roads.
+        :param schedule: Optional SignalSchedule followed by the traffic lights outside of the priority phases.
         """
         super().__init__()
         self.traffic_generators = traffic_generators
-        self.time_manager = time_manager
-        self.coordinator_event = coordinator_event
+        self.time_manager = time_manager if time_manager is not None else TimeManager("auto", 0)
+        self.tick_barrier = tick_barrier
         self.lights_event = lights_event
         self.lights_state = lights_state
         self.light_pid = light_pid
         self.roads: Dict[Direction, List[Vehicle]] = {direction: [] for direction in Direction}
-        self.roads_queue = multiprocessing.Queue()
+        self.tick = 0
+        self.snapshots = SnapshotRing()
+        self.display_channel = display_channel
         self.traffic_queues = traffic_queues
-        self.thread = threading.Thread(target=self.send_updates_to_display, daemon=True)
-        self.thread.start()
+        self.seed = seed
+        self.checkpointer = checkpointer
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        self.stats = stats
+        self.log_debug = event_log.emitter(self.COMPONENT, DEBUG)
+        self.macro_step = macro_step
+        self.admission = admission if admission is not None else Admission()
+        self.road_capacity = road_capacity
+        self.schedule = schedule
+        self.step = 1
+        self.arrivals = {direction: deque() for direction in Direction}
+        self.waiting = {direction: deque() for direction in Direction}
+        self.held = {direction: deque() for direction in Direction}
+        self.random_state = None
+        self.resumed = False
 
     def run(self):
         """
         Main loop that processes traffic from all directions.
         """
+        handle_termination()
+        self.init_random()
+        if self.resumed:
+            self.next()
+
         while True:
+            if self.macro_step is None:
+                self.run_tick()
+            else:
+                self.run_macro_step()
+
+    def run_tick(self):
+        """
+        Runs a single tick, taking the vehicles straight from the transports.
+        """
+        with self.profiler.span("accept"):
             self.accept_traffic()
+        with self.profiler.span("move"):
             self.move_vehicle()
-            self.roads_queue.put(self.roads)
-            self.next()
+        with self.profiler.span("publish"):
+            self.publish(self.tick, self.lights_state.copy())
+        self.next()
+
+    def run_macro_step(self):
+        """
+        Runs every tick of the agreed step from the arrivals of the step, the lights holding their state during the step.
+        """
+        with self.profiler.span("accept"):
+            self.receive_traffic()
+        with self.profiler.span("wait lights"):
+            self.lights_event.wait()
+        self.lights_event.clear()
+        lights_state = self.lights_state.copy()
+        step = self.step
+        for tick in range(self.tick, self.tick + step):
+            with self.profiler.span("move"):
+                self.admit_traffic(tick)
+                self.cross_intersection(tick, lights_state)
+            with self.profiler.span("publish"):
+                self.publish(tick, lights_state)
+        self.next(step)
+
+    def publish(self, tick, lights_state):
+        """
+        Publishes the state of the crossroad at a tick.
+
+        :param tick: Tick of the snapshot.
+        :param lights_state: Copy of the lights state during the tick.
+        """
+        self.snapshots.publish(tick, lights_state, self.roads)
+        if self.display_channel is not None:
+            self.display_channel.publish(tick, lights_state, self.roads)
 
     def next(self, unit=1):
         """
@@ -67,92 +147,211 @@ class Coordinator(multiprocessing.Process, TimeManipulator):
 
         :param unit: Number of time units to advance.
         """
-        self.coordinator_event.set()
-        self.time_manager.sleep(unit)
-        self.lights_event.wait()
-        for traffic in self.traffic_generators:
-            traffic.wait()
-        self.coordinator_event.clear()
+        self.tick += unit - 1
+        self.profiler.poll(self.COMPONENT)
+        if self.checkpointer is not None and self.checkpointer.due(self.tick):
+            with self.profiler.span("checkpoint"):
+                self.checkpointer.collect(self.COMPONENT, self.get_state(), self.assemble_checkpoint)
+        if self.macro_step is not None:
+            self.macro_step.propose(self.COMPONENT, self.tick + 1, self.horizon(unit))
+        with self.profiler.span("sleep"):
+            self.time_manager.sleep(unit)
+        with self.profiler.span("wait tick"):
+            self.tick_barrier.wait()
+        self.tick += 1
+        if self.macro_step is not None:
+            self.step = self.macro_step.agree()
+
+    def horizon(self, unit=1):
+        """
+        Holds the next step to a single tick while a priority vehicle is waiting, since it may cross and end the priority phase at any tick,
+        and otherwise to the next phase change of the schedule.
+
+        :param unit: Number of time units of the step being finished.
+        :return: Number of ticks of the next step the coordinator accepts.
+        """
+        for queues in (self.roads, self.waiting, self.held, self.arrivals):
+            if any(vehicle.type == "priority" for vehicles in queues.values() for vehicle in vehicles):
+                return 1
+        if self.schedule is not None:
+            return self.schedule.remaining(self.tick + 1)
+        return super().horizon(unit)
+
+    def get_state(self):
+        """
+        Captures the roads and random state at a tick boundary.
+
+        :return: Picklable state of the coordinator.
+        """
+        roads = {direction.value: [(vehicle.type, vehicle.destination.value) for vehicle in vehicles] for direction, vehicles in self.roads.items()}
+        return {"tick": self.tick, "roads": roads, "random": random.getstate()}
+
+    def restore_state(self, state):
+        """
+        Restores a state captured by get_state, must be called before the process starts.
+
+        :param state: State of the coordinator.
+        """
+        self.tick = state["tick"]
+        self.roads = {Direction(source): [Vehicle(vehicle_type, Direction(source), Direction(destination)) for vehicle_type, destination in vehicles] for source, vehicles in state["roads"].items()}
+        self.random_state = state["random"]
+        self.resumed = True
+
+    def assemble_checkpoint(self):
+        """
+        Captures the shared parts of the simulation while every component is parked on the checkpoint barrier.
+
+        The vehicles held by the macro-step replay are put back first, as they are still waiting in their queue or at their generator.
+
+        :return: Dictionary with the lights state and the pending messages of every traffic transport.
+        """
+        queues = {}
+        for direction, queue in self.traffic_queues.items():
+            messages = [str(vehicle).encode() for vehicle in self.waiting[direction] + self.held[direction] + self.arrivals[direction]]
+            self.waiting[direction].clear()
+            self.held[direction].clear()
+            self.arrivals[direction].clear()
+            try:
+                while True:
+                    messages.append(queue.receive(block=False))
+            except TransportEmpty:
+                pass
+            for message in messages:
+                queue.send(message)
+            queues[direction.value] = messages
+
+        lights = {direction.value: light for direction, light in self.lights_state.items()}
+        return {"tick": self.tick, "lights_state": lights, "queues": queues}
 
     def accept_traffic(self):
         """
-        Checks for priority vehicles and signals the traffic lights if needed.
+        Receives the vehicles sent by the traffic generators during the current tick.
         """
+        with self.profiler.span("wait traffic"):
+            for traffic in self.traffic_generators:
+                traffic.wait()
+                traffic.clear()
         for direction, queue in self.traffic_queues.items():
+            if self.road_full(direction):
+                continue
             try:
-                message, _ = queue.receive(block=False)
+                message = self.admission.receive(queue)
                 str_vehicle: str = message.decode()
                 vehicle = Vehicle.str_to_vehicle(str_vehicle)
                 self.roads[direction].append(vehicle)
-            except sysv_ipc.BusyError:
+                if self.stats is not None:
+                    self.stats.record(direction, vehicle.sent_at, time.monotonic_ns())
+            except TransportEmpty:
+                pass
+
+    def receive_traffic(self):
+        """
+        Receives every vehicle sent by the traffic generators for the current step.
+        The transports are drained while waiting, since a step may carry more vehicles than a transport holds.
+        """
+        with self.profiler.span("wait traffic"):
+            for traffic in self.traffic_generators:
+                while not traffic.wait(DRAIN_DELAY):
+                    self.drain_traffic()
+                traffic.clear()
+        self.drain_traffic()
+
+    def drain_traffic(self):
+        """
+        Moves the waiting messages of every transport to the arrivals of their direction.
+        """
+        for direction, queue in self.traffic_queues.items():
+            try:
+                while True:
+                    self.arrivals[direction].append(Vehicle.str_to_vehicle(queue.receive(block=False).decode()))
+            except TransportEmpty:
                 pass
 
+    def admit_traffic(self, tick):
+        """
+        Replays a tick of the traffic queues: the arrivals of the tick join their queue through the admission control,
+        then the first vehicle of each queue is accepted unless its road is full, as accept_traffic does.
+
+        :param tick: Tick to replay.
+        """
+        for direction in Direction:
+            waiting = self.waiting[direction]
+            self.admission.replay(direction, self.arrivals[direction], waiting, self.held[direction], tick)
+            if waiting and not self.road_full(direction):
+                vehicle = waiting.popleft()
+                self.roads[direction].append(vehicle)
+                if self.stats is not None:
+                    self.stats.record(direction, vehicle.sent_at, time.monotonic_ns())
+
+    def road_full(self, direction):
+        """
+        :param direction: Direction of the road.
+        :return: True if the road holds road_capacity vehicles.
+        """
+        return 0 < self.road_capacity <= len(self.roads[direction])
+
     def move_vehicle(self):
         """
         Moves vehicles based on the current state of the traffic lights.
         """
-        self.lights_event.wait()
+        with self.profiler.span("wait lights"):
+            self.lights_event.wait()
+        self.lights_event.clear()
+        self.cross_intersection(self.tick, self.lights_state)
+
+    def cross_intersection(self, tick, lights_state):
+        """
+        Lets the vehicles allowed by the traffic lights go through the crossroad.
 
+        :param tick: Current tick.
+        :param lights_state: Lights state during the tick.
+        """
         green_roads = []
         for direction, vehicle_list in self.roads.items():
-            if self.lights_state[direction] == LightColor.GREEN.value:
+            if lights_state[direction] == LightColor.GREEN.value:
                 green_roads.append(direction)
 
         if len(green_roads) == 1:
             direction = green_roads[0]
             if self.roads[direction]:
                 if self.roads[direction].pop(0).type == "priority":
-                    os.kill(self.light_pid, signal.SIGUSR2)
+                    self.signal_priority_crossed()
 
         elif len(green_roads) == 2:
             d1, d2 = green_roads
             results = []
 
-            self.verify_priority(d1, d2, results)
-            self.verify_priority(d2, d1, results)
+            self.verify_priority(d1, d2, results, tick)
+            self.verify_priority(d2, d1, results, tick)
 
             if len(results) == 0:
                 r = random.random()
                 if len(self.roads[d1]) != 0 and r < 0.5:
                     if self.roads[d1].pop(0).type == "priority":
-                        os.kill(self.light_pid, signal.SIGUSR2)
+                        self.signal_priority_crossed()
                 elif len(self.roads[d2]) != 0:
                     if self.roads[d2].pop(0).type == "priority":
-                        os.kill(self.light_pid, signal.SIGUSR2)
+                        self.signal_priority_crossed()
 
             for result in results:
                 result(0)
 
-    def verify_priority(self, d1, d2, results):
+    def signal_priority_crossed(self):
+        """
+        Signals the traffic lights process with SIGUSR2 that the priority vehicle went through.
+        """
+        if self.light_pid.value:
+            os.kill(self.light_pid.value, signal.SIGUSR2)
+
+    def verify_priority(self, d1, d2, results, tick=None):
         """
         Verifies if a vehicle has priority over another.
 
         :param d1: First direction to check.
         :param d2: Second direction to check.
         :param results: List to store the results of the priority check.
+        :param tick: Current tick, self.tick if None.
         """
         if len(self.roads[d1]) != 0 and (len(self.roads[d2]) == 0 or self.roads[d1][0].destination != self.roads[d2][0].destination.get_right()):
-            print(f"[Coordinator] Moving vehicle from {d1} to {self.roads[d1][0].destination}.")
+            self.log_debug("vehicle_moved", source=d1.value, destination=self.roads[d1][0].destination.value, tick=self.tick if tick is None else tick)
             results.append(self.roads[d1].pop)
-
-    def send_updates_to_display(self):
-        """
-        Sends periodic traffic updates to Display via socket.
-        """
-        while True:
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-                    client_socket.connect((HOST, PORT))
-
-                    while True:
-                        try:
-                            vehicles = self.roads_queue.get()
-                            for direction, light in self.lights_state.items():
-                                vehicle = [str(vehicle) for vehicle in vehicles.get(Direction(direction), [])]
-
-                                message = f"direction : {direction.value}; light : {light}; vehicles : {vehicle}.\n"
-                                client_socket.sendall(message.encode())
-                        except Exception:
-                            pass
-            except ConnectionRefusedError:
-                pass
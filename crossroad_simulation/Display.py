@@ -1,19 +1,12 @@
-import socket
-import time
 import curses
-import threading
-import queue as qe
 
-from crossroad_simulation.Vehicle import Vehicle
-from crossroad_simulation.NormalTrafficGen import MAX_VEHICLES_IN_QUEUE
+from crossroad_simulation.Admission import MAX_VEHICLES_IN_QUEUE
 from crossroad_simulation.Direction import Direction
-from crossroad_simulation.Coordinator import Coordinator
 from crossroad_simulation.LightColor import LightColor
+from crossroad_simulation.SnapshotRing import SnapshotRing, SnapshotChannel
 
-HOST = "localhost"
-PORT = 14750
 ROAD_WIDTH = 5
-BUFFERSIZE = 1024
+REFRESH_DELAY = 50  # Milliseconds between two frames
 
 
 def get_vehicles_entry():
@@ -68,7 +61,6 @@ def print_vehicles(stdscr, queue):
 
     for source, vehicles in queue.items():
         vehicles = vehicles[1]
-        print(vehicles)
         for i in range(min(len(vehicles), 5)):
             y, x = get_vehicles_legal_entry_position()[source][i]
             if vehicles[i].type == "normal":
@@ -93,8 +85,8 @@ def print_lights(stdscr, queue):
             stdscr.addch(y, x, 'G', curses.color_pair(3))
 
 
-def draw(stdscr, queue):
-    stdscr.nodelay(True)
+def draw(stdscr, snapshots: SnapshotRing | SnapshotChannel):
+    stdscr.timeout(REFRESH_DELAY)
     stdscr.clear()
 
     size = MAX_VEHICLES_IN_QUEUE * 2 + ROAD_WIDTH
@@ -119,11 +111,10 @@ def draw(stdscr, queue):
                     char = ' '
                 stdscr.addch(i, j, char)
 
-        try:
-            temp = queue.get()
-            values[temp[0]] = temp[1:]
-        except queue.empty():
-            pass
+        snapshot = snapshots.latest()
+        if snapshot is not None:
+            lights = snapshot.lights
+            values = {direction: [lights[direction], snapshot.vehicles(direction)] for direction in Direction}
 
         print_vehicles(stdscr, values)
         print_lights(stdscr, values)
@@ -136,68 +127,11 @@ def draw(stdscr, queue):
             break
 
 
-def receive_from_coordinator(queue):
+def run_display(snapshots: SnapshotRing | SnapshotChannel):
     """
-    Continuously receives traffic updates from Coordinator via a socket
-    and updates the Coordinator object in real-time.
-    """
-    while True:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-            server_socket.bind((HOST, PORT))
-            server_socket.listen(1)
-            print(f"[Display] Listening for traffic updates on {HOST}:{PORT}...")
-
-            conn, addr = server_socket.accept()
-            with conn:
-                print(f"[Display] Connected to Coordinator at {addr}")
-                while True:
-                    try:
-                        data = conn.recv(BUFFERSIZE)
-                        if not data:
-                            break
-
-                        decoded_data = data.decode()
-
-                        update_coordinator_state(queue, decoded_data)
-
-                    except socket.error as e:
-                        print(f"[Display] Socket error: {e}")
-                        break
-
-
-def update_coordinator_state(queue, data: str):
-    """
-    Parses received data and updates the Coordinator object.
-    Expected format: "direction : NORTH; light : RED; vehicles : [Vehicle]"
-    """
-    lines = data.strip().split(".\n")
-    for line in lines:
-        parts = line.split("; ")
-        state_update = {}
-
-        for part in parts:
-            key, value = part.split(" : ")
-            state_update[key.strip()] = value.strip()
-
-        direction = Direction(state_update["direction"])
-        light = int(state_update["light"])
-        vehicle = []
-        if state_update["vehicles"] != "[]":
-            str_vehicles = state_update["vehicles"][1:-2].split('\'')
-            for str_vehicle in str_vehicles:
-                if str_vehicle != '' and str_vehicle != ", ":
-                    vehicle.append(Vehicle.str_to_vehicle(str_vehicle.replace('\\n', '\n')))
+    Runs the Display with curses, reading the snapshots published by the Coordinator in place,
+    or from its display channel when one is configured.
 
-        queue.put([direction, light, vehicle])
-
-
-def run_display(coordinator: Coordinator):
+    :param snapshots: SnapshotRing or SnapshotChannel of the Coordinator.
     """
-    Runs the Display with curses while receiving updates from Coordinator.
-    """
-    queue = qe.Queue()
-    thread = threading.Thread(target=receive_from_coordinator, args=(queue,), daemon=True)
-    thread.start()
-
-    curses.wrapper(lambda stdscr: draw(stdscr, queue))
-    thread.join()
\ No newline at end of file
+    curses.wrapper(lambda stdscr: draw(stdscr, snapshots))
@@ -0,0 +1,178 @@
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+from multiprocessing import util
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "off": OFF}
+
+FLUSH_INTERVAL = 0.5  # Seconds between two flushes of a process buffer
+BATCH_SIZE = 1024  # Number of buffered records waking the writer before the interval
+opened = []  # Event logs opened by the current process or inherited from its parent, see terminate()
+
+
+def discard(event, **fields):
+	"""
+	Emitter of the disabled levels, resolved once so the hot paths only pay a call.
+	"""
+	pass
+
+
+def handle_termination():
+	"""
+	Installs the signal handlers of a component process, first thing in its run().
+	SIGINT is ignored, the main process stops the components, and SIGTERM is handled by terminate().
+	"""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, terminate)
+
+
+def terminate(*_):
+	"""
+	SIGTERM handler of the component processes: flushes the event logs of the process and exits at once.
+	Raising SystemExit instead would unwind through the tick barrier or lock the process may be waiting on,
+	and leave it broken for the other processes.
+	"""
+	for event_log in opened:
+		if event_log.pid == os.getpid():
+			event_log.flush()
+	os._exit(0)
+
+
+class Emitter:
+	"""
+	Callable appending typed records of a component to the buffer of its EventLog.
+	"""
+
+	def __init__(self, event_log, component, level):
+		self.event_log = event_log
+		self.component = component
+		self.level = level
+
+	def __call__(self, event, **fields):
+		"""
+		Records an event.
+
+		:param event: Type of the event, e.g. 'vehicle_sent'.
+		:param fields: JSON-serializable fields of the event.
+		"""
+		self.event_log.append((time.time_ns(), self.level, self.component, event, fields))
+
+
+class EventLog:
+	"""
+	Structured event log shared by the simulation processes.
+	- Records are appended to an in-memory buffer of the current process, under a lock shared with its flushes.
+	- A background thread of each process flushes the buffer in batches, to a JSON lines file
+	  or to a SQLite database in WAL mode (when the path ends with .db or .sqlite).
+	- Levels below the configured one are resolved to a no-op emitter when a component is built.
+	"""
+
+	def __init__(self, path="events.jsonl", level=INFO):
+		"""
+		Initialize the event log, every process opens its own writer on first use.
+
+		:param path: Path of the JSON lines file or SQLite database.
+		:param level: Minimum level of the recorded events.
+		"""
+		self.path = path
+		self.level = level
+		self.sqlite = path.endswith((".db", ".sqlite"))
+		self.pid = None
+		self.buffer = []
+		self.lock = None
+		self.flush_lock = None
+		self.wakeup = None
+		self.writer = None
+
+	def __getstate__(self):
+		return {"path": self.path, "level": self.level}
+
+	def __setstate__(self, state):
+		self.__init__(state["path"], state["level"])
+
+	def emitter(self, component, level):
+		"""
+		:param component: Name of the component emitting the events.
+		:param level: Level of the events.
+		:return: Callable taking an event type and its fields, a no-op if the level is disabled.
+		"""
+		if level < self.level:
+			return discard
+		return Emitter(self, component, level)
+
+	def append(self, record):
+		"""
+		Buffers a record, starting the writer of the current process if needed.
+
+		:param record: (timestamp, level, component, event, fields) tuple.
+		"""
+		if self.pid != os.getpid():
+			self.open()
+		with self.lock:
+			self.buffer.append(record)
+			full = len(self.buffer) >= BATCH_SIZE
+		if full:
+			self.wakeup.set()
+
+	def open(self):
+		"""
+		Starts the writer thread of the current process and makes sure its buffer is flushed when it exits.
+		"""
+		self.pid = os.getpid()
+		self.buffer = []
+		# Reentrant, the SIGTERM handler flushes from the main thread, possibly in the middle of an append or a flush
+		self.lock = threading.RLock()
+		self.flush_lock = threading.RLock()
+		self.wakeup = threading.Event()
+		self.writer = threading.Thread(target=self.write_loop, daemon=True)
+		self.writer.start()
+		util.Finalize(self, self.flush, exitpriority=100)
+		opened.append(self)
+
+	def write_loop(self):
+		"""
+		Flushes the buffer every FLUSH_INTERVAL, or earlier when it holds BATCH_SIZE records.
+		"""
+		while True:
+			self.wakeup.wait(FLUSH_INTERVAL)
+			self.wakeup.clear()
+			self.flush()
+
+	def flush(self):
+		"""
+		Writes the buffered records of the current process in a single batch.
+		Flushes are serialized, so a flush returns once the batches taken before it are written too.
+		"""
+		with self.flush_lock:
+			with self.lock:
+				batch, self.buffer = self.buffer, []
+			if not batch:
+				return
+			if self.sqlite:
+				self.write_sqlite(batch)
+			else:
+				lines = "".join(json.dumps({"ts": ts, "pid": self.pid, "level": level, "component": component, "event": event, **fields}) + "\n" for ts, level, component, event, fields in batch)
+				fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+				try:
+					os.write(fd, lines.encode())
+				finally:
+					os.close(fd)
+
+	def write_sqlite(self, batch):
+		"""
+		Bulk-inserts a batch of records in the SQLite database.
+
+		:param batch: List of records.
+		"""
+		with sqlite3.connect(self.path, timeout=10) as connection:
+			connection.execute("PRAGMA journal_mode=WAL")
+			connection.execute("CREATE TABLE IF NOT EXISTS events (ts INTEGER, pid INTEGER, level INTEGER, component TEXT, event TEXT, fields TEXT)")
+			connection.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", [(ts, self.pid, level, component, event, json.dumps(fields)) for ts, level, component, event, fields in batch])
+		connection.close()
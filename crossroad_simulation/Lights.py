@@ -1,40 +1,96 @@
 import multiprocessing
 import os
+import random
 import signal
 
 from crossroad_simulation.Direction import Direction
+from crossroad_simulation.EventLog import EventLog, INFO, OFF, handle_termination
 from crossroad_simulation.LightColor import LightColor
+from crossroad_simulation.Profiler import NullProfiler
+from crossroad_simulation.SignalPlan import compile_plans, default_plan
 from crossroad_simulation.TimeManager import TimeManager
 from crossroad_simulation.TimeManipulator import TimeManipulator
 
+PHASE_TICKS = 3  # Duration of a normal phase
+PRIORITY_TIMEOUT = 3  # Maximum duration of a priority phase
+
+
+class PrioritySignal:
+	"""
+	Picklable handle the traffic generators use to announce a priority vehicle to the TrafficLights process,
+	so they do not hold the TrafficLights process object itself.
+	"""
+
+	def __init__(self, queue, pid, lock):
+		"""
+		:param queue: multiprocessing.Queue of the pending priority directions of the traffic lights.
+		:param pid: Shared multiprocessing.Value of the process ID of the traffic lights, 0 until they handle signals.
+		:param lock: Lock serializing the announcements.
+		"""
+		self.queue = queue
+		self.pid = pid
+		self.lock = lock
+
+	def send(self, direction: Direction):
+		"""
+		Queues the direction of a priority vehicle and signals the traffic lights process with SIGUSR1.
+
+		:param direction: Direction of the priority vehicle.
+		"""
+		with self.lock:
+			self.queue.put(direction.value)
+			if self.pid.value:
+				os.kill(self.pid.value, signal.SIGUSR1)
+
 
 class TrafficLights(multiprocessing.Process, TimeManipulator):
 	"""
 	Manages the traffic lights at the intersection.
-	- Normal mode: Opposing lights share the same state (North-South, East-West).
+	- Normal mode: The lights follow a compiled SignalSchedule, by default opposing lights share the same state (North-South, East-West).
 	- Priority mode: Only the light in the direction of the priority vehicle's approach turns green.
 	"""
+	COMPONENT = "lights"
 
-	def __init__(self, shared_lights, lights_event, coordinator_event, time_manager=TimeManager("auto", 0)):
+	def __init__(self, shared_lights, lights_event, tick_barrier, time_manager=None, phase_ticks=PHASE_TICKS, seed=None, checkpointer=None, profiler=None, event_log=EventLog(level=OFF), macro_step=None, schedule=None):
 		"""
 		Initialize shared memory for four traffic lights and priority event.
 
 		:param shared_lights: Shared dictionary representing the state of the traffic lights.
 		:param lights_event: Event to signal traffic light changes.
-		:param coordinator_event: Event to coordinate with the main process.
-		:param time_manager: Instance of TimeManager to manage simulation time.
+		:param tick_barrier: Barrier every component waits on at the end of a tick.
+		:param time_manager: Instance of TimeManager to manage simulation time, an "auto" clock if None.
+		:param phase_ticks: Duration of a normal phase in ticks of the default schedule.
+		:param seed: Seed of the random generator of the process, None to keep the inherited one.
+		:param checkpointer: Optional Checkpointer taking part in full-state checkpoints.
+		:param profiler: Optional Profiler recording the spans of the process.
+		:param event_log: EventLog receiving the structured events of the traffic lights.
+		:param macro_step: Optional MacroStep letting the components advance several ticks per synchronization.
+		:param schedule: SignalSchedule of the normal phases, the north-south and east-west cycle of phase_ticks if None.
 		"""
 		super().__init__()
 		self.lights_state = shared_lights
 		self.lock = multiprocessing.Lock()
-		self.priority_direction = "default"
 		self.event = multiprocessing.Event()
-		signal.signal(signal.SIGUSR1, self.priority_signal_handler)
-		signal.signal(signal.SIGUSR2, self.priority_signal_handler)
 		self.queue = multiprocessing.Queue()
+		self.signal_pid = multiprocessing.Value("i", 0)
 		self.lights_event = lights_event
-		self.coordinator_event = coordinator_event
-		self.time_manager = time_manager
+		self.tick_barrier = tick_barrier
+		self.time_manager = time_manager if time_manager is not None else TimeManager("auto", 0)
+		if phase_ticks < 1:
+			raise ValueError("A phase must last at least one tick.")
+		self.schedule = schedule if schedule is not None else compile_plans(default_plan(phase_ticks))
+		self.seed = seed
+		self.checkpointer = checkpointer
+		self.profiler = profiler if profiler is not None else NullProfiler()
+		self.log_info = event_log.emitter(self.COMPONENT, INFO)
+		self.priority_signal = PrioritySignal(self.queue, self.signal_pid, self.lock)
+		self.macro_step = macro_step
+		self.step = 1
+		self.tick = 0
+		self.remaining = 0
+		self.priority_phase = False
+		self.random_state = None
+		self.resumed = False
 
 	def get_shared_lights_state(self):
 		"""
@@ -47,22 +103,49 @@ class TrafficLights(multiprocessing.Process, TimeManipulator):
 	def run(self):
 		"""
 		Main loop to control traffic lights.
+		A priority phase ends as soon as the priority vehicle went through (SIGUSR2) or after PRIORITY_TIMEOUT ticks.
+		When macro-stepping, the lights hold their state for the whole agreed step, which never crosses a phase change.
+		The countdown of a step is taken before the step, so a checkpoint taken at its end holds the countdown left after it.
 		"""
+		handle_termination()
+		signal.signal(signal.SIGUSR1, self.priority_signal_handler)
+		signal.signal(signal.SIGUSR2, self.priority_signal_handler)
+		self.signal_pid.value = os.getpid()
+		self.init_random()
+		if self.resumed:
+			self.synchronize()
+
 		while True:
-			if not self.queue.empty():
-				self.handle_priority_vehicle()
-				timeout = 3
-				while not self.event.is_set() and timeout > 0:
-					timeout-=1
-					self.next()
-				self.event.clear()
-				for direction in Direction:
-					with self.lock:
-						self.lights_state[direction] = LightColor.RED.value
-			else:
-				self.toggle_normal_cycle()
-				for i in range(3):
-					self.next()
+			if self.priority_phase and self.event.is_set():
+				self.remaining = 0
+			if self.remaining == 0:
+				with self.profiler.span("phase"):
+					self.start_phase()
+				continue
+			unit = self.step
+			self.remaining -= unit
+			self.next(unit)
+
+	def start_phase(self):
+		"""
+		Ends the current phase and starts the next one, serving pending priority vehicles first.
+		A normal phase is the state of the schedule at the current tick, lasting until its next change,
+		so the schedule keeps running during the priority phases.
+		"""
+		if self.priority_phase:
+			self.priority_phase = False
+			self.event.clear()
+			for direction in Direction:
+				with self.lock:
+					self.lights_state[direction] = LightColor.RED.value
+
+		if not self.queue.empty():
+			self.handle_priority_vehicle()
+			self.priority_phase = True
+			self.remaining = PRIORITY_TIMEOUT
+		else:
+			self.apply_schedule()
+			self.remaining = self.schedule.remaining(self.tick)
 
 	def next(self, unit: int = 1):
 		"""
@@ -71,26 +154,78 @@ class TrafficLights(multiprocessing.Process, TimeManipulator):
 		:param unit: Number of time units to advance.
 		"""
 		self.lights_event.set()
-		self.time_manager.sleep(unit)
-		self.coordinator_event.wait()
-		self.lights_event.clear()
+		self.synchronize(unit)
+
+	def synchronize(self, unit: int = 1):
+		"""
+		Waits for the other components at the end of a step of unit ticks, taking part in a checkpoint if one is due.
 
-	def toggle_normal_cycle(self):
+		:param unit: Number of time units to advance.
 		"""
-		Switches traffic lights in normal mode (North-South green, East-West red, then switch).
+		self.tick += unit - 1
+		self.profiler.poll(self.COMPONENT)
+		if self.checkpointer is not None and self.checkpointer.due(self.tick):
+			with self.profiler.span("checkpoint"):
+				self.checkpointer.contribute(self.COMPONENT, self.get_state())
+		if self.macro_step is not None:
+			self.macro_step.propose(self.COMPONENT, self.tick + 1, self.horizon(unit))
+		with self.profiler.span("sleep"):
+			self.time_manager.sleep(unit)
+		with self.profiler.span("wait tick"):
+			self.tick_barrier.wait()
+		self.tick += 1
+		if self.macro_step is not None:
+			self.step = self.macro_step.agree()
+
+	def horizon(self, unit: int = 1) -> int:
 		"""
-		current_ns = self.lights_state[Direction.NORTH]
+		Holds the next step to the end of the current phase, and to a single tick when a phase starts
+		or during a priority phase, which the priority vehicle can end at any tick.
 
-		new_ns = LightColor.GREEN.value if current_ns == LightColor.RED.value else LightColor.RED.value
-		new_ew = LightColor.RED.value if new_ns == LightColor.GREEN.value else LightColor.GREEN.value
+		:param unit: Number of time units of the step being finished.
+		:return: Number of ticks of the next step the traffic lights accept.
+		"""
+		if self.priority_phase or self.remaining <= 0:
+			return 1
+		return self.remaining
 
-		for direction in [Direction.NORTH, Direction.SOUTH]:
-			with self.lock:
-				self.lights_state[direction] = new_ns
+	def get_state(self):
+		"""
+		Captures the phase counters, pending priority vehicles and random state at a tick boundary.
+
+		:return: Picklable state of the traffic lights.
+		"""
+		pending = []
+		while not self.queue.empty():
+			pending.append(self.queue.get())
+		for direction in pending:
+			self.queue.put(direction)
+
+		return {"tick": self.tick, "remaining": self.remaining, "priority_phase": self.priority_phase, "priority_done": self.event.is_set(), "pending": pending, "random": random.getstate()}
+
+	def restore_state(self, state):
+		"""
+		Restores a state captured by get_state, must be called before the process starts.
+
+		:param state: State of the traffic lights.
+		"""
+		self.tick = state["tick"]
+		self.remaining = state["remaining"]
+		self.priority_phase = state["priority_phase"]
+		if state["priority_done"]:
+			self.event.set()
+		for direction in state["pending"]:
+			self.queue.put(direction)
+		self.random_state = state["random"]
+		self.resumed = True
 
-		for direction in [Direction.EAST, Direction.WEST]:
+	def apply_schedule(self):
+		"""
+		Sets the lights to the state of the schedule at the current tick.
+		"""
+		for direction, light in self.schedule.state(self.tick).items():
 			with self.lock:
-				self.lights_state[direction] = new_ew
+				self.lights_state[direction] = light
 
 	def handle_priority_vehicle(self):
 		"""
@@ -107,47 +242,25 @@ class TrafficLights(multiprocessing.Process, TimeManipulator):
 		with self.lock:
 			self.lights_state[priority_dir] = LightColor.GREEN.value
 
-		print(f"[TrafficLights] Priority vehicle detected! Green light for {priority_dir}, all others set to RED.")
+		self.log_info("priority_green", direction=priority_dir.value, tick=self.tick)
 
 	def priority_signal_handler(self, signum, frame):
 		"""
-		Handles SIGUSR1 signal for priority vehicle detection.
+		Handles the signals of the traffic lights process, registered when it starts.
+		- SIGUSR1: a priority vehicle was queued by PrioritySignal, it is served at the next phase change.
+		- SIGUSR2: the priority vehicle went through, the priority phase ends.
 
 		:param signum: Signal number.
 		:param frame: Current stack frame.
 		"""
-		print("[TrafficLights] Received priority vehicle signal!")
-		if signum == signal.SIGUSR1:
-			if self.priority_direction != "default":
-				self.queue.put(self.priority_direction)
-				self.priority_direction = "default"
-		elif signum == signal.SIGUSR2:
+		self.log_info("priority_signal", signal=signum)
+		if signum == signal.SIGUSR2:
 			self.event.set()
 
-	def set_priority_direction(self, direction: Direction):
-		"""
-		Sets the priority direction before sending the signal.
-
-		:param direction: Direction of the priority vehicle.
-		"""
-		self.priority_direction = direction.value
-		print(f"[TrafficLights] Priority vehicle approaching from {direction}")
-
-	@staticmethod
-	def getpid():
-		"""
-		Returns the process ID of the current process.
-
-		:return: Process ID.
-		"""
-		return os.getpid()
-
 	def send_signal(self, direction: Direction):
 		"""
 		Sends a signal to the traffic lights process to handle a priority vehicle.
 
 		:param direction: Direction of the priority vehicle.
 		"""
-		with self.lock:
-			self.set_priority_direction(direction)
-			os.kill(self.getpid(), signal.SIGUSR1)
+		self.priority_signal.send(direction)
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import multiprocessing
+import sys
+import time
+
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.Metrics import AcceptStats, LatencyHistogram
+from crossroad_simulation.NormalTrafficGen import NormalTrafficGen
+from crossroad_simulation.Simulation import Simulation, parse_transports
+from crossroad_simulation.TimeManager import TimeManager
+from crossroad_simulation.Transport import TransportFull
+from crossroad_simulation.Vehicle import Vehicle
+
+OFFERED, SENT, DROPPED = range(3)
+MAX_LAG = 0.1  # Seconds a late producer may catch up on before its schedule is reset
+IDLE_DELAY = 0.05  # Seconds between two checks of the rate of an idle producer
+DISPLAY_REFRESH = 0.05  # Polling period of the simulated display reader, as Display.REFRESH_DELAY
+
+
+class LoadProducer(multiprocessing.Process):
+	"""
+	Open-loop producer of normal vehicles for a single direction.
+	Sends at the shared rate whatever the state of the crossroad, and counts offered, sent and dropped vehicles.
+	"""
+
+	def __init__(self, source: Direction, traffic_queue, rate, queue_limit=None):
+		"""
+		Initialize the producer.
+
+		:param source: Direction of the queue the producer feeds.
+		:param traffic_queue: Transport of the direction.
+		:param rate: Shared multiprocessing.Value of the vehicles per second each producer sends.
+		:param queue_limit: Number of waiting messages above which vehicles are dropped, None for the transport limit only.
+		"""
+		super().__init__(daemon=True)
+		self.source = source
+		self.traffic_queue = traffic_queue
+		self.rate = rate
+		self.queue_limit = queue_limit
+		self.counters = multiprocessing.Array("q", 3, lock=False)
+
+	def run(self):
+		"""
+		Sends vehicles against absolute deadlines, so the offered load does not drift with the send cost.
+		"""
+		deadline = time.monotonic()
+		while True:
+			rate = self.rate.value
+			if rate <= 0:
+				time.sleep(IDLE_DELAY)
+				deadline = time.monotonic()
+				continue
+
+			deadline += 1 / rate
+			delay = deadline - time.monotonic()
+			if delay > 0:
+				time.sleep(delay)
+			elif -delay > MAX_LAG:
+				deadline = time.monotonic()
+			self.send()
+
+	def send(self):
+		"""
+		Offers a single vehicle to the queue.
+		"""
+		self.counters[OFFERED] += 1
+		try:
+			if self.queue_limit is not None and self.traffic_queue.depth() >= self.queue_limit:
+				self.counters[DROPPED] += 1
+				return
+			_, destination = NormalTrafficGen.generate_direction()
+			while destination == self.source:
+				_, destination = NormalTrafficGen.generate_direction()
+			vehicle = Vehicle("normal", self.source, destination, time.monotonic_ns())
+			self.traffic_queue.send(str(vehicle).encode(), block=False)
+			self.counters[SENT] += 1
+		except TransportFull:
+			self.counters[DROPPED] += 1
+
+
+class LoadTest:
+	"""
+	Ramps the offered load of a pool of LoadProducer processes per direction against a headless simulation.
+	At each step it records the achieved throughput, drops and latency of every stage of the pipeline:
+	- IPC: vehicles sent to and dropped by the traffic transports.
+	- Coordinator: vehicles accepted per second and their queueing latency.
+	- Readers: ticks published per second and snapshots overrun for a reader polling at the display rate.
+	"""
+
+	def __init__(self, manager, producers=1, queue_limit=None, key_base=None, mode="afap", time_unit=0, transports=None):
+		"""
+		Builds the simulation, with its own traffic generators silenced, and the producer pools.
+
+		:param manager: multiprocessing.Manager of the simulation.
+		:param producers: Number of producer processes per direction.
+		:param queue_limit: Number of waiting messages above which producers drop vehicles, None for the transport limit only.
+		:param key_base: SysV key of the first traffic queue, free keys are generated if None.
+		:param mode: Clock mode of the simulation.
+		:param time_unit: Length of a tick in seconds.
+		:param transports: Dictionary of backend names per channel of the simulation.
+		"""
+		self.stats = AcceptStats(Direction)
+		self.simulation = Simulation(manager, TimeManager(mode, time_unit), {"normal_rate": 0, "priority_rate": 0}, key_base, False, stats=self.stats, transports=transports)
+		self.rate = multiprocessing.Value("d", 0, lock=False)
+		self.producers = [LoadProducer(direction, self.simulation.traffic_queues[direction], self.rate, queue_limit) for direction in Direction for _ in range(producers)]
+
+	def totals(self):
+		"""
+		:return: Offered, sent and dropped vehicles over all producers.
+		"""
+		return [sum(producer.counters[counter] for producer in self.producers) for counter in (OFFERED, SENT, DROPPED)]
+
+	def step(self, offered_rate, duration):
+		"""
+		Runs one step of the ramp.
+
+		:param offered_rate: Total vehicles per second offered by all producers.
+		:param duration: Duration of the step in seconds.
+		:return: Dictionary of the measures of the step.
+		"""
+		reader = self.simulation.coordinator.snapshots.reader()
+		start_totals, start_accepted, start_latency = self.totals(), sum(self.stats.accepted), self.stats.latency.snapshot()
+		start_tick, start = self.simulation.tick(), time.monotonic()
+
+		self.rate.value = offered_rate / len(self.producers)
+		while time.monotonic() - start < duration:
+			time.sleep(DISPLAY_REFRESH)
+			reader.poll()
+
+		elapsed = time.monotonic() - start
+		offered, sent, dropped = (end - begin for end, begin in zip(self.totals(), start_totals))
+		latency = [end - begin for end, begin in zip(self.stats.latency.snapshot(), start_latency)]
+		return {
+			"target": offered_rate,
+			"offered": offered / elapsed,
+			"sent": sent / elapsed,
+			"dropped": dropped / elapsed,
+			"accepted": (sum(self.stats.accepted) - start_accepted) / elapsed,
+			"latency_p50_ms": LatencyHistogram.percentile(latency, 0.5) / 1000,
+			"latency_p99_ms": LatencyHistogram.percentile(latency, 0.99) / 1000,
+			"ticks": (self.simulation.tick() - start_tick) / elapsed,
+			"overruns": reader.overruns,
+		}
+
+	def run(self, rates, duration):
+		"""
+		Ramps the offered load through the given rates.
+
+		:param rates: Total offered vehicles per second of each step.
+		:param duration: Duration of each step in seconds.
+		:return: List of the measures of every step, i.e. the saturation curve.
+		"""
+		self.simulation.start()
+		for producer in self.producers:
+			producer.start()
+		try:
+			return [self.step(rate, duration) for rate in rates]
+		finally:
+			for producer in self.producers:
+				producer.terminate()
+			self.simulation.stop()
+			self.simulation.close()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Saturation curve of the simulation pipeline.")
+	parser.add_argument("--producers", type=int, default=1, help="Producer processes per direction.")
+	parser.add_argument("--rates", default="50,100,200,500,1000,2000,5000", help="Comma-separated total offered vehicles per second of each step.")
+	parser.add_argument("--step-duration", type=float, default=2, help="Duration of each step in seconds.")
+	parser.add_argument("--queue-limit", type=int, help="Messages per queue above which vehicles are dropped.")
+	parser.add_argument("--mode", default="afap", help="Clock mode of the simulation.")
+	parser.add_argument("--time-unit", type=float, default=0, help="Length of a tick in seconds.")
+	parser.add_argument("--transport", action="append", default=[], metavar="CHANNEL=BACKEND", help="Backend of a channel of the simulation (vehicles, lights, display).")
+	parser.add_argument("--output", default="saturation.csv", help="CSV file of the saturation curve.")
+	args = parser.parse_args()
+
+	with multiprocessing.Manager() as manager:
+		load_test = LoadTest(manager, args.producers, args.queue_limit, mode=args.mode, time_unit=args.time_unit, transports=parse_transports(args.transport))
+		curve = load_test.run([float(rate) for rate in args.rates.split(",")], args.step_duration)
+
+	with open(args.output, "w", newline="") as file:
+		writer = csv.DictWriter(file, fieldnames=list(curve[0]))
+		writer.writeheader()
+		writer.writerows(curve)
+
+	for measures in curve:
+		print(", ".join(f"{name}={value:.1f}" for name, value in measures.items()), file=sys.stderr)
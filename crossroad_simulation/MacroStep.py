@@ -0,0 +1,53 @@
+import multiprocessing
+
+COMPONENTS = ["lights", "normal_traffic", "priority_traffic", "coordinator"]  # Components agreeing on the length of a step
+MAX_TICKS = 16  # Default longest step
+
+
+class MacroStep:
+	"""
+	Agreement of the components on the number of ticks they advance between two synchronizations.
+	- Before the tick barrier, each component proposes the longest next step it accepts
+	  (e.g. the traffic lights up to their next phase change, the priority generator up to its next arrival).
+	- After the barrier, each component reads the shortest proposal, so every component runs the same step.
+	Proposals are double-buffered by step parity, so a component proposing for the step after next
+	never overwrites a buffer a slower component has not read yet.
+	"""
+
+	def __init__(self, max_ticks=MAX_TICKS, checkpointer=None):
+		"""
+		Initialize the shared proposals, every component starts with a single-tick step.
+
+		:param max_ticks: Longest step.
+		:param checkpointer: Optional Checkpointer, steps end on its checkpoint ticks.
+		:raises ValueError: If max_ticks is lower than 1.
+		"""
+		if max_ticks < 1:
+			raise ValueError("A step must last at least one tick.")
+		self.max_ticks = max_ticks
+		self.checkpointer = checkpointer
+		self.proposals = multiprocessing.Array("i", [1] * 2 * len(COMPONENTS), lock=False)
+		self.parity = 0
+
+	def propose(self, component: str, tick: int, ticks: int):
+		"""
+		Proposes the length of the next step, must be called before the tick barrier.
+
+		:param component: Name of the component.
+		:param tick: First tick of the next step.
+		:param ticks: Longest next step the component accepts.
+		"""
+		ticks = min(ticks, self.max_ticks)
+		if self.checkpointer is not None and self.checkpointer.interval > 0:
+			ticks = min(ticks, self.checkpointer.horizon(tick))
+		self.proposals[self.parity * len(COMPONENTS) + COMPONENTS.index(component)] = max(ticks, 1)
+
+	def agree(self) -> int:
+		"""
+		Reads the agreed length of the next step, must be called after the tick barrier.
+
+		:return: Number of ticks of the next step.
+		"""
+		offset = self.parity * len(COMPONENTS)
+		self.parity ^= 1
+		return min(self.proposals[offset:offset + len(COMPONENTS)])
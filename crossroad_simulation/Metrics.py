@@ -0,0 +1,76 @@
+import multiprocessing
+
+BUCKETS = 40  # Bucket i counts the values in [2^(i-1), 2^i[ microseconds
+
+
+class LatencyHistogram:
+	"""
+	Log2 histogram of durations living in shared memory.
+	Meant for a single writer process, any process can read it and compute percentiles.
+	"""
+
+	def __init__(self):
+		"""
+		Initialize the shared buckets.
+		"""
+		self.buckets = multiprocessing.Array("q", BUCKETS, lock=False)
+
+	def record(self, microseconds: int):
+		"""
+		Counts a duration.
+
+		:param microseconds: Duration in microseconds.
+		"""
+		self.buckets[min(max(int(microseconds), 0).bit_length(), BUCKETS - 1)] += 1
+
+	def snapshot(self):
+		"""
+		:return: Copy of the bucket counts, to compute the difference between two moments.
+		"""
+		return list(self.buckets)
+
+	@staticmethod
+	def percentile(counts, fraction: float):
+		"""
+		Upper bound of the bucket holding a percentile.
+
+		:param counts: Bucket counts, as returned by snapshot() or a difference of two snapshots.
+		:param fraction: Percentile between 0 and 1.
+		:return: Duration in microseconds, 0 if nothing was recorded.
+		"""
+		total = sum(counts)
+		if total == 0:
+			return 0
+		threshold = fraction * total
+		seen = 0
+		for bucket, count in enumerate(counts):
+			seen += count
+			if seen >= threshold:
+				return 2 ** bucket
+		return 2 ** (BUCKETS - 1)
+
+
+class AcceptStats:
+	"""
+	Counters of the vehicles accepted by the Coordinator, with their queueing latency when the sender stamped them.
+	"""
+
+	def __init__(self, directions):
+		"""
+		:param directions: Directions of the counted queues.
+		"""
+		self.directions = list(directions)
+		self.accepted = multiprocessing.Array("q", len(self.directions), lock=False)
+		self.latency = LatencyHistogram()
+
+	def record(self, direction, sent_at, now):
+		"""
+		Counts a vehicle accepted from a queue.
+
+		:param direction: Direction of the queue.
+		:param sent_at: monotonic_ns() timestamp of the sender, or None.
+		:param now: monotonic_ns() timestamp of the acceptance.
+		"""
+		self.accepted[self.directions.index(direction)] += 1
+		if sent_at is not None:
+			self.latency.record((now - sent_at) // 1000)
@@ -1,13 +1,15 @@
 import multiprocessing
 import random
-import sysv_ipc
+from collections import deque
+from crossroad_simulation.Admission import Admission
 from crossroad_simulation.Vehicle import Vehicle
 from crossroad_simulation.Direction import Direction
+from crossroad_simulation.EventLog import EventLog, DEBUG, INFO, OFF, handle_termination
 from crossroad_simulation.Lights import TrafficLights
+from crossroad_simulation.Profiler import NullProfiler
 from crossroad_simulation.TimeManager import TimeManager
 from crossroad_simulation.TimeManipulator import TimeManipulator
-
-MAX_VEHICLES_IN_QUEUE = 5  # Maximum queue size per direction
+from crossroad_simulation.Transport import TransportError
 
 
 class NormalTrafficGen(multiprocessing.Process, TimeManipulator):
@@ -15,47 +17,94 @@ class NormalTrafficGen(multiprocessing.Process, TimeManipulator):
     Generates normal traffic for the simulation.
     Inherits from multiprocessing.Process to run in a separate process and TimeManipulator for time management.
     """
+    COMPONENT = "normal_traffic"
+    RATE = 0.5  # Probability to send a vehicle at each tick
 
-    def __init__(self, traffic_event: multiprocessing.Event, coordinator_event: multiprocessing.Event, traffic_lights: TrafficLights, traffic_queues, time_manager=TimeManager("auto", 0)):
+    def __init__(self, traffic_event: multiprocessing.Event, tick_barrier: multiprocessing.Barrier, traffic_lights: TrafficLights, traffic_queues, time_manager=None, rate=None, seed=None, checkpointer=None, profiler=None, event_log=EventLog(level=OFF), macro_step=None, admission=None):
         """
         Initializes the NormalTrafficGen process.
         
         :param traffic_event: Event to signal traffic generation.
-        :param coordinator_event: Event to coordinate with the main process.
-        :param traffic_lights: Instance of TrafficLights to manage traffic light states.
-        :param traffic_queues: Dictionary of message queues for each direction.
-        :param time_manager: Instance of TimeManager to manage simulation time.
+        :param tick_barrier: Barrier every component waits on at the end of a tick.
+        :param traffic_lights: Instance of TrafficLights, only its picklable PrioritySignal handle is kept.
+        :param traffic_queues: Dictionary of Transport instances for each direction.
+        :param time_manager: Instance of TimeManager to manage simulation time, an "auto" clock if None.
+        :param rate: Probability to send a vehicle at each tick, defaults to RATE.
+        :param seed: Seed of the random generator of the process, None to keep the inherited one.
+        :param checkpointer: Optional Checkpointer taking part in full-state checkpoints.
+        :param profiler: Optional Profiler recording the spans of the process.
+        :param event_log: EventLog receiving the structured events of the generator.
+        :param macro_step: Optional MacroStep letting the components advance several ticks per synchronization.
+        :param admission: Admission control of the traffic queues shared with the Coordinator, a 'drop-newest' one if None.
         """
         super().__init__()
         self.traffic_event = traffic_event
-        self.coordinator_event = coordinator_event
+        self.tick_barrier = tick_barrier
         self.traffic_queues = traffic_queues
-        self.traffic_lights = traffic_lights
-        self.time_manager = time_manager
+        self.priority_signal = traffic_lights.priority_signal
+        self.time_manager = time_manager if time_manager is not None else TimeManager("auto", 0)
+        self.rate = self.RATE if rate is None else rate
+        self.seed = seed
+        self.checkpointer = checkpointer
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        self.log_debug = event_log.emitter(self.COMPONENT, DEBUG)
+        self.log_info = event_log.emitter(self.COMPONENT, INFO)
+        self.macro_step = macro_step
+        self.admission = admission if admission is not None else Admission()
+        self.held = {direction: deque() for direction in Direction}
+        self.step = 1
+        self.lookahead = deque()
+        self.tick = 0
+        self.random_state = None
+        self.resumed = False
 
     def run(self):
         """
         Main loop of the traffic generator process.
         Continuously generates and sends vehicles if conditions are met.
+        When macro-stepping, the arrivals of every tick of the step are sent at once, stamped with their tick.
+        Otherwise the held vehicles are retried first, and no arrival is drawn while the 'block' admission policy holds one.
         """
+        handle_termination()
+        self.init_random()
+        if self.resumed:
+            self.synchronize()
+
         while True:
-            if self.vehicle_to_send():
-                vehicle = self.generate_vehicle()
-                self.send_message(vehicle)
-            self.next()
+            for tick in range(self.tick, self.tick + self.step):
+                if self.macro_step is None and self.admission.retry(self.traffic_queues, self.held):
+                    continue
+                vehicle = self.arrival()
+                if vehicle is not None:
+                    vehicle.tick = tick
+                    with self.profiler.span("send"):
+                        self.send_message(vehicle)
+            self.next(self.step)
+
+    def arrival(self):
+        """
+        Draws the arrival of the next tick, from the vehicles drawn ahead by horizon() first.
+
+        :return: Vehicle to send, or None.
+        """
+        if self.lookahead:
+            return self.lookahead.popleft()
+        return self.generate_vehicle() if self.vehicle_to_send() else None
 
     def send_message(self, vehicle):
         """
-        Sends a vehicle message to the appropriate queue.
+        Sends a vehicle message to the appropriate queue through the admission control.
+        When macro-stepping, the Coordinator applies the admission control while it replays the arrivals.
         
         :param vehicle: Vehicle instance to be sent.
         """
         try:
-            if self.traffic_queues[vehicle.source].current_messages < MAX_VEHICLES_IN_QUEUE:
-                message = str(vehicle).encode()
-                self.traffic_queues[vehicle.source].send(message)
-                print(f"[TrafficGen] Sent {vehicle.type} vehicle from {vehicle.source}\n")
-        except sysv_ipc.ExistentialError:
+            if self.macro_step is not None:
+                self.traffic_queues[vehicle.source].send(str(vehicle).encode())
+            elif not self.admission.offer(self.traffic_queues[vehicle.source], vehicle, self.held[vehicle.source]):
+                return
+            self.log_debug("vehicle_sent", type=vehicle.type, source=vehicle.source.value, destination=vehicle.destination.value, tick=vehicle.tick)
+        except TransportError:
             pass
 
     def next(self, unit=1):
@@ -65,18 +114,59 @@ class NormalTrafficGen(multiprocessing.Process, TimeManipulator):
         :param unit: Number of time units to advance.
         """
         self.traffic_event.set()
-        self.time_manager.sleep(unit)
-        self.coordinator_event.wait()
-        self.traffic_event.clear()
+        self.synchronize(unit)
 
-    @staticmethod
-    def vehicle_to_send():
+    def synchronize(self, unit=1):
+        """
+        Waits for the other components at the end of a step of unit ticks, taking part in a checkpoint if one is due.
+
+        :param unit: Number of time units to advance.
+        """
+        self.tick += unit - 1
+        self.profiler.poll(self.COMPONENT)
+        if self.checkpointer is not None and self.checkpointer.due(self.tick):
+            with self.profiler.span("checkpoint"):
+                self.checkpointer.contribute(self.COMPONENT, self.get_state())
+        if self.macro_step is not None:
+            self.macro_step.propose(self.COMPONENT, self.tick + 1, self.horizon(unit))
+        with self.profiler.span("sleep"):
+            self.time_manager.sleep(unit)
+        with self.profiler.span("wait tick"):
+            self.tick_barrier.wait()
+        self.tick += 1
+        if self.macro_step is not None:
+            self.step = self.macro_step.agree()
+
+    def get_state(self):
+        """
+        Captures the tick counter, the arrivals drawn ahead, the vehicles held by the admission control and random state at a tick boundary.
+
+        :return: Picklable state of the generator.
+        """
+        lookahead = [None if vehicle is None else (vehicle.type, vehicle.source.value, vehicle.destination.value) for vehicle in self.lookahead]
+        held = [(vehicle.type, vehicle.source.value, vehicle.destination.value) for vehicles in self.held.values() for vehicle in vehicles]
+        return {"tick": self.tick, "lookahead": lookahead, "held": held, "random": random.getstate()}
+
+    def restore_state(self, state):
+        """
+        Restores a state captured by get_state, must be called before the process starts.
+
+        :param state: State of the generator.
+        """
+        self.tick = state["tick"]
+        self.lookahead = deque(None if vehicle is None else Vehicle(vehicle[0], Direction(vehicle[1]), Direction(vehicle[2])) for vehicle in state.get("lookahead", []))
+        for vehicle_type, source, destination in state.get("held", []):
+            self.held[Direction(source)].append(Vehicle(vehicle_type, Direction(source), Direction(destination)))
+        self.random_state = state["random"]
+        self.resumed = True
+
+    def vehicle_to_send(self):
         """
         Determines whether a vehicle should be sent based on a random probability.
         
         :return: True if a vehicle should be sent, False otherwise.
         """
-        return random.random() < 0.5
+        return random.random() < self.rate
 
     @staticmethod
     def generate_vehicle():
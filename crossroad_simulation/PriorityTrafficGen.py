@@ -1,7 +1,9 @@
 import multiprocessing
-import random
-from crossroad_simulation import TrafficLights, Vehicle, NormalTrafficGen
-from crossroad_simulation.TimeManager import TimeManager
+import sys
+from crossroad_simulation.Lights import TrafficLights
+from crossroad_simulation.NormalTrafficGen import NormalTrafficGen
+from crossroad_simulation.Vehicle import Vehicle
+from crossroad_simulation.EventLog import EventLog, OFF
 
 
 class PriorityTrafficGen(NormalTrafficGen):
@@ -9,35 +11,51 @@ class PriorityTrafficGen(NormalTrafficGen):
 	Class for generating priority traffic in the simulation.
 	Inherits from NormalTrafficGen.
 	"""
+	COMPONENT = "priority_traffic"
+	RATE = 0.2  # Probability to send a priority vehicle at each tick
 
-	def __init__(self, traffic_event, coordinator_event: multiprocessing.Event, traffic_lights: TrafficLights, traffic_queues, time_manager=TimeManager("auto", 0)):
+	def __init__(self, traffic_event, tick_barrier: multiprocessing.Barrier, traffic_lights: TrafficLights, traffic_queues, time_manager=None, rate=None, seed=None, checkpointer=None, profiler=None, event_log=EventLog(level=OFF), macro_step=None, admission=None):
 		"""
 		Initialize the PriorityTrafficGen.
 
 		:param traffic_event: Event to control traffic generation.
-		:param coordinator_event: Event to coordinate with other components.
+		:param tick_barrier: Barrier every component waits on at the end of a tick.
 		:param traffic_lights: Instance of TrafficLights to control traffic lights.
 		:param traffic_queues: Queues for managing traffic messages.
-		:param time_manager: Instance of TimeManager to manage simulation time.
+		:param time_manager: Instance of TimeManager to manage simulation time, an "auto" clock if None.
+		:param rate: Probability to send a priority vehicle at each tick, defaults to RATE.
+		:param seed: Seed of the random generator of the process, None to keep the inherited one.
+		:param checkpointer: Optional Checkpointer taking part in full-state checkpoints.
+		:param profiler: Optional Profiler recording the spans of the process.
+		:param event_log: EventLog receiving the structured events of the generator.
+		:param macro_step: Optional MacroStep letting the components advance several ticks per synchronization.
+		:param admission: Admission control of the traffic queues, which never drops priority vehicles.
 		"""
-		NormalTrafficGen.__init__(self, traffic_event, coordinator_event, traffic_lights, traffic_queues, time_manager)
+		NormalTrafficGen.__init__(self, traffic_event, tick_barrier, traffic_lights, traffic_queues, time_manager, rate, seed, checkpointer, profiler, event_log, macro_step, admission)
 
-	@staticmethod
-	def vehicle_to_send():
+	def horizon(self, unit: int = 1) -> int:
 		"""
-		Determine if a priority vehicle should be sent.
+		Draws the arrivals of the longest possible step ahead, and ends the next step at the tick of the next priority vehicle,
+		so its signal reaches the traffic lights as it would without macro-stepping.
 
-		:return: True if a priority vehicle should be sent, False otherwise.
+		:param unit: Number of time units of the step being finished.
+		:return: Number of ticks of the next step the generator accepts.
 		"""
-		return random.random() < 0.2
+		while len(self.lookahead) < self.macro_step.max_ticks:
+			self.lookahead.append(self.generate_vehicle() if self.vehicle_to_send() else None)
+		for ticks, vehicle in enumerate(self.lookahead, 1):
+			if vehicle is not None:
+				return ticks
+		return sys.maxsize
 
 	def send_priority_signal(self, vehicle: Vehicle):
 		"""
-		Send a priority signal for the given vehicle.
+		Send a priority signal for the given vehicle, logged as an event of the generator.
 
 		:param vehicle: The vehicle to send the priority signal for.
 		"""
-		self.traffic_lights.send_signal(vehicle.source)
+		self.priority_signal.send(vehicle.source)
+		self.log_info("priority_approaching", direction=vehicle.source.value)
 
 	@staticmethod
 	def send_signal(func):
@@ -50,9 +68,9 @@ class PriorityTrafficGen(NormalTrafficGen):
 		def wrapper(self, *args, **kwargs):
 			result = func(self, *args, **kwargs)
 			for arg in args:
-				if type(arg) is Vehicle.Vehicle:
+				if type(arg) is Vehicle:
 					self.send_priority_signal(arg)
-					print("[Priority Traffic Generated]")
+					self.log_info("priority_generated", source=arg.source.value, destination=arg.destination.value, tick=arg.tick)
 			return result
 
 		return wrapper
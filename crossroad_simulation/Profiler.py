@@ -0,0 +1,243 @@
+import cProfile
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import signal
+import time
+import tracemalloc
+
+PROFILE_SIGNAL = signal.SIGRTMIN  # Toggles profiling when sent to the main process
+DUMP_TIMEOUT = 5  # Seconds to wait for the components to write their files
+TOP_ALLOCATORS = 10  # Allocation sites kept in a memory sample
+NULL_SPAN = contextlib.nullcontext()
+
+
+class NullProfiler:
+	"""
+	Profiler used by components running without profiling support, every call is a no-op.
+	"""
+
+	def poll(self, component):
+		pass
+
+	def span(self, name):
+		return NULL_SPAN
+
+
+class Span:
+	"""
+	Context manager recording a complete trace event in the buffer of its profiler.
+	"""
+
+	def __init__(self, events, name):
+		self.events = events
+		self.name = name
+		self.start = 0
+
+	def __enter__(self):
+		self.start = time.monotonic_ns()
+		return self
+
+	def __exit__(self, *exc):
+		end = time.monotonic_ns()
+		self.events.append((self.name, self.start // 1000, (end - self.start) // 1000))
+		return False
+
+
+class Profiler(NullProfiler):
+	"""
+	Per-process profiling that can be toggled at runtime, by PROFILE_SIGNAL or a ControlServer command.
+	- Every component polls the shared flag at each tick, runs cProfile and records its spans while it is set.
+	- When the flag is cleared, each component writes a .prof file and its trace events,
+	  then merge() assembles all processes on a single Chrome trace-event timeline.
+	- When tracing memory, each component runs tracemalloc and writes its top allocators on every sample_memory() request.
+	"""
+
+	def __init__(self, directory="profiles", trace_memory=False):
+		"""
+		Initialize the shared profiling flag.
+
+		:param directory: Directory of the profiling files.
+		:param trace_memory: Whether the components trace their allocations with tracemalloc, for sample_memory().
+		"""
+		self.directory = directory
+		self.enabled = multiprocessing.Value("b", False)
+		self.started = multiprocessing.Value("i", 0)
+		self.dumped = multiprocessing.Value("i", 0)
+		self.profile = None
+		self.events = []
+		self.trace_memory = trace_memory
+		self.memory_request = multiprocessing.Value("i", 0)
+		self.memory_sampled = multiprocessing.Value("i", 0)
+		self.memory_seen = 0
+		self.toggle_requested = False  # Set by request_toggle() in the main process, applied by its main loop with toggle()
+
+	def poll(self, component):
+		"""
+		Starts or stops profiling the current process according to the shared flag, called once per tick.
+
+		:param component: Name of the component running in the current process.
+		"""
+		if self.enabled.value and self.profile is None:
+			self.events = []
+			self.profile = cProfile.Profile()
+			self.profile.enable()
+			with self.started.get_lock():
+				self.started.value += 1
+		elif not self.enabled.value and self.profile is not None:
+			self.profile.disable()
+			self.dump(component)
+			self.profile = None
+			with self.dumped.get_lock():
+				self.dumped.value += 1
+		if self.trace_memory:
+			self.poll_memory(component)
+
+	def poll_memory(self, component):
+		"""
+		Starts tracemalloc in the current process, and writes a memory sample when one was requested since the last call.
+
+		:param component: Name of the component running in the current process.
+		"""
+		if not tracemalloc.is_tracing():
+			tracemalloc.start()
+		request = self.memory_request.value
+		if request == self.memory_seen:
+			return
+		self.memory_seen = request
+		current, peak = tracemalloc.get_traced_memory()
+		statistics = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATORS]
+		sample = {"component": component, "pid": os.getpid(), "request": request, "traced": current, "peak": peak, "top": [{"site": str(stat.traceback), "size": stat.size, "count": stat.count} for stat in statistics]}
+		os.makedirs(self.directory, exist_ok=True)
+		with open(os.path.join(self.directory, f"{component}-{os.getpid()}.memory.json"), "w") as file:
+			json.dump(sample, file)
+		with self.memory_sampled.get_lock():
+			self.memory_sampled.value += 1
+
+	def sample_memory(self, components: int, timeout=DUMP_TIMEOUT):
+		"""
+		Requests a memory sample from every component and waits for them to write it at their next tick.
+
+		:param components: Number of components expected to answer.
+		:param timeout: Seconds to wait for the samples.
+		:return: Dictionary of the samples per component name, the ones that did not answer in time are missing.
+		"""
+		with self.memory_sampled.get_lock():
+			self.memory_sampled.value = 0
+		with self.memory_request.get_lock():
+			self.memory_request.value += 1
+			request = self.memory_request.value
+		deadline = time.monotonic() + timeout
+		while self.memory_sampled.value < components and time.monotonic() < deadline:
+			time.sleep(0.01)
+
+		samples = {}
+		for path in glob.glob(os.path.join(self.directory, "*.memory.json")):
+			with open(path) as file:
+				sample = json.load(file)
+			if sample["request"] == request:
+				samples[sample["component"]] = sample
+		return samples
+
+	def span(self, name):
+		"""
+		:param name: Name of the traced operation (sleep, wait, accept, move, send...).
+		:return: Context manager recording the operation while profiling, a no-op otherwise.
+		"""
+		if self.profile is None:
+			return NULL_SPAN
+		return Span(self.events, name)
+
+	def dump(self, component):
+		"""
+		Writes the cProfile statistics and the trace events of the current process.
+
+		:param component: Name of the component running in the current process.
+		"""
+		os.makedirs(self.directory, exist_ok=True)
+		pid = os.getpid()
+		self.profile.dump_stats(os.path.join(self.directory, f"{component}-{pid}.prof"))
+
+		events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": pid, "args": {"name": component}}]
+		events += [{"name": name, "cat": component, "ph": "X", "ts": start, "dur": duration, "pid": pid, "tid": pid} for name, start, duration in self.events]
+		with open(os.path.join(self.directory, f"{component}-{pid}.events.json"), "w") as file:
+			json.dump(events, file)
+		self.events = []
+
+	def start(self):
+		"""
+		Enables profiling in every component from their next tick.
+		"""
+		with self.started.get_lock():
+			self.started.value = 0
+		with self.dumped.get_lock():
+			self.dumped.value = 0
+		for path in glob.glob(os.path.join(self.directory, "*.events.json")):
+			os.unlink(path)
+		self.enabled.value = True
+
+	def stop(self):
+		"""
+		Disables profiling, waits for the components to write their files and merges them.
+
+		:return: Path of the merged Chrome trace.
+		"""
+		self.enabled.value = False
+		deadline = time.monotonic() + DUMP_TIMEOUT
+		while self.dumped.value < self.started.value and time.monotonic() < deadline:
+			time.sleep(0.01)
+		return self.merge()
+
+	def merge(self):
+		"""
+		Merges the trace events of every process into a single file, to open in chrome://tracing or Perfetto.
+
+		:return: Path of the merged Chrome trace.
+		"""
+		events = []
+		for path in sorted(glob.glob(os.path.join(self.directory, "*.events.json"))):
+			with open(path) as file:
+				events += json.load(file)
+		path = os.path.join(self.directory, "trace.json")
+		with open(path, "w") as file:
+			json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+		return path
+
+	def request_toggle(self, *_):
+		"""
+		PROFILE_SIGNAL handler, only records the request.
+		Stopping waits for the components and merges their files, which is left to the main loop calling toggle().
+		"""
+		self.toggle_requested = True
+
+	def toggle(self):
+		"""
+		Starts profiling if it is stopped, stops it otherwise, and clears the toggle request.
+
+		:return: Path of the merged Chrome trace if profiling was stopped, None if it was started.
+		"""
+		self.toggle_requested = False
+		if self.enabled.value:
+			return self.stop()
+		self.start()
+		return None
+
+	def command(self, line: str) -> str:
+		"""
+		Applies a textual control command: 'on', 'off' or 'status'.
+
+		:param line: Command line without its 'profile' prefix.
+		:return: Reply describing the profiling state.
+		:raises ValueError: If the command is unknown.
+		"""
+		command = line.strip() or "status"
+		if command == "on":
+			self.start()
+			return "profiling"
+		if command == "off":
+			return f"trace written to {self.stop()}"
+		if command == "status":
+			return f"enabled={bool(self.enabled.value)} processes={self.started.value}"
+		raise ValueError(f"Unknown profile command: {command}")
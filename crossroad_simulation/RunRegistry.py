@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import secrets
+import signal
+import tempfile
+import time
+from multiprocessing import shared_memory
+
+import sysv_ipc
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "crossroad_runs")
+KINDS = ["sysv", "shm", "socket", "process"]  # Kinds of resources a run can own
+
+
+def start_time(pid: int):
+	"""
+	Start time of a process, to tell it apart from a later process reusing its pid.
+
+	:param pid: Process ID.
+	:return: Start time in clock ticks since boot, or None if the process does not exist.
+	"""
+	try:
+		with open(f"/proc/{pid}/stat") as file:
+			stat = file.read()
+	except OSError:
+		return None
+	return int(stat.rpartition(")")[2].split()[19])
+
+
+def release(kind: str, name):
+	"""
+	Releases a resource, ignoring the ones already gone.
+
+	:param kind: Kind of the resource, one of KINDS.
+	:param name: SysV key, shared memory name, socket path or [pid, start time] of a process.
+	"""
+	try:
+		if kind == "sysv":
+			sysv_ipc.MessageQueue(name).remove()
+		elif kind == "shm":
+			shm = shared_memory.SharedMemory(name=name)
+			shm.close()
+			shm.unlink()
+		elif kind == "socket":
+			os.unlink(name)
+		elif kind == "process":
+			pid, started = name
+			if start_time(pid) == started:
+				os.kill(pid, signal.SIGKILL)
+	except (sysv_ipc.ExistentialError, FileNotFoundError, ProcessLookupError):
+		pass
+
+
+class Run:
+	"""
+	Record of a live simulation in the run registry, a directory holding one JSON file per run.
+	Every IPC resource of the run is added to its record, so it can be released when the run exits,
+	or by cleanup_stale() when the run crashed without releasing it.
+	"""
+
+	def __init__(self, directory=DEFAULT_DIRECTORY, description=""):
+		"""
+		Creates the record of the current process.
+
+		:param directory: Directory of the run registry.
+		:param description: Free text shown by the registry listing, e.g. the command line.
+		"""
+		self.directory = directory
+		self.run_id = f"{os.getpid()}-{secrets.token_hex(3)}"
+		self.record = {"run_id": self.run_id, "pid": os.getpid(), "start_time": start_time(os.getpid()), "created": time.time(), "description": description, "resources": []}
+		os.makedirs(directory, exist_ok=True)
+		self.save()
+
+	@property
+	def path(self):
+		"""
+		:return: Path of the JSON record of the run.
+		"""
+		return os.path.join(self.directory, f"{self.run_id}.json")
+
+	def save(self):
+		"""
+		Writes the record atomically.
+		"""
+		temporary_path = f"{self.path}.tmp"
+		with open(temporary_path, "w") as file:
+			json.dump(self.record, file)
+		os.replace(temporary_path, self.path)
+
+	def add(self, kind: str, name):
+		"""
+		Adds a resource to the run, before it is used by any process.
+
+		:param kind: Kind of the resource, one of KINDS.
+		:param name: Identifier of the resource, see release().
+		:raises ValueError: If the kind is unknown.
+		"""
+		if kind not in KINDS:
+			raise ValueError(f"Unknown resource kind: {kind}")
+		self.record["resources"].append([kind, name])
+		self.save()
+
+	def add_process(self, pid: int):
+		"""
+		Adds a child process, killed by cleanup_stale() if it outlived a crashed run.
+
+		:param pid: Process ID.
+		"""
+		if ["process", [pid, start_time(pid)]] not in self.record["resources"]:
+			self.add("process", [pid, start_time(pid)])
+
+	def socket_path(self, name: str):
+		"""
+		Reserves the path of a Unix domain socket of the run.
+
+		:param name: Name of the socket, e.g. 'control'.
+		:return: Path of the socket.
+		"""
+		path = os.path.join(self.directory, f"{self.run_id}-{name}.sock")
+		self.add("socket", path)
+		return path
+
+	def close(self):
+		"""
+		Releases every resource of the run, latest first, and removes its record.
+		"""
+		for kind, name in reversed(self.record["resources"]):
+			if kind != "process":
+				release(kind, name)
+		self.record["resources"] = []
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+
+
+def runs(directory=DEFAULT_DIRECTORY):
+	"""
+	Reads the records of the run registry.
+
+	:param directory: Directory of the run registry.
+	:return: List of record dictionaries, with an 'alive' entry telling whether the run process still exists.
+	"""
+	records = []
+	if not os.path.isdir(directory):
+		return records
+	for filename in sorted(os.listdir(directory)):
+		if not filename.endswith(".json"):
+			continue
+		try:
+			with open(os.path.join(directory, filename)) as file:
+				record = json.load(file)
+		except (OSError, ValueError):
+			continue
+		record["alive"] = start_time(record["pid"]) == record["start_time"]
+		records.append(record)
+	return records
+
+
+def cleanup_stale(directory=DEFAULT_DIRECTORY):
+	"""
+	Releases the resources of the runs whose process died without releasing them, and kills their orphan processes.
+
+	:param directory: Directory of the run registry.
+	:return: List of the IDs of the cleaned runs.
+	"""
+	cleaned = []
+	for record in runs(directory):
+		if record["alive"]:
+			continue
+		for kind, name in reversed(record["resources"]):
+			release(kind, name)
+		try:
+			os.unlink(os.path.join(directory, f"{record['run_id']}.json"))
+		except FileNotFoundError:
+			continue
+		cleaned.append(record["run_id"])
+	return cleaned
+
+
+def find_socket(name: str, run_id=None, directory=DEFAULT_DIRECTORY):
+	"""
+	Finds a socket of a live run.
+
+	:param name: Name of the socket, e.g. 'control'.
+	:param run_id: ID of the run, may be omitted when a single run is alive.
+	:param directory: Directory of the run registry.
+	:return: Path of the socket.
+	:raises ValueError: If no run or several runs match.
+	"""
+	candidates = [record for record in runs(directory) if record["alive"] and run_id in (None, record["run_id"])]
+	if len(candidates) != 1:
+		raise ValueError(f"{len(candidates)} live runs match, expected exactly one: {[record['run_id'] for record in candidates]}")
+	return os.path.join(directory, f"{candidates[0]['run_id']}-{name}.sock")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Registry of the simulations running on this host.")
+	parser.add_argument("--directory", default=DEFAULT_DIRECTORY, help="Directory of the run registry.")
+	parser.add_argument("--clean", action="store_true", help="Release the resources of the crashed runs.")
+	args = parser.parse_args()
+
+	if args.clean:
+		for run_id in cleanup_stale(args.directory):
+			print(f"cleaned {run_id}")
+	for record in runs(args.directory):
+		state = "alive" if record["alive"] else "stale"
+		print(f"{record['run_id']:<16} {state:<6} {len(record['resources']):>3} resources  {record['description']}")
@@ -0,0 +1,195 @@
+import argparse
+import json
+from array import array
+
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.LightColor import LightColor
+
+DIRECTIONS = list(Direction)
+DAY_TICKS = 86400  # Ticks of a day of a plan file with a time-of-day schedule, one tick per second
+MINUTES_PER_DAY = 24 * 60
+
+
+def default_plan(phase_ticks: int):
+	"""
+	Plan of the original fixed cycle: north-south green then east-west green, phase_ticks each, without clearance.
+
+	:param phase_ticks: Duration of a phase in ticks.
+	:return: Plan file dictionary, see compile_plans().
+	"""
+	phases = [{"green": [Direction.NORTH.value, Direction.SOUTH.value], "ticks": phase_ticks}, {"green": [Direction.EAST.value, Direction.WEST.value], "ticks": phase_ticks}]
+	return {"plans": {"default": {"phases": phases}}}
+
+
+def time_of_day(value, day_ticks: int):
+	"""
+	Converts a time of day to a tick of the day.
+
+	:param value: Tick of the day, or 'HH:MM' string.
+	:param day_ticks: Ticks of a day.
+	:return: Tick of the day.
+	:raises ValueError: If the time is invalid or outside of the day.
+	"""
+	if isinstance(value, str):
+		hours, _, minutes = value.partition(":")
+		value = round((int(hours) * 60 + int(minutes or 0)) * day_ticks / MINUTES_PER_DAY)
+	if not 0 <= value < day_ticks:
+		raise ValueError(f"Time of day {value} outside of a day of {day_ticks} ticks")
+	return value
+
+
+def compile_cycle(name: str, plan: dict):
+	"""
+	Compiles the cycle of a plan: its phases, each followed by all_red ticks of clearance.
+
+	:param name: Name of the plan, for the error messages.
+	:param plan: Dictionary with 'phases', a list of {'green': [directions], 'ticks': n}, and optional 'all_red' and 'offset' ticks.
+	:return: Tuple (list of the light states of the cycle, each a bytes of one LightColor value per direction, offset).
+	:raises ValueError: If the plan is invalid.
+	"""
+	all_red = plan.get("all_red", 0)
+	if not plan.get("phases") or all_red < 0:
+		raise ValueError(f"Plan {name} needs at least one phase and a non-negative all_red")
+	red = bytes([LightColor.RED.value] * len(DIRECTIONS))
+	cycle = []
+	for phase in plan["phases"]:
+		green = {Direction(direction) for direction in phase["green"]}
+		if phase["ticks"] < 1:
+			raise ValueError(f"A phase of plan {name} must last at least one tick")
+		state = bytes(LightColor.GREEN.value if direction in green else LightColor.RED.value for direction in DIRECTIONS)
+		cycle += [state] * phase["ticks"] + [red] * all_red
+	return cycle, plan.get("offset", 0)
+
+
+def compile_plans(spec: dict):
+	"""
+	Compiles a plan file into a tick to light state table.
+	A plan file holds named plans and an optional time-of-day schedule switching between them:
+	{"day_ticks": 86400, "start": "06:00",
+	"plans": {"normal": {"phases": [{"green": ["north", "south"], "ticks": 30}, {"green": ["east", "west"], "ticks": 30}], "all_red": 2},
+	"peak": {"phases": [...], "offset": 10}},
+	"schedule": [{"at": "00:00", "plan": "normal"}, {"at": "07:00", "plan": "peak"}, {"at": "09:30", "plan": "normal"}]}
+	The cycle of a plan is aligned on tick 0 of the day shifted by its offset, so a plan switch lands on the same phase every day.
+	Without a schedule the file must hold a single plan, and the table is its cycle.
+	Times of day are ticks of the day or 'HH:MM' strings, and 'start' is the time of day of the first tick of the simulation.
+
+	:param spec: Plan file dictionary.
+	:return: SignalSchedule of the plans.
+	:raises ValueError: If the plan file is invalid.
+	"""
+	cycles = {name: compile_cycle(name, plan) for name, plan in spec.get("plans", {}).items()}
+	schedule = spec.get("schedule")
+	if not schedule:
+		if len(cycles) != 1:
+			raise ValueError(f"A plan file without schedule must hold exactly one plan, found {len(cycles)}")
+		(cycle, offset), = cycles.values()
+		table = [cycle[(tick - offset) % len(cycle)] for tick in range(len(cycle))]
+		return SignalSchedule(b"".join(table))
+
+	day_ticks = spec.get("day_ticks", DAY_TICKS)
+	switches = sorted((time_of_day(entry["at"], day_ticks), entry["plan"]) for entry in schedule)
+	unknown = {name for _, name in switches} - set(cycles)
+	if unknown:
+		raise ValueError(f"Unknown plans in the schedule: {sorted(unknown)}")
+	# The day wraps around: the ticks before the first switch run the last plan of the day
+	cycle, offset = cycles[switches[-1][1]]
+	table = [cycle[(tick - offset) % len(cycle)] for tick in range(switches[0][0])]
+	for index, (start, name) in enumerate(switches):
+		end = switches[index + 1][0] if index + 1 < len(switches) else day_ticks
+		cycle, offset = cycles[name]
+		table += [cycle[(tick - offset) % len(cycle)] for tick in range(start, end)]
+	return SignalSchedule(b"".join(table), time_of_day(spec.get("start", 0), day_ticks))
+
+
+def load_plans(path: str):
+	"""
+	Reads and compiles a plan file.
+
+	:param path: JSON plan file.
+	:return: SignalSchedule of the plans.
+	:raises ValueError: If the plan file is invalid.
+	"""
+	with open(path) as file:
+		return compile_plans(json.load(file))
+
+
+class SignalSchedule:
+	"""
+	Precomputed light state of every tick of a periodic signal plan, compiled by compile_plans().
+	The table is immutable, the traffic lights index it instead of deciding their phases, and the Coordinator reads
+	the same table to anticipate the next phase change. Priority phases are not part of the table, the lights
+	preempt it at a phase change and resume it at the current tick once the priority vehicle went through.
+	"""
+
+	def __init__(self, table: bytes, start=0):
+		"""
+		Precomputes the ticks remaining before every state change.
+
+		:param table: Light states of one period, one LightColor value per direction and tick in Direction order.
+		:param start: Index of the table at tick 0.
+		"""
+		self.table = table
+		self.start = start
+		self.period = len(table) // len(DIRECTIONS)
+		self.remaining_ticks = array("I", [0] * self.period)
+		# Ticks until the state changes, computed backwards over two periods so the last spell wraps around
+		count = self.period
+		for index in range(2 * self.period - 1, -1, -1):
+			position = index % self.period
+			if self.raw(position) != self.raw((position + 1) % self.period):
+				count = 0
+			count = min(count + 1, self.period)
+			if index < self.period:
+				self.remaining_ticks[position] = count
+
+	def raw(self, position: int) -> bytes:
+		"""
+		:param position: Index in the table.
+		:return: Light state at this index, one LightColor value per direction.
+		"""
+		offset = position * len(DIRECTIONS)
+		return self.table[offset:offset + len(DIRECTIONS)]
+
+	def state(self, tick: int):
+		"""
+		:param tick: Simulation tick.
+		:return: Dictionary of the LightColor value of each direction at this tick.
+		"""
+		return dict(zip(DIRECTIONS, self.raw((self.start + tick) % self.period)))
+
+	def remaining(self, tick: int) -> int:
+		"""
+		:param tick: Simulation tick.
+		:return: Number of ticks the state of this tick lasts from it, the period if it never changes.
+		"""
+		return self.remaining_ticks[(self.start + tick) % self.period]
+
+	def next_change(self, tick: int) -> int:
+		"""
+		:param tick: Simulation tick.
+		:return: First tick after it with a different state.
+		"""
+		return tick + self.remaining(tick)
+
+	def green_share(self, direction: Direction) -> float:
+		"""
+		:param direction: Direction of a light.
+		:return: Share of the ticks of the period the light is green.
+		"""
+		index = DIRECTIONS.index(direction)
+		return self.table[index::len(DIRECTIONS)].count(LightColor.GREEN.value) / self.period
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compiles a signal plan file and prints its phase changes.")
+	parser.add_argument("plan", help="JSON plan file.")
+	parser.add_argument("--ticks", type=int, default=100, help="Number of ticks to print from the first one.")
+	args = parser.parse_args()
+
+	schedule = load_plans(args.plan)
+	print(f"period {schedule.period} ticks, {len(schedule.table)} bytes, green shares " + " ".join(f"{direction.value}={schedule.green_share(direction):.2f}" for direction in Direction))
+	tick = 0
+	while tick < args.ticks:
+		green = [direction.value for direction, light in schedule.state(tick).items() if light == LightColor.GREEN.value]
+		print(f"{tick:>8} +{schedule.remaining(tick):<6} {' '.join(green) or 'all red'}")
+		tick = schedule.next_change(tick)
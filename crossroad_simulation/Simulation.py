@@ -0,0 +1,369 @@
+import multiprocessing
+import os
+import queue
+import time
+
+from crossroad_simulation import Checkpoint, Display
+from crossroad_simulation.Admission import Admission, MAX_VEHICLES_IN_QUEUE, POLICIES, SPILL_CAPACITY
+from crossroad_simulation.Checkpoint import Checkpointer, PARTIES
+from crossroad_simulation.Coordinator import Coordinator
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.EventLog import EventLog, OFF
+from crossroad_simulation.LightColor import LightColor
+from crossroad_simulation.Lights import TrafficLights, PHASE_TICKS
+from crossroad_simulation.MacroStep import MacroStep
+from crossroad_simulation.NormalTrafficGen import NormalTrafficGen
+from crossroad_simulation.PriorityTrafficGen import PriorityTrafficGen
+from crossroad_simulation.Profiler import Profiler
+from crossroad_simulation.RunRegistry import Run
+from crossroad_simulation.SignalPlan import compile_plans, default_plan, load_plans
+from crossroad_simulation.SnapshotRing import SnapshotChannel
+from crossroad_simulation.TimeManager import TimeManager
+from crossroad_simulation.Transport import BACKENDS, LightsChannel, TransportEmpty, create_transport
+
+PARAMETERS = {"phase_ticks": PHASE_TICKS, "normal_rate": NormalTrafficGen.RATE, "priority_rate": PriorityTrafficGen.RATE, "seed": None, "macro_ticks": 1, "admission": POLICIES[0], "queue_capacity": MAX_VEHICLES_IN_QUEUE, "spill_capacity": SPILL_CAPACITY, "road_capacity": 0, "plan": None}
+PARAMETER_TYPES = {"phase_ticks": int, "normal_rate": float, "priority_rate": float, "seed": int, "macro_ticks": int, "admission": str, "queue_capacity": int, "spill_capacity": int, "road_capacity": int, "plan": str}
+POLL_DELAY = 0.01  # Seconds between two checks of the published tick
+STOP_TIMEOUT = 1  # Seconds a terminated component has to exit before it is killed
+TRANSPORTS = {"vehicles": "sysv", "lights": "manager", "display": "ring"}  # Backend of each channel, 'manager' and 'ring' are the original shared dictionary and snapshot ring
+START_METHODS = ["fork", "spawn", "forkserver"]
+PRELOADED_MODULES = [
+	"crossroad_simulation.Simulation",
+	"crossroad_simulation.Display",
+	"sysv_ipc",
+]  # Imported once by the forkserver, its children start with every component loaded
+
+
+def set_start_method(start_method: str):
+	"""
+	Sets the start method of the simulation processes, must be called once before any of them is created.
+	The forkserver imports the simulation modules once, then forks every later process from that warm state.
+
+	:param start_method: One of START_METHODS.
+	"""
+	multiprocessing.set_start_method(start_method)
+	if start_method == "forkserver":
+		multiprocessing.set_forkserver_preload(PRELOADED_MODULES)
+
+
+def parse_parameters(assignments):
+	"""
+	Parses 'name=value' assignments of simulation parameters.
+
+	:param assignments: Iterable of assignment strings.
+	:return: Dictionary of typed parameter values.
+	:raises ValueError: If a parameter is unknown or its value is invalid.
+	"""
+	params = {}
+	for assignment in assignments:
+		name, _, value = assignment.partition("=")
+		name = name.strip()
+		if name not in PARAMETER_TYPES:
+			raise ValueError(f"Unknown simulation parameter: {name}")
+		params[name] = PARAMETER_TYPES[name](value)
+	return params
+
+
+def parse_transports(assignments):
+	"""
+	Parses 'channel=backend' assignments of the transport backends.
+
+	:param assignments: Iterable of assignment strings.
+	:return: Dictionary of backend names per channel.
+	:raises ValueError: If a channel or backend is unknown.
+	"""
+	transports = {}
+	for assignment in assignments:
+		channel, _, backend = assignment.partition("=")
+		channel, backend = channel.strip(), backend.strip()
+		if channel not in TRANSPORTS:
+			raise ValueError(f"Unknown transport channel: {channel}")
+		if backend not in BACKENDS and backend != TRANSPORTS[channel]:
+			raise ValueError(f"Unknown transport backend for {channel}: {backend}")
+		transports[channel] = backend
+	return transports
+
+
+class Simulation:
+	"""
+	Wires every component of the crossroad simulation together.
+	A simulation can start from scratch or resume from a checkpoint, with parameters overriding the checkpointed ones.
+	"""
+
+	def __init__(self, manager, time_manager: TimeManager, params=None, key_base=None, display=True, checkpoint_dir=None, checkpoint_interval=0, checkpoint=None, profile_dir="profiles", stats=None, event_log=EventLog(level=OFF), transports=None, run=None, trace_memory=False):
+		"""
+		Creates the shared resources and the component processes, without starting them.
+
+		:param manager: multiprocessing.Manager holding the shared lights.
+		:param time_manager: Instance of TimeManager shared by every component.
+		:param params: Dictionary of simulation parameters overriding PARAMETERS.
+		:param key_base: SysV key of the first traffic queue, the four directions use consecutive keys. Free keys are generated if None.
+		:param display: Whether to run the curses display.
+		:param checkpoint_dir: Directory of the checkpoint files.
+		:param checkpoint_interval: Number of ticks between two checkpoints, 0 to disable them.
+		:param checkpoint: Checkpoint dictionary to resume from, as returned by Checkpoint.load.
+		:param profile_dir: Directory of the profiling files, profiling is toggled at runtime through self.profiler.
+		:param stats: Optional AcceptStats given to the Coordinator.
+		:param event_log: EventLog shared by every component.
+		:param transports: Dictionary of backend names per channel overriding TRANSPORTS.
+		:param run: Optional RunRegistry Run recording the IPC resources and processes of the simulation.
+		:param trace_memory: Whether the components trace their allocations, sampled through self.profiler.sample_memory().
+		"""
+		self.params = dict(PARAMETERS)
+		if checkpoint is not None:
+			self.params.update(checkpoint["params"])
+		self.params.update(params or {})
+		self.manager = manager
+		self.time_manager = time_manager
+		self.transports = dict(TRANSPORTS)
+		self.transports.update(transports or {})
+		self.channels = []
+		self.run = run
+		start_tick = checkpoint["tick"] if checkpoint is not None else 0
+
+		# The transports and the snapshot ring outlive the process, so they are released if a later step fails
+		try:
+			lights_state = {direction: LightColor.RED.value for direction in Direction}
+			if checkpoint is not None:
+				lights_state = {Direction(direction): light for direction, light in checkpoint["lights_state"].items()}
+			if self.transports["lights"] == TRANSPORTS["lights"]:
+				self.shared_lights = manager.dict(lights_state)
+			else:
+				self.shared_lights = LightsChannel(self.create_channel(self.transports["lights"]), lights_state)
+
+			self.light_event = multiprocessing.Event()
+			self.tick_barrier = multiprocessing.Barrier(PARTIES)
+			self.traffic_generators_event = {traffic: multiprocessing.Event() for traffic in ["normal_traffic_generators", "priority_traffic_generators"]}
+
+			keys = [None] * len(Direction) if key_base is None else range(key_base, key_base + len(Direction))
+			self.traffic_queues = {direction: self.create_channel(self.transports["vehicles"], key) for key, direction in zip(keys, Direction)}
+			if checkpoint is not None:
+				self.refill_queues(checkpoint["queues"])
+
+			self.checkpointer = None
+			if checkpoint_interval > 0:
+				self.checkpointer = Checkpointer(manager, checkpoint_dir or "checkpoints", checkpoint_interval, self.params, start_tick)
+
+			self.profiler = Profiler(profile_dir, trace_memory)
+
+			self.macro_step = None
+			if self.params["macro_ticks"] > 1:
+				self.macro_step = MacroStep(self.params["macro_ticks"], self.checkpointer)
+
+			# Without a display process the snapshots only go to the ring, a channel nobody reads would just fill up
+			display_channel = None
+			if display and self.transports["display"] != TRANSPORTS["display"]:
+				display_channel = SnapshotChannel(self.create_channel(self.transports["display"]))
+
+			self.admission = Admission(self.params["admission"], self.params["queue_capacity"], self.params["spill_capacity"])
+			self.schedule = load_plans(self.params["plan"]) if self.params["plan"] else compile_plans(default_plan(self.params["phase_ticks"]))
+
+			seed = self.params["seed"]
+			self.lights = TrafficLights(self.shared_lights, self.light_event, self.tick_barrier, time_manager, self.params["phase_ticks"], seed, self.checkpointer, self.profiler, event_log, self.macro_step, self.schedule)
+			self.normal_traffic_generator = NormalTrafficGen(self.traffic_generators_event["normal_traffic_generators"], self.tick_barrier, self.lights, self.traffic_queues, time_manager, self.params["normal_rate"], seed, self.checkpointer, self.profiler, event_log, self.macro_step, self.admission)
+			self.priority_traffic_generator = PriorityTrafficGen(self.traffic_generators_event["priority_traffic_generators"], self.tick_barrier, self.lights, self.traffic_queues, time_manager, self.params["priority_rate"], seed, self.checkpointer, self.profiler, event_log, self.macro_step, self.admission)
+			self.coordinator = Coordinator(self.tick_barrier, self.light_event, self.lights.get_shared_lights_state(), self.lights.signal_pid, self.traffic_queues, list(self.traffic_generators_event.values()), time_manager, seed, self.checkpointer, self.profiler, stats, event_log, display_channel, self.macro_step, self.admission, self.params["road_capacity"], self.schedule)
+			self.processes = [self.lights, self.normal_traffic_generator, self.priority_traffic_generator, self.coordinator]
+			if run is not None:
+				run.add("shm", self.coordinator.snapshots.name)
+
+			if checkpoint is not None:
+				for component in self.processes:
+					component.restore_state(checkpoint["components"][component.COMPONENT])
+
+			if display:
+				snapshots = display_channel if display_channel is not None else self.coordinator.snapshots
+				self.processes.append(multiprocessing.Process(target=Display.run_display, args=(snapshots, ), name="display"))
+		except BaseException:
+			self.close()
+			raise
+
+	def create_channel(self, backend, key=None):
+		"""
+		Creates a transport released by close().
+
+		:param backend: Name of the backend.
+		:param key: SysV key, only used by the 'sysv' backend.
+		:return: Transport instance.
+		"""
+		transport = create_transport(backend, key)
+		self.channels.append(transport)
+		if self.run is not None:
+			for kind, name in transport.resources():
+				self.run.add(kind, name)
+		return transport
+
+	def refill_queues(self, queues):
+		"""
+		Replaces the content of the traffic queues by checkpointed messages.
+
+		:param queues: Dictionary of message lists per direction value.
+		"""
+		for direction, queue in self.traffic_queues.items():
+			try:
+				while True:
+					queue.receive(block=False)
+			except TransportEmpty:
+				pass
+			for message in queues[direction.value]:
+				queue.send(message)
+
+	def start(self):
+		"""
+		Starts every component process, recording them and the other children (e.g. the Manager server) in the run.
+		"""
+		for process in self.processes:
+			process.start()
+		if self.run is not None:
+			for process in multiprocessing.active_children():
+				self.run.add_process(process.pid)
+
+	def pids(self):
+		"""
+		:return: Dictionary of the process IDs of the started simulation per component name, including the display and the Manager server.
+		"""
+		pids = {getattr(process, "COMPONENT", process.name): process.pid for process in self.processes}
+		server = getattr(self.manager, "_process", None)  # Set by Manager.start(), absent for a Manager served elsewhere
+		if server is not None:
+			pids["manager"] = server.pid
+		return pids
+
+	def tick(self):
+		"""
+		:return: Last tick published by the Coordinator.
+		"""
+		snapshot = self.coordinator.snapshots.latest()
+		return snapshot.tick if snapshot is not None else 0
+
+	def wait_tick(self, tick):
+		"""
+		Blocks until the Coordinator published the given tick.
+
+		:param tick: Tick to wait for.
+		"""
+		while self.tick() < tick:
+			self.check()
+			time.sleep(POLL_DELAY)
+
+	def check(self):
+		"""
+		:raises RuntimeError: If a started component process exited, the published tick would not advance anymore.
+		The display is not a component, closing its window does not stop the simulation.
+		"""
+		exited = {process.COMPONENT: process.exitcode for process in self.processes if hasattr(process, "COMPONENT") and process.exitcode is not None}
+		if exited:
+			raise RuntimeError(f"Component processes exited: {exited}")
+
+	def stop(self):
+		"""
+		Terminates every component process.
+		A component terminated while waiting on the tick barrier may block on its lock if another one died holding it,
+		so the ones still alive after STOP_TIMEOUT are killed.
+		"""
+		for process in self.processes:
+			process.terminate()
+		for process in self.processes:
+			process.join(STOP_TIMEOUT)
+			if process.is_alive():
+				process.kill()
+				process.join()
+
+	def close(self):
+		"""
+		Releases the transports and the snapshot ring, must be called after stop().
+		Also called by __init__ when it fails, before every resource was created.
+		"""
+		for transport in self.channels:
+			transport.remove()
+		self.channels = []
+		if hasattr(self, "coordinator"):
+			self.coordinator.snapshots.unlink()
+
+
+def run_continuation(checkpoint_path, params, ticks, key_base, checkpoint_dir, mode, time_unit, factor, results, run_directory=None, index=0):
+	"""
+	Runs a headless continuation of a checkpoint and writes its final state, used by fork().
+
+	:param checkpoint_path: Checkpoint file to resume from.
+	:param params: Parameters overriding the checkpointed ones.
+	:param ticks: Number of ticks to simulate after the checkpoint.
+	:param key_base: SysV key of the first traffic queue of this continuation, None for generated keys.
+	:param checkpoint_dir: Directory of the final checkpoint of this continuation.
+	:param mode: Clock mode of the continuation.
+	:param time_unit: Length of a tick in seconds.
+	:param factor: Real-time factor of the 'factor' clock mode.
+	:param results: multiprocessing.Queue receiving (index, params, summary) once done, or (index, params, exception) if the continuation failed.
+	:param run_directory: Optional run registry directory the continuation registers its resources in.
+	:param index: Index of the continuation in the variants of fork().
+	"""
+	run = None
+	try:
+		checkpoint = Checkpoint.load(checkpoint_path)
+		end_tick = checkpoint["tick"] + ticks
+		run = Run(run_directory, f"fork of {checkpoint_path} with {params}") if run_directory is not None else None
+		with multiprocessing.Manager() as manager:
+			simulation = Simulation(manager, TimeManager(mode, time_unit, factor), params, key_base, False, checkpoint_dir, end_tick, checkpoint, run=run)
+			reader = simulation.coordinator.snapshots.reader()
+			total_waiting, samples = 0, 0
+			simulation.start()
+			try:
+				while simulation.tick() < end_tick:
+					for snapshot in reader.poll():
+						total_waiting += sum(snapshot.queue_lengths.values())
+						samples += 1
+					simulation.check()
+					time.sleep(POLL_DELAY)
+				while not os.path.exists(simulation.checkpointer.path(end_tick)):
+					simulation.check()
+					time.sleep(POLL_DELAY)
+			finally:
+				simulation.stop()
+				simulation.close()
+	except Exception as error:
+		results.put((index, params, error))
+		return
+	finally:
+		if run is not None:
+			run.close()
+
+	summary = {"mean_waiting": total_waiting / samples if samples else 0, "samples": samples, "overruns": reader.overruns, "checkpoint": simulation.checkpointer.path(end_tick)}
+	results.put((index, params, summary))
+
+
+def fork(checkpoint_path, variants, ticks, directory="forks", mode="afap", time_unit=1, factor=1, key_base=None, run_directory=None):
+	"""
+	Forks a checkpoint into parallel continuations with different parameters.
+
+	:param checkpoint_path: Checkpoint file to start every continuation from.
+	:param variants: List of parameter dictionaries, one per continuation.
+	:param ticks: Number of ticks each continuation simulates.
+	:param directory: Directory receiving one sub-directory per continuation.
+	:param mode: Clock mode of the continuations.
+	:param time_unit: Length of a tick in seconds.
+	:param factor: Real-time factor of the 'factor' clock mode.
+	:param key_base: SysV key base of the forked run, each continuation uses the next keys. Free keys are generated if None.
+	:param run_directory: Optional run registry directory each continuation registers its resources in.
+	:return: List of (params, summary) tuples in the order of the variants, the summary of a failed continuation is its exception.
+	"""
+	results = multiprocessing.Queue()
+	continuations = []
+	for index, params in enumerate(variants):
+		continuation_dir = os.path.join(directory, f"variant_{index}")
+		continuation_key_base = None if key_base is None else key_base + (index + 1) * len(Direction)
+		continuation = multiprocessing.Process(target=run_continuation, args=(checkpoint_path, params, ticks, continuation_key_base, continuation_dir, mode, time_unit, factor, results, run_directory, index))
+		continuation.start()
+		continuations.append(continuation)
+
+	summaries = {}
+	while len(summaries) < len(continuations):
+		try:
+			index, params, summary = results.get(timeout=STOP_TIMEOUT)
+			summaries[index] = (params, summary)
+		except queue.Empty:
+			# A continuation that exited flushed its result before, one still missing after a timeout will never come
+			for index, continuation in enumerate(continuations):
+				if index not in summaries and continuation.exitcode is not None and results.empty():
+					summaries[index] = (variants[index], RuntimeError(f"Continuation exited with code {continuation.exitcode} without a result"))
+	for continuation in continuations:
+		continuation.join()
+	return [summaries[index] for index in range(len(continuations))]
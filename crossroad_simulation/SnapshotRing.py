@@ -0,0 +1,297 @@
+import struct
+import time
+from multiprocessing import shared_memory
+
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.Transport import Transport, TransportEmpty, TransportFull
+from crossroad_simulation.Vehicle import Vehicle
+
+DEFAULT_CAPACITY = 64  # Number of snapshots kept in the ring
+MAX_SNAPSHOT_VEHICLES = 16  # Vehicles encoded per direction, the real queue length is always kept
+
+HEADER = struct.Struct("<QII")  # head sequence, capacity, slot size
+SLOT_HEADER = struct.Struct("<QQd")  # slot sequence (0 while written), tick, timestamp
+LIGHTS = struct.Struct(f"<{len(Direction)}B")
+ROAD = struct.Struct(f"<I{MAX_SNAPSHOT_VEHICLES}s")  # queue length, unbounded without road capacity, encoded vehicles
+SLOT_SIZE = SLOT_HEADER.size + LIGHTS.size + ROAD.size * len(Direction)
+
+DIRECTIONS = list(Direction)
+PRIORITY_FLAG = 0x80
+
+
+def encode_vehicle(vehicle: Vehicle) -> int:
+	"""
+	Encodes a vehicle of a queue on a single byte.
+
+	:param vehicle: Vehicle to encode.
+	:return: Destination index, with the high bit set for priority vehicles.
+	"""
+	code = DIRECTIONS.index(vehicle.destination)
+	if vehicle.type == "priority":
+		code |= PRIORITY_FLAG
+	return code
+
+
+def pack_snapshot(buf, offset, tick, lights_state, roads):
+	"""
+	Writes a snapshot slot, the slot sequence is left to 0 so readers ignore it until it is complete.
+
+	:param buf: Writable buffer.
+	:param offset: Offset of the slot in the buffer.
+	:param tick: Current simulation tick.
+	:param lights_state: Mapping of light values per direction.
+	:param roads: Mapping of the vehicle lists per direction.
+	"""
+	SLOT_HEADER.pack_into(buf, offset, 0, tick, time.time())
+	offset += SLOT_HEADER.size
+	LIGHTS.pack_into(buf, offset, *(lights_state[direction] for direction in DIRECTIONS))
+	offset += LIGHTS.size
+	for direction in DIRECTIONS:
+		vehicles = roads[direction]
+		codes = bytes(encode_vehicle(vehicle) for vehicle in vehicles[:MAX_SNAPSHOT_VEHICLES])
+		ROAD.pack_into(buf, offset, len(vehicles), codes)
+		offset += ROAD.size
+
+
+def decode_vehicle(code: int, source: Direction) -> Vehicle:
+	"""
+	Decodes a byte written by encode_vehicle.
+
+	:param code: Encoded vehicle.
+	:param source: Direction of the queue the vehicle is waiting in.
+	:return: Vehicle instance.
+	"""
+	vehicle_type = "priority" if code & PRIORITY_FLAG else "normal"
+	return Vehicle(vehicle_type, source, DIRECTIONS[code & ~PRIORITY_FLAG])
+
+
+class Snapshot:
+	"""
+	State of the crossroad published by the Coordinator at the end of a tick.
+	"""
+
+	def __init__(self, seq: int, tick: int, timestamp: float, data: bytes):
+		"""
+		Wraps a raw slot copied out of the ring.
+
+		:param seq: Sequence number of the snapshot in the ring.
+		:param tick: Simulation tick the snapshot was taken at.
+		:param timestamp: Wall-clock time of the publication.
+		:param data: Lights and roads part of the slot.
+		"""
+		self.seq = seq
+		self.tick = tick
+		self.timestamp = timestamp
+		self.data = data
+
+	@property
+	def lights(self):
+		"""
+		:return: Dictionary of light values per direction.
+		"""
+		return dict(zip(DIRECTIONS, LIGHTS.unpack_from(self.data, 0)))
+
+	@property
+	def queue_lengths(self):
+		"""
+		:return: Dictionary of the number of waiting vehicles per direction.
+		"""
+		return {direction: ROAD.unpack_from(self.data, LIGHTS.size + i * ROAD.size)[0] for i, direction in enumerate(DIRECTIONS)}
+
+	def vehicles(self, direction: Direction):
+		"""
+		Decodes the vehicles waiting in a direction, closest to the light first.
+
+		:param direction: Direction of the queue.
+		:return: List of at most MAX_SNAPSHOT_VEHICLES vehicles.
+		"""
+		length, codes = ROAD.unpack_from(self.data, LIGHTS.size + DIRECTIONS.index(direction) * ROAD.size)
+		return [decode_vehicle(code, direction) for code in codes[:min(length, MAX_SNAPSHOT_VEHICLES)]]
+
+
+class SnapshotRing:
+	"""
+	Fixed-size ring of crossroad snapshots living in shared memory.
+	- One writer (the Coordinator) publishes a snapshot per tick, never blocking on its readers.
+	- Any number of readers copy slots in place using sequence numbers, and detect when they were overrun.
+	"""
+
+	def __init__(self, name=None, capacity=DEFAULT_CAPACITY, create=True):
+		"""
+		Create or attach the shared memory block of the ring.
+
+		:param name: Name of the shared memory block, generated if None.
+		:param capacity: Number of slots of the ring, only used on creation.
+		:param create: Whether to create the block or attach to an existing one.
+		"""
+		if create:
+			self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + capacity * SLOT_SIZE)
+			HEADER.pack_into(self.shm.buf, 0, 0, capacity, SLOT_SIZE)
+		else:
+			self.shm = shared_memory.SharedMemory(name=name)
+		_, self.capacity, slot_size = HEADER.unpack_from(self.shm.buf, 0)
+		if slot_size != SLOT_SIZE:
+			raise ValueError("Snapshot ring layout does not match this version !")
+		self.name = self.shm.name
+
+	def __reduce__(self):
+		return self.__class__, (self.name, self.capacity, False)
+
+	def head(self) -> int:
+		"""
+		:return: Sequence number of the last published snapshot, 0 if none.
+		"""
+		return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+	def offset(self, seq: int) -> int:
+		"""
+		:param seq: Sequence number of a snapshot.
+		:return: Offset of the slot holding this sequence number.
+		"""
+		return HEADER.size + (seq % self.capacity) * SLOT_SIZE
+
+	def publish(self, tick: int, lights_state, roads) -> int:
+		"""
+		Writes the state of the crossroad in the next slot.
+
+		:param tick: Current simulation tick.
+		:param lights_state: Mapping of light values per direction.
+		:param roads: Mapping of the vehicle lists per direction.
+		:return: Sequence number of the published snapshot.
+		"""
+		buf = self.shm.buf
+		seq = self.head() + 1
+		pack_snapshot(buf, self.offset(seq), tick, lights_state, roads)
+		struct.pack_into("<Q", buf, self.offset(seq), seq)
+		struct.pack_into("<Q", buf, 0, seq)
+		return seq
+
+	def read(self, seq: int):
+		"""
+		Copies a snapshot out of the ring.
+
+		:param seq: Sequence number of the snapshot.
+		:return: Snapshot, or None if it was overwritten or is being written.
+		"""
+		offset = self.offset(seq)
+		slot_seq, tick, timestamp = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+		if slot_seq != seq:
+			return None
+		data = bytes(self.shm.buf[offset + SLOT_HEADER.size:offset + SLOT_SIZE])
+		if struct.unpack_from("<Q", self.shm.buf, offset)[0] != seq:
+			return None
+		return Snapshot(seq, tick, timestamp, data)
+
+	def latest(self):
+		"""
+		:return: Last published snapshot, or None if nothing was published yet.
+		"""
+		seq = self.head()
+		while seq > 0:
+			snapshot = self.read(seq)
+			if snapshot is not None:
+				return snapshot
+			seq = self.head()
+		return None
+
+	def reader(self):
+		"""
+		:return: A SnapshotReader starting after the last published snapshot.
+		"""
+		return SnapshotReader(self)
+
+	def close(self):
+		"""
+		Detaches the ring from the current process.
+		"""
+		self.shm.close()
+
+	def unlink(self):
+		"""
+		Destroys the shared memory block, must be called once by its creator.
+		"""
+		self.shm.unlink()
+
+
+class SnapshotReader:
+	"""
+	Sequential consumer of a SnapshotRing, used by the recorders and metrics collectors.
+	"""
+
+	def __init__(self, ring: SnapshotRing):
+		"""
+		:param ring: Ring to read from.
+		"""
+		self.ring = ring
+		self.next_seq = ring.head() + 1
+		self.overruns = 0
+
+	def poll(self):
+		"""
+		Reads every snapshot published since the last call.
+		Snapshots overwritten before they could be read are counted in self.overruns.
+
+		:return: List of snapshots, oldest first.
+		"""
+		head = self.ring.head()
+		if head - self.next_seq >= self.ring.capacity:
+			oldest = head - self.ring.capacity + 1
+			self.overruns += oldest - self.next_seq
+			self.next_seq = oldest
+
+		snapshots = []
+		while self.next_seq <= head:
+			snapshot = self.ring.read(self.next_seq)
+			if snapshot is None:
+				self.overruns += 1
+			else:
+				snapshots.append(snapshot)
+			self.next_seq += 1
+		return snapshots
+
+
+class SnapshotChannel:
+	"""
+	Carries the snapshots to a single reader, the display, through a Transport instead of the ring.
+	Offers the publish() and latest() methods of SnapshotRing.
+	"""
+
+	def __init__(self, transport: Transport):
+		"""
+		:param transport: Transport carrying the snapshots.
+		"""
+		self.transport = transport
+		self.seq = 0
+		self.last = None
+
+	def publish(self, tick: int, lights_state, roads) -> int:
+		"""
+		Sends the state of the crossroad, dropping it if the reader is late.
+
+		:param tick: Current simulation tick.
+		:param lights_state: Mapping of light values per direction.
+		:param roads: Mapping of the vehicle lists per direction.
+		:return: Sequence number of the snapshot.
+		"""
+		self.seq += 1
+		buf = bytearray(SLOT_SIZE)
+		pack_snapshot(buf, 0, tick, lights_state, roads)
+		struct.pack_into("<Q", buf, 0, self.seq)
+		try:
+			self.transport.send(bytes(buf), block=False)
+		except TransportFull:
+			pass
+		return self.seq
+
+	def latest(self):
+		"""
+		:return: Last received snapshot, or None if nothing was received yet.
+		"""
+		try:
+			while True:
+				message = self.transport.receive(block=False)
+				seq, tick, timestamp = SLOT_HEADER.unpack_from(message, 0)
+				self.last = Snapshot(seq, tick, timestamp, message[SLOT_HEADER.size:])
+		except TransportEmpty:
+			pass
+		return self.last
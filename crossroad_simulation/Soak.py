@@ -0,0 +1,196 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from crossroad_simulation.EventLog import EventLog, OFF
+from crossroad_simulation.RunRegistry import Run
+from crossroad_simulation.Simulation import Simulation, parse_parameters, parse_transports
+from crossroad_simulation.TimeManager import TimeManager
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+FIELDS = ["tick", "elapsed_s", "component", "pid", "rss_kb", "fds", "traced_kb", "queue_depth", "road_length"]
+THRESHOLDS = {"rss_kb": 20 * 1024, "fds": 4, "traced_kb": 5 * 1024}  # Growth allowed per component between the baseline and the last sample
+MAX_QUEUE_DEPTH = 64  # Messages waiting in a traffic transport at the last sample
+MAX_ROAD_LENGTH = 64  # Vehicles waiting in a road of the Coordinator at the last sample
+
+
+def process_usage(pid: int):
+	"""
+	Resident memory and open file descriptors of a process, read from /proc.
+
+	:param pid: Process ID.
+	:return: Tuple (resident set size in KiB, number of open file descriptors), or None if the process is gone.
+	"""
+	try:
+		with open(f"/proc/{pid}/statm") as file:
+			resident = int(file.read().split()[1])
+		fds = len(os.listdir(f"/proc/{pid}/fd"))
+	except (FileNotFoundError, ProcessLookupError):
+		return None
+	return resident * PAGE_KB, fds
+
+
+class Soak:
+	"""
+	Runs the full multiprocess simulation for a long simulated duration and samples every component at a fixed tick interval:
+	- resident memory and open file descriptors from /proc,
+	- tracemalloc traced memory and top allocators, through the memory samples of the Profiler,
+	- depth of the traffic transports and length of the roads of the Coordinator.
+	The soak fails when a component grew more than the thresholds between the baseline sample and the last one,
+	or when the queues are still backed up at the end.
+	"""
+
+	def __init__(self, manager, ticks, interval, params=None, mode="afap", time_unit=0, transports=None, trace_memory=True, run=None):
+		"""
+		Builds a headless simulation.
+
+		:param manager: multiprocessing.Manager of the simulation.
+		:param ticks: Simulated duration in ticks.
+		:param interval: Ticks between two samples.
+		:param params: Dictionary of simulation parameters.
+		:param mode: Clock mode of the simulation.
+		:param time_unit: Length of a tick in seconds.
+		:param transports: Dictionary of backend names per channel of the simulation.
+		:param trace_memory: Whether the components run tracemalloc, which slows them down.
+		:param run: Optional RunRegistry Run recording the IPC resources of the simulation.
+		"""
+		self.ticks = ticks
+		self.interval = interval
+		self.trace_memory = trace_memory
+		self.profile_dir = tempfile.mkdtemp(prefix="soak-")
+		self.simulation = Simulation(manager, TimeManager(mode, time_unit), params, display=False, profile_dir=self.profile_dir, event_log=EventLog(level=OFF), transports=transports, run=run, trace_memory=trace_memory)
+		self.components = [process for process in self.simulation.processes if hasattr(process, "COMPONENT")]
+		self.samples = []
+		self.allocations = []
+		self.baseline = None
+
+	def sample(self, tick, start):
+		"""
+		Records a sample of every component.
+
+		:param tick: Tick the sample was taken at.
+		:param start: Wall-clock time the simulation started at.
+		:return: List of the rows of the sample, one per component.
+		"""
+		memory = self.simulation.profiler.sample_memory(len(self.components)) if self.trace_memory else {}
+		snapshot = self.simulation.coordinator.snapshots.latest()
+		queue_depth = sum(queue.depth() for queue in self.simulation.traffic_queues.values())
+		road_length = max(snapshot.queue_lengths.values()) if snapshot is not None else 0
+		elapsed = time.monotonic() - start
+
+		rows = []
+		for component in self.components:
+			usage = process_usage(component.pid)
+			if usage is None:
+				raise RuntimeError(f"The {component.COMPONENT} process died during the soak.")
+			traced = memory.get(component.COMPONENT, {}).get("traced", 0) // 1024
+			rows.append({"tick": tick, "elapsed_s": round(elapsed, 3), "component": component.COMPONENT, "pid": component.pid, "rss_kb": usage[0], "fds": usage[1], "traced_kb": traced, "queue_depth": queue_depth, "road_length": road_length})
+		if memory:
+			self.allocations.append({"tick": tick, "components": memory})
+		self.samples.append(rows)
+		return rows
+
+	def run(self, warmup=None):
+		"""
+		Runs the soak.
+
+		:param warmup: Tick of the baseline sample, after the startup allocations settled, one interval by default.
+		:return: List of the samples, each a list of rows per component.
+		"""
+		warmup = self.interval if warmup is None else warmup
+		self.simulation.start()
+		start = time.monotonic()
+		try:
+			ticks = sorted({warmup, *range(self.interval, self.ticks + 1, self.interval), self.ticks})
+			for tick in ticks:
+				self.simulation.wait_tick(tick)
+				self.sample(tick, start)
+		finally:
+			self.simulation.stop()
+			self.simulation.close()
+			shutil.rmtree(self.profile_dir, ignore_errors=True)
+		self.baseline = next(rows for rows in self.samples if rows[0]["tick"] >= warmup)
+		return self.samples
+
+	def check(self, thresholds=None, max_queue_depth=MAX_QUEUE_DEPTH, max_road_length=MAX_ROAD_LENGTH):
+		"""
+		Compares the last sample to the baseline one.
+
+		:param thresholds: Dictionary of the growth allowed per measure, overriding THRESHOLDS.
+		:param max_queue_depth: Messages allowed in the traffic transports at the last sample.
+		:param max_road_length: Vehicles allowed in a road of the Coordinator at the last sample.
+		:return: List of the violations, empty if the soak passed.
+		"""
+		limits = dict(THRESHOLDS)
+		limits.update(thresholds or {})
+		last = self.samples[-1]
+		violations = []
+		for before, after in zip(self.baseline, last):
+			for measure, limit in limits.items():
+				growth = after[measure] - before[measure]
+				if growth > limit:
+					violations.append(f"{after['component']}: {measure} grew by {growth} ({before[measure]} -> {after[measure]}) between ticks {before['tick']} and {after['tick']}, limit {limit}")
+		if last[0]["queue_depth"] > max_queue_depth:
+			violations.append(f"traffic transports hold {last[0]['queue_depth']} messages at tick {last[0]['tick']}, limit {max_queue_depth}")
+		if last[0]["road_length"] > max_road_length:
+			violations.append(f"a road holds {last[0]['road_length']} vehicles at tick {last[0]['tick']}, limit {max_road_length}")
+		return violations
+
+	def write(self, output, allocations=None):
+		"""
+		Writes the samples to a CSV file and the top allocators to a JSON lines file.
+
+		:param output: CSV file of the samples.
+		:param allocations: JSON lines file of the top allocators per sample, None to skip it.
+		"""
+		with open(output, "w", newline="") as file:
+			writer = csv.DictWriter(file, fieldnames=FIELDS)
+			writer.writeheader()
+			for rows in self.samples:
+				writer.writerows(rows)
+		if allocations is not None:
+			with open(allocations, "w") as file:
+				for sample in self.allocations:
+					file.write(json.dumps(sample) + "\n")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Soak test of the simulation, failing on memory, file descriptor or queue growth.")
+	parser.add_argument("--ticks", type=int, default=100000, help="Simulated duration in ticks.")
+	parser.add_argument("--interval", type=int, default=5000, help="Ticks between two samples.")
+	parser.add_argument("--warmup", type=int, help="Tick of the baseline sample, one interval by default.")
+	parser.add_argument("--mode", default="afap", help="Clock mode of the simulation.")
+	parser.add_argument("--time-unit", type=float, default=0, help="Length of a tick in seconds.")
+	parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a simulation parameter.")
+	parser.add_argument("--transport", action="append", default=[], metavar="CHANNEL=BACKEND", help="Backend of a channel of the simulation (vehicles, lights, display).")
+	parser.add_argument("--no-tracemalloc", action="store_true", help="Only sample /proc and the queues, at full speed.")
+	parser.add_argument("--max-rss-growth", type=int, default=THRESHOLDS["rss_kb"], metavar="KIB", help="Resident memory growth allowed per component.")
+	parser.add_argument("--max-fd-growth", type=int, default=THRESHOLDS["fds"], help="Open file descriptor growth allowed per component.")
+	parser.add_argument("--max-traced-growth", type=int, default=THRESHOLDS["traced_kb"], metavar="KIB", help="tracemalloc traced memory growth allowed per component.")
+	parser.add_argument("--max-queue-depth", type=int, default=MAX_QUEUE_DEPTH, help="Messages allowed in the traffic transports at the end.")
+	parser.add_argument("--max-road-length", type=int, default=MAX_ROAD_LENGTH, help="Vehicles allowed in a road of the Coordinator at the end.")
+	parser.add_argument("--output", default="soak.csv", help="CSV file of the samples.")
+	parser.add_argument("--allocations", default="soak_allocations.jsonl", help="JSON lines file of the top allocators of every sample.")
+	args = parser.parse_args()
+
+	run = Run(description=" ".join(sys.argv))
+	try:
+		with multiprocessing.Manager() as manager:
+			soak = Soak(manager, args.ticks, args.interval, parse_parameters(args.set), args.mode, args.time_unit, parse_transports(args.transport), not args.no_tracemalloc, run)
+			soak.run(args.warmup)
+	finally:
+		run.close()
+
+	soak.write(args.output, None if args.no_tracemalloc else args.allocations)
+	for before, after in zip(soak.baseline, soak.samples[-1]):
+		print(f"{after['component']:<17} rss {before['rss_kb']:>7} -> {after['rss_kb']:>7} KiB  fds {before['fds']:>3} -> {after['fds']:>3}  traced {before['traced_kb']:>6} -> {after['traced_kb']:>6} KiB")
+	violations = soak.check({"rss_kb": args.max_rss_growth, "fds": args.max_fd_growth, "traced_kb": args.max_traced_growth}, args.max_queue_depth, args.max_road_length)
+	for violation in violations:
+		print(f"FAIL {violation}", file=sys.stderr)
+	raise SystemExit(1 if violations else 0)
@@ -1,32 +1,84 @@
+import multiprocessing
 import time
 
+MODES = ["realtime", "factor", "afap", "step"]
+ALIASES = {"auto": "realtime", "manual": "step"}
+MAX_LAG = 5  # Periods a late process may catch up on before its clock is reset
+
 
 class TimeManager:
 	"""
-	Manages configurable time-steps for simulation.
-	Allows the user to define a custom time unit dynamically.
+	Clock service shared by every process of the simulation.
+	Supported modes:
+	- realtime: a time unit lasts time_unit seconds.
+	- factor: a time unit lasts time_unit / factor seconds.
+	- afap: time units do not wait at all (as fast as possible).
+	- step: a time unit only elapses when step() is called, from any process.
+	The mode, factor and time unit live in shared memory, so changing them from one process
+	(for instance from a ControlServer command) applies to the whole simulation.
 	"""
 
-	def __init__(self, mode, time_unit=1):
+	def __init__(self, mode, time_unit=1, factor=1.0):
 		"""
 		Initialize with a default time unit (e.g., 1 second).
 
-		:param mode: Mode of the time manager ('auto' or 'manual').
+		:param mode: Mode of the time manager (see MODES, 'auto' and 'manual' are kept as aliases).
 		:param time_unit: Length of a single time unit in seconds.
+		:param factor: Real-time factor used by the 'factor' mode.
+		"""
+		self._mode = multiprocessing.Value("i", 0)
+		self._time_unit = multiprocessing.Value("d", 0)
+		self._factor = multiprocessing.Value("d", 1)
+		self._generation = multiprocessing.Value("i", 0, lock=False)
+		self._steps = multiprocessing.Value("q", 0, lock=False)
+		self._step_base = multiprocessing.Value("q", 0, lock=False)
+		self._condition = multiprocessing.Condition()
+		self._known_generation = -1
+		self._deadline = 0
+		self._consumed = 0
+		self.set_time_unit(time_unit)
+		self.set_factor(factor)
+		self.change_mode(mode)
+
+	@property
+	def mode(self):
+		"""
+		:return: Name of the current mode.
+		"""
+		return MODES[self._mode.value]
+
+	@property
+	def time_unit(self):
+		"""
+		:return: Length of a time unit in seconds.
+		"""
+		return self._time_unit.value
+
+	@property
+	def factor(self):
+		"""
+		:return: Real-time factor of the 'factor' mode.
 		"""
-		self.mode = mode
-		self.time_unit = time_unit
+		return self._factor.value
 
 	def change_mode(self, mode=None):
 		"""
 		Change the mode of the time manager.
 
-		:param mode: New mode to set ('auto' or 'manual'). If None, toggles the current mode.
+		:param mode: New mode to set. If None, toggles between 'realtime' and 'step'.
+		:raises ValueError: If the mode is unknown.
 		"""
 		if mode is None:
-			self.mode = "auto" if self.mode == "manual" else "manual"
-		else:
-			self.mode = mode
+			mode = "realtime" if self.mode == "step" else "step"
+		mode = ALIASES.get(mode, mode)
+		if mode not in MODES:
+			raise ValueError(f"Unknown time manager mode: {mode}")
+
+		with self._condition:
+			self._mode.value = MODES.index(mode)
+			self._step_base.value = self._steps.value
+			self._generation.value += 1
+			self._condition.notify_all()
 
 	def set_time_unit(self, time_unit):
 		"""
@@ -36,25 +88,102 @@ class TimeManager:
 		:raises ValueError: If the time unit is not a positive value.
 		"""
 		if time_unit >= 0:
-			self.time_unit = time_unit
+			self._time_unit.value = time_unit
 		else:
 			raise ValueError("Time unit must be a positive value.")
 
+	def set_factor(self, factor):
+		"""
+		Update the real-time factor dynamically.
+
+		:param factor: New factor, 10 runs the simulation ten times faster than real-time.
+		:raises ValueError: If the factor is not a strictly positive value.
+		"""
+		if factor > 0:
+			self._factor.value = factor
+		else:
+			raise ValueError("Factor must be a strictly positive value.")
+
+	def step(self, units=1):
+		"""
+		Lets every process advance by a given number of time units in 'step' mode.
+
+		:param units: Number of time units to release.
+		"""
+		with self._condition:
+			self._steps.value += units
+			self._condition.notify_all()
+
+	def period(self, units=1):
+		"""
+		Wall-clock duration of a given number of time units in the current mode.
+
+		:param units: Number of time units.
+		:return: Duration in seconds, 0 when the clock does not wait on real time.
+		"""
+		mode = self.mode
+		if mode == "realtime":
+			return units * self.time_unit
+		if mode == "factor":
+			return units * self.time_unit / self.factor
+		return 0
+
 	def sleep(self, units=1):
 		"""
 		Pause execution for a given number of time units.
+		Sleeps are scheduled against absolute deadlines, so a late process catches up
+		instead of accumulating the error of each sleep.
 
 		:param units: Number of time units to sleep.
 		"""
-		if self.mode == "auto":
-			if self.time_unit > 0:
-				time.sleep(units * self.time_unit)
-		elif self.mode == "manual":
-			input("Press enter to continue...")
+		if self._known_generation != self._generation.value:
+			self._known_generation = self._generation.value
+			self._deadline = time.monotonic()
+			self._consumed = 0
+
+		if self.mode == "step":
+			self._consumed += units
+			with self._condition:
+				self._condition.wait_for(lambda: self.mode != "step" or self._steps.value >= self._step_base.value + self._consumed)
+			return
+
+		period = self.period(units)
+		if period <= 0:
+			return
+		self._deadline += period
+		delay = self._deadline - time.monotonic()
+		if delay > 0:
+			time.sleep(delay)
+		elif -delay > MAX_LAG * period:
+			self._deadline = time.monotonic()
+
+	def command(self, line: str) -> str:
+		"""
+		Applies a textual control command, as received by a ControlServer.
+		Commands: 'mode <name>', 'factor <x>', 'unit <seconds>', 'step [n]', 'status'.
+
+		:param line: Command line without its 'clock' prefix.
+		:return: Reply describing the resulting clock state.
+		:raises ValueError: If the command is unknown or its argument is invalid.
+		"""
+		words = line.split()
+		name, args = (words[0], words[1:]) if words else ("status", [])
+		if name == "mode":
+			self.change_mode(args[0] if args else None)
+		elif name == "factor":
+			self.set_factor(float(args[0]))
+		elif name == "unit":
+			self.set_time_unit(float(args[0]))
+		elif name == "step":
+			self.step(int(args[0]) if args else 1)
+		elif name != "status":
+			raise ValueError(f"Unknown clock command: {name}")
+		return f"mode={self.mode} factor={self.factor} unit={self.time_unit} steps={self._steps.value}"
 
 
 if __name__ == "__main__":
-	time_manager = TimeManager("manual")
-	time_manager.sleep()
-	time_manager.sleep()
-	time_manager.sleep()
+	time_manager = TimeManager("factor", 1, factor=10)
+	start = time.monotonic()
+	for _ in range(20):
+		time_manager.sleep()
+	print(f"20 units at x10 took {time.monotonic() - start:.2f}s")
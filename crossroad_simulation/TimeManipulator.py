@@ -1,3 +1,5 @@
+import random
+import sys
 from abc import ABC, abstractmethod
 
 
@@ -15,3 +17,22 @@ class TimeManipulator(ABC):
 		:param unit: Number of time units to advance.
 		"""
 		pass
+
+	def horizon(self, unit: int = 1) -> int:
+		"""
+		Longest next step the component accepts when macro-stepping, called at the end of a step.
+
+		:param unit: Number of time units of the step being finished.
+		:return: Number of ticks, unbounded by default.
+		"""
+		return sys.maxsize
+
+	def init_random(self):
+		"""
+		Restores the random state of a resumed component, or seeds it for reproducible runs.
+		Expects the component to define random_state, seed and COMPONENT.
+		"""
+		if self.random_state is not None:
+			random.setstate(self.random_state)
+		elif self.seed is not None:
+			random.seed(f"{self.seed}:{self.COMPONENT}")
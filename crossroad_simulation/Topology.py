@@ -0,0 +1,251 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+COMPONENTS = ["lights", "normal_traffic", "priority_traffic", "coordinator", "display", "manager"]  # Processes a topology can place
+SETTINGS = ["cpus", "nice", "fifo"]  # CPU affinity, nice value, SCHED_FIFO priority
+POLL_DELAY = 0.01  # Seconds between two reads of the snapshot ring, well within its capacity at the measured tick periods
+FIELDS = ["date", "topology", "load", "time_unit", "ticks", "overruns", "period_p50_ms", "period_p99_ms", "period_max_ms", "jitter_p50_ms", "jitter_p99_ms", "jitter_max_ms"]
+
+
+def parse_cpus(cpus):
+	"""
+	Parses a CPU list.
+
+	:param cpus: List of CPU numbers, or string of comma-separated numbers and ranges, e.g. '0,2-3'.
+	:return: Sorted list of CPU numbers.
+	:raises ValueError: If the list is empty or holds a CPU this process may not run on.
+	"""
+	if isinstance(cpus, str):
+		numbers = set()
+		for part in cpus.split(","):
+			first, _, last = part.strip().partition("-")
+			numbers.update(range(int(first), int(last or first) + 1))
+		cpus = numbers
+	cpus = sorted(int(cpu) for cpu in cpus)
+	available = os.sched_getaffinity(0)
+	if not cpus or not set(cpus) <= available:
+		raise ValueError(f"Invalid CPU list {cpus}, available CPUs: {sorted(available)}")
+	return cpus
+
+
+def parse_placement(component: str, placement: dict):
+	"""
+	Validates the placement of a component.
+
+	:param component: Name of the component, one of COMPONENTS.
+	:param placement: Dictionary of settings, see SETTINGS.
+	:return: Dictionary of typed settings.
+	:raises ValueError: If the component, a setting or its value is invalid.
+	"""
+	if component not in COMPONENTS:
+		raise ValueError(f"Unknown component: {component}")
+	parsed = {}
+	for setting, value in placement.items():
+		if setting == "cpus":
+			parsed[setting] = parse_cpus(value)
+		elif setting == "nice":
+			parsed[setting] = int(value)
+		elif setting == "fifo":
+			priority = int(value)
+			if not os.sched_get_priority_min(os.SCHED_FIFO) <= priority <= os.sched_get_priority_max(os.SCHED_FIFO):
+				raise ValueError(f"Invalid SCHED_FIFO priority for {component}: {priority}")
+			parsed[setting] = priority
+		else:
+			raise ValueError(f"Unknown setting of {component}: {setting}")
+	if "nice" in parsed and "fifo" in parsed:
+		raise ValueError(f"{component} cannot have both a nice value and a SCHED_FIFO priority")
+	return parsed
+
+
+def load_topology(path=None, assignments=()):
+	"""
+	Reads a process topology from a JSON file mapping components to their settings, e.g.
+	{"coordinator": {"cpus": [1], "fifo": 10}, "display": {"cpus": "2-3", "nice": 10}},
+	then applies 'component.setting=value' assignments over it.
+
+	:param path: JSON file of the topology, None for an empty one.
+	:param assignments: Iterable of assignment strings.
+	:return: Dictionary of validated placements per component.
+	:raises ValueError: If a component, setting or value is invalid.
+	"""
+	topology = {}
+	if path is not None:
+		with open(path) as file:
+			topology = json.load(file)
+	for assignment in assignments:
+		name, _, value = assignment.partition("=")
+		component, _, setting = name.strip().partition(".")
+		topology.setdefault(component, {})[setting] = value.strip()
+	return {component: parse_placement(component, placement) for component, placement in topology.items()}
+
+
+def threads(pid: int):
+	"""
+	:param pid: Process ID.
+	:return: Thread IDs of the process, the affinity and priorities of Linux apply per thread.
+	"""
+	try:
+		return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+	except FileNotFoundError:
+		return [pid]
+
+
+def place(pid: int, placement: dict):
+	"""
+	Applies a placement to every thread of a process.
+	Raising the priority (negative nice, SCHED_FIFO) needs CAP_SYS_NICE or an RLIMIT_RTPRIO, denied settings are skipped.
+
+	:param pid: Process ID.
+	:param placement: Dictionary of typed settings, as returned by parse_placement().
+	:return: List of the settings that were denied.
+	"""
+	denied = []
+	for tid in threads(pid):
+		try:
+			if "cpus" in placement:
+				os.sched_setaffinity(tid, placement["cpus"])
+		except ProcessLookupError:
+			continue
+		try:
+			if "nice" in placement:
+				os.setpriority(os.PRIO_PROCESS, tid, placement["nice"])
+		except PermissionError:
+			denied.append("nice")
+		except ProcessLookupError:
+			continue
+		try:
+			if "fifo" in placement:
+				os.sched_setscheduler(tid, os.SCHED_FIFO, os.sched_param(placement["fifo"]))
+		except PermissionError:
+			denied.append("fifo")
+		except ProcessLookupError:
+			continue
+	return sorted(set(denied))
+
+
+def apply_topology(pids: dict, topology: dict):
+	"""
+	Places the processes of a running simulation.
+
+	:param pids: Dictionary of process IDs per component, as returned by Simulation.pids().
+	:param topology: Dictionary of placements per component, as returned by load_topology().
+	:return: List of warnings about the components missing from the simulation or the settings that were denied.
+	"""
+	warnings = []
+	for component, placement in topology.items():
+		if component not in pids:
+			warnings.append(f"{component} does not run in this simulation")
+			continue
+		for setting in place(pids[component], placement):
+			warnings.append(f"{component}: {setting}={placement[setting]} not permitted, left unchanged")
+	return warnings
+
+
+def percentile(values, fraction: float):
+	"""
+	Nearest-rank percentile.
+
+	:param values: Sorted list of values.
+	:param fraction: Percentile between 0 and 1.
+	:return: Value of the percentile, 0 if the list is empty.
+	"""
+	if not values:
+		return 0
+	return values[min(max(int(fraction * len(values) + 0.5) - 1, 0), len(values) - 1)]
+
+
+def tick_jitter(snapshots, nominal: float):
+	"""
+	Tick period and jitter from the publication times of consecutive snapshots.
+
+	:param snapshots: Snapshots in publication order, snapshots missed by the reader only break the sequence.
+	:param nominal: Expected period of a tick in seconds.
+	:return: Dictionary of the p50, p99 and max of the period and of its absolute deviation from the nominal one, in milliseconds.
+	"""
+	periods = sorted(after.timestamp - before.timestamp for before, after in zip(snapshots, snapshots[1:]) if after.tick == before.tick + 1)
+	jitters = sorted(abs(period - nominal) for period in periods)
+	measures = {"ticks": len(periods)}
+	for name, values in (("period", periods), ("jitter", jitters)):
+		measures[f"{name}_p50_ms"] = percentile(values, 0.5) * 1000
+		measures[f"{name}_p99_ms"] = percentile(values, 0.99) * 1000
+		measures[f"{name}_max_ms"] = (values[-1] if values else 0) * 1000
+	return measures
+
+
+def spin():
+	"""
+	Busy loop of a host load process.
+	"""
+	while True:
+		pass
+
+
+def measure(topology: dict, ticks: int, time_unit: float, load=0, params=None):
+	"""
+	Runs a headless real-time simulation with a topology, under an optional host load, and measures its tick jitter.
+
+	:param topology: Dictionary of placements per component, as returned by load_topology().
+	:param ticks: Number of measured ticks.
+	:param time_unit: Length of a tick in seconds.
+	:param load: Number of busy processes competing for the CPUs during the measure.
+	:param params: Dictionary of simulation parameters.
+	:return: Tuple (dictionary of the measures, see tick_jitter(), list of the warnings of apply_topology()).
+	"""
+	from crossroad_simulation.EventLog import EventLog, OFF
+	from crossroad_simulation.Simulation import Simulation
+	from crossroad_simulation.TimeManager import TimeManager
+
+	spinners = [multiprocessing.Process(target=spin, daemon=True) for _ in range(load)]
+	with multiprocessing.Manager() as manager:
+		simulation = Simulation(manager, TimeManager("realtime", time_unit), params, display=False, event_log=EventLog(level=OFF))
+		reader = simulation.coordinator.snapshots.reader()
+		snapshots = []
+		simulation.start()
+		try:
+			warnings = apply_topology(simulation.pids(), topology)
+			for spinner in spinners:
+				spinner.start()
+			while len(snapshots) <= ticks:
+				time.sleep(POLL_DELAY)
+				snapshots += reader.poll()
+		finally:
+			for spinner in spinners:
+				spinner.kill()
+			simulation.stop()
+			simulation.close()
+
+	measures = tick_jitter(snapshots, time_unit)
+	measures["overruns"] = reader.overruns
+	return measures, warnings
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Tick period jitter of a real-time simulation with a process topology, optionally under host load.")
+	parser.add_argument("--topology", help="JSON file mapping components to their settings (cpus, nice, fifo).")
+	parser.add_argument("--place", action="append", default=[], metavar="COMPONENT.SETTING=VALUE", help=f"Setting of a component ({', '.join(COMPONENTS)}), e.g. coordinator.cpus=1 or coordinator.fifo=10.")
+	parser.add_argument("--ticks", type=int, default=1000, help="Number of measured ticks.")
+	parser.add_argument("--time-unit", type=float, default=0.01, help="Length of a tick in seconds.")
+	parser.add_argument("--load", type=int, default=0, help="Busy processes competing for the CPUs during the measure.")
+	parser.add_argument("--output", default="jitter.csv", help="CSV file the measures are appended to, to compare layouts.")
+	args = parser.parse_args()
+
+	topology = load_topology(args.topology, args.place)
+	measures, warnings = measure(topology, args.ticks, args.time_unit, args.load)
+	for warning in warnings:
+		print(f"warning: {warning}", file=sys.stderr)
+
+	new = not os.path.exists(args.output)
+	with open(args.output, "a", newline="") as file:
+		writer = csv.DictWriter(file, fieldnames=FIELDS)
+		if new:
+			writer.writeheader()
+		writer.writerow({"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "topology": json.dumps(topology), "load": args.load, "time_unit": args.time_unit, **measures})
+
+	print(f"{measures['ticks']} ticks, {measures['overruns']} missed")
+	for name in ("period", "jitter"):
+		print(f"{name:<7} p50 {measures[f'{name}_p50_ms']:>7.3f}ms  p99 {measures[f'{name}_p99_ms']:>7.3f}ms  max {measures[f'{name}_max_ms']:>7.3f}ms")
@@ -0,0 +1,402 @@
+import argparse
+import multiprocessing
+import os
+import select
+import socket
+import struct
+import time
+from abc import ABC, abstractmethod
+from multiprocessing import shared_memory
+
+import sysv_ipc
+
+from crossroad_simulation.Metrics import LatencyHistogram
+
+MAX_MESSAGE_SIZE = 1024  # Largest message of the socket and ring backends
+RING_CAPACITY = 1024  # Messages held by a shared memory ring
+POLL_DELAY = 0.0001  # Seconds between two attempts of a blocking operation on the ring backend
+
+
+class TransportError(Exception):
+	"""
+	Base error of the transports, also raised when a transport was removed.
+	"""
+
+
+class TransportFull(TransportError):
+	"""
+	Raised by a non-blocking send on a full transport.
+	"""
+
+
+class TransportEmpty(TransportError):
+	"""
+	Raised by a non-blocking receive on an empty transport.
+	"""
+
+
+class Transport(ABC):
+	"""
+	Message channel between the simulation processes.
+	Every backend accepts any number of producers and a single consumer, and preserves message boundaries.
+	"""
+
+	@abstractmethod
+	def send(self, message: bytes, block: bool = True):
+		"""
+		Sends a message.
+
+		:param message: Message to send.
+		:param block: Whether to wait when the transport is full.
+		:raises TransportFull: If block is False and the transport is full.
+		"""
+		pass
+
+	@abstractmethod
+	def receive(self, block: bool = True) -> bytes:
+		"""
+		Receives the oldest message.
+
+		:param block: Whether to wait for a message.
+		:return: Message.
+		:raises TransportEmpty: If block is False and no message is waiting.
+		"""
+		pass
+
+	@abstractmethod
+	def depth(self) -> int:
+		"""
+		:return: Number of messages waiting in the transport.
+		"""
+		pass
+
+	def remove(self):
+		"""
+		Releases the system resources of the transport, called once by its creator.
+		"""
+		pass
+
+	def resources(self):
+		"""
+		:return: List of (kind, name) of the named system resources of the transport, as recorded by a RunRegistry Run.
+		"""
+		return []
+
+
+class CountedTransport(Transport, ABC):
+	"""
+	Transport keeping its depth in a shared counter, for the backends the kernel cannot report it for.
+	"""
+
+	def __init__(self):
+		self.counter = multiprocessing.Value("i", 0)
+
+	def count(self, delta):
+		with self.counter.get_lock():
+			self.counter.value += delta
+
+	def depth(self) -> int:
+		return self.counter.value
+
+
+class SysVTransport(Transport):
+	"""
+	SysV message queue backend.
+	"""
+
+	def __init__(self, key=None):
+		"""
+		:param key: SysV key of the queue, a random free key is used if None.
+		"""
+		self.queue = sysv_ipc.MessageQueue(key, sysv_ipc.IPC_CREAT if key is not None else sysv_ipc.IPC_CREX)
+		self.key = self.queue.key
+
+	def __reduce__(self):
+		return self.__class__, (self.key, )
+
+	def send(self, message: bytes, block: bool = True):
+		try:
+			self.queue.send(message, block=block)
+		except sysv_ipc.BusyError:
+			raise TransportFull()
+		except sysv_ipc.ExistentialError as e:
+			raise TransportError(e)
+
+	def receive(self, block: bool = True) -> bytes:
+		try:
+			return self.queue.receive(block=block)[0]
+		except sysv_ipc.BusyError:
+			raise TransportEmpty()
+		except sysv_ipc.ExistentialError as e:
+			raise TransportError(e)
+
+	def depth(self) -> int:
+		try:
+			return self.queue.current_messages
+		except sysv_ipc.ExistentialError as e:
+			raise TransportError(e)
+
+	def remove(self):
+		try:
+			self.queue.remove()
+		except sysv_ipc.ExistentialError:
+			pass
+
+	def resources(self):
+		return [("sysv", self.key)]
+
+
+class RingTransport(Transport):
+	"""
+	Single-consumer ring of fixed-size slots in multiprocessing.shared_memory.
+	Producers are serialized by a lock, the consumer never takes it.
+	"""
+	HEADER = struct.Struct("<QQ")  # head (next message to write), tail (next message to read)
+	LENGTH = struct.Struct("<I")
+
+	def __init__(self, capacity=RING_CAPACITY, slot_size=MAX_MESSAGE_SIZE):
+		"""
+		:param capacity: Number of messages the ring holds.
+		:param slot_size: Largest message size.
+		"""
+		self.capacity = capacity
+		self.slot_size = slot_size
+		self.shm = shared_memory.SharedMemory(create=True, size=self.HEADER.size + capacity * (self.LENGTH.size + slot_size))
+		self.HEADER.pack_into(self.shm.buf, 0, 0, 0)
+		self.lock = multiprocessing.Lock()
+
+	def offset(self, index):
+		return self.HEADER.size + (index % self.capacity) * (self.LENGTH.size + self.slot_size)
+
+	def send(self, message: bytes, block: bool = True):
+		if len(message) > self.slot_size:
+			raise ValueError(f"Message of {len(message)} bytes does not fit in a {self.slot_size} bytes slot.")
+		with self.lock:
+			while True:
+				head, tail = self.HEADER.unpack_from(self.shm.buf, 0)
+				if head - tail < self.capacity:
+					break
+				if not block:
+					raise TransportFull()
+				time.sleep(POLL_DELAY)
+			offset = self.offset(head)
+			self.LENGTH.pack_into(self.shm.buf, offset, len(message))
+			self.shm.buf[offset + self.LENGTH.size:offset + self.LENGTH.size + len(message)] = message
+			struct.pack_into("<Q", self.shm.buf, 0, head + 1)
+
+	def receive(self, block: bool = True) -> bytes:
+		while True:
+			head, tail = self.HEADER.unpack_from(self.shm.buf, 0)
+			if head != tail:
+				break
+			if not block:
+				raise TransportEmpty()
+			time.sleep(POLL_DELAY)
+		offset = self.offset(tail)
+		length, = self.LENGTH.unpack_from(self.shm.buf, offset)
+		message = bytes(self.shm.buf[offset + self.LENGTH.size:offset + self.LENGTH.size + length])
+		struct.pack_into("<Q", self.shm.buf, 8, tail + 1)
+		return message
+
+	def depth(self) -> int:
+		head, tail = self.HEADER.unpack_from(self.shm.buf, 0)
+		return head - tail
+
+	def remove(self):
+		self.shm.unlink()
+
+	def resources(self):
+		return [("shm", self.shm.name)]
+
+
+class PipeTransport(CountedTransport):
+	"""
+	Anonymous pipe backend, messages up to PIPE_BUF are written atomically by concurrent producers.
+	The writing end is non-blocking, so the pipe is full when the kernel buffer is, whatever the number of messages,
+	and a blocking send waits for the buffer to drain instead of blocking in the write.
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self.reader, self.writer = multiprocessing.Pipe(duplex=False)
+		os.set_blocking(self.writer.fileno(), False)
+
+	def send(self, message: bytes, block: bool = True):
+		# Same framing as Connection.send_bytes, written at once so a frame is never split when the buffer fills up
+		frame = struct.pack("!i", len(message)) + message
+		if len(frame) > select.PIPE_BUF:
+			raise ValueError(f"Message of {len(message)} bytes too long for an atomic pipe write")
+		self.count(1)
+		while True:
+			try:
+				os.write(self.writer.fileno(), frame)
+				return
+			except BlockingIOError:
+				if not block:
+					self.count(-1)
+					raise TransportFull()
+			select.select([], [self.writer.fileno()], [])
+
+	def receive(self, block: bool = True) -> bytes:
+		if not block and not self.reader.poll():
+			raise TransportEmpty()
+		message = self.reader.recv_bytes()
+		self.count(-1)
+		return message
+
+	def remove(self):
+		self.reader.close()
+		self.writer.close()
+
+
+class UnixSocketTransport(CountedTransport):
+	"""
+	Unix domain datagram socket pair backend.
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self.reader, self.writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+	def send(self, message: bytes, block: bool = True):
+		# Counted first, the receiver may take the message before this process counts it
+		self.count(1)
+		try:
+			self.writer.send(message, 0 if block else socket.MSG_DONTWAIT)
+		except BlockingIOError:
+			self.count(-1)
+			raise TransportFull()
+
+	def receive(self, block: bool = True) -> bytes:
+		try:
+			message = self.reader.recv(MAX_MESSAGE_SIZE, 0 if block else socket.MSG_DONTWAIT)
+		except BlockingIOError:
+			raise TransportEmpty()
+		self.count(-1)
+		return message
+
+	def remove(self):
+		self.reader.close()
+		self.writer.close()
+
+
+BACKENDS = {"sysv": SysVTransport, "shm": RingTransport, "pipe": PipeTransport, "unix": UnixSocketTransport}
+
+
+def create_transport(backend: str, key=None) -> Transport:
+	"""
+	Creates a transport.
+
+	:param backend: Name of the backend, one of BACKENDS.
+	:param key: SysV key, only used by the 'sysv' backend.
+	:return: Transport instance.
+	:raises ValueError: If the backend is unknown.
+	"""
+	if backend not in BACKENDS:
+		raise ValueError(f"Unknown transport backend: {backend}, expected one of {sorted(BACKENDS)}")
+	if backend == "sysv":
+		return SysVTransport(key)
+	return BACKENDS[backend]()
+
+
+class LightsChannel:
+	"""
+	Dictionary-like view of the lights state carried by a transport, replacing the Manager dictionary.
+	The TrafficLights process publishes the whole state on every change, the Coordinator keeps the latest one.
+	"""
+	LIGHTS = struct.Struct("<4B")
+
+	def __init__(self, transport: Transport, lights_state: dict):
+		"""
+		:param transport: Transport carrying the states.
+		:param lights_state: Initial light value per direction.
+		"""
+		self.transport = transport
+		self.lights_state = dict(lights_state)
+		self.directions = list(lights_state)
+		self.writer = False
+
+	def refresh(self):
+		"""
+		Applies every state published since the last call, the writing process already holds the latest one.
+		"""
+		if self.writer:
+			return
+		try:
+			while True:
+				message = self.transport.receive(block=False)
+				self.lights_state = dict(zip(self.directions, self.LIGHTS.unpack(message)))
+		except TransportEmpty:
+			pass
+
+	def __setitem__(self, direction, light):
+		self.writer = True
+		self.lights_state[direction] = light
+		self.transport.send(self.LIGHTS.pack(*(self.lights_state[direction] for direction in self.directions)))
+
+	def __getitem__(self, direction):
+		self.refresh()
+		return self.lights_state[direction]
+
+	def items(self):
+		self.refresh()
+		return self.lights_state.items()
+
+	def copy(self):
+		self.refresh()
+		return dict(self.lights_state)
+
+
+def consume(transport: Transport, count: int, results):
+	"""
+	Consumer side of the benchmark.
+
+	:param transport: Transport to read from.
+	:param count: Number of messages to read.
+	:param results: multiprocessing.Queue receiving (elapsed seconds, latency buckets).
+	"""
+	latency = LatencyHistogram()
+	start = None
+	for _ in range(count):
+		message = transport.receive()
+		now = time.monotonic_ns()
+		start = start or now
+		latency.record((now - struct.unpack_from("<Q", message)[0]) // 1000)
+	results.put(((time.monotonic_ns() - start) / 1e9, latency.snapshot()))
+
+
+def benchmark(backend: str, count=20000, size=64):
+	"""
+	Measures the throughput and latency of a backend between a producer and a consumer process.
+
+	:param backend: Name of the backend.
+	:param count: Number of messages sent.
+	:param size: Size of each message in bytes, a vehicle message is about 60 bytes.
+	:return: Tuple (messages per second, p50 latency in microseconds, p99 latency in microseconds).
+	"""
+	transport = create_transport(backend)
+	results = multiprocessing.Queue()
+	consumer = multiprocessing.Process(target=consume, args=(transport, count, results))
+	consumer.start()
+	padding = bytes(max(size - 8, 0))
+	try:
+		for _ in range(count):
+			transport.send(struct.pack("<Q", time.monotonic_ns()) + padding)
+		elapsed, latency = results.get()
+		consumer.join()
+	finally:
+		transport.remove()
+	return count / elapsed, LatencyHistogram.percentile(latency, 0.5), LatencyHistogram.percentile(latency, 0.99)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark of the IPC transport backends on this host.")
+	parser.add_argument("--count", type=int, default=20000, help="Messages sent per backend.")
+	parser.add_argument("--size", type=int, default=64, help="Size of each message in bytes.")
+	parser.add_argument("backends", nargs="*", default=list(BACKENDS), help="Backends to measure.")
+	args = parser.parse_args()
+
+	print(f"{'backend':<8} {'msg/s':>12} {'p50 (us)':>10} {'p99 (us)':>10}")
+	for backend in args.backends:
+		rate, p50, p99 = benchmark(backend, args.count, args.size)
+		print(f"{backend:<8} {rate:>12.0f} {p50:>10} {p99:>10}")
@@ -8,13 +8,15 @@ class Vehicle:
     Represents a vehicle in the traffic simulation.
     """
 
-    def __init__(self, type: str, source: Direction, destination: Direction):
+    def __init__(self, type: str, source: Direction, destination: Direction, sent_at=None, tick=None):
         """
         Initializes a vehicle with a type, source direction, and destination direction.
 
         :param type: Type of the vehicle ('normal' or 'priority').
         :param source: Source direction of the vehicle.
         :param destination: Destination direction of the vehicle.
+        :param sent_at: Optional time.monotonic_ns() timestamp of the sender, used to measure queueing latency.
+        :param tick: Optional tick the vehicle arrives at, used to replay the arrivals of a macro-step.
         :raises TypeError: If the vehicle type is not valid.
         :raises ValueError: If the source or destination direction is not valid.
         """
@@ -28,6 +30,8 @@ class Vehicle:
         self.type = type
         self.source = source
         self.destination = destination
+        self.sent_at = sent_at
+        self.tick = tick
 
     def __str__(self):
         """
@@ -35,7 +39,12 @@ class Vehicle:
 
         :return: String representation of the vehicle.
         """
-        return f"type: {self.type}\nsource: {self.source}\ndestination: {self.destination}\n"
+        string = f"type: {self.type}\nsource: {self.source}\ndestination: {self.destination}\n"
+        if self.sent_at is not None:
+            string += f"sent: {self.sent_at}\n"
+        if self.tick is not None:
+            string += f"tick: {self.tick}\n"
+        return string
 
     @staticmethod
     def str_to_vehicle(string):
@@ -49,11 +58,14 @@ class Vehicle:
         vehicle_type = lines[0].split(": ")[1]
         source = lines[1].split(": ")[1]
         destination = lines[2].split(": ")[1]
+        extra = dict(line.split(": ") for line in lines[3:])
+        sent_at = int(extra["sent"]) if "sent" in extra else None
+        tick = int(extra["tick"]) if "tick" in extra else None
 
         source = Direction(source)
         destination = Direction(destination)
 
-        return Vehicle(vehicle_type, source, destination)
+        return Vehicle(vehicle_type, source, destination, sent_at, tick)
 
 
 if __name__ == "__main__":
@@ -9,19 +9,85 @@ It includes:
 
 Modules:
 - lights: Controls the state of four independent traffic lights.
+- SignalPlan: Declarative signal plans compiled into a precomputed tick to light state table.
 - coordinator: Manages vehicle movements and priority logic.
 - NormalTrafficGen: Generates regular traffic.
 - PriorityTrafficGen: Generates priority vehicles.
+- Admission: Admission control of the traffic queues, with drop, spill and block policies and exact counters.
+- TimeManager: Shared clock with real-time, real-time factor, as-fast-as-possible and step modes.
+- ControlServer: Unix socket control channel of a running simulation.
+- RunRegistry: Registry of the runs of a host, releasing their IPC resources on exit or after a crash.
+- MacroStep: Agreement of the components on multi-tick steps.
+- Checkpoint: Full-state checkpoints of the simulation at tick boundaries.
+- Simulation: Wiring of every component, from scratch or from a checkpoint.
+- EventLog: Buffered structured event log written in batches to a file or SQLite.
+- LoadTest: Saturation curve of the pipeline under a ramped offered load.
+- ColdStart: Cold start to first tick of a simulation per process start method.
+- Soak: Long-running leak and bloat check of every component process.
+- Topology: CPU pinning and nice or SCHED_FIFO priorities of the processes, and tick jitter measure.
+- Capacity: Analytic saturation flow, utilisation and queue estimate per direction, validated against simulated runs.
+- Profiler: Runtime-toggled per-process profiling merged into a Chrome trace, and tracemalloc memory samples.
+- SnapshotRing: Shared memory ring of the crossroad state published every tick.
+- Transport: Pluggable IPC backends (SysV, shared memory ring, pipe, Unix socket) of the simulation channels.
+
+The exported components are imported on first access.
 """
 
-from .LightColor import LightColor
-from .Direction import Direction
-from .Lights import TrafficLights
-from .Coordinator import Coordinator
-from .NormalTrafficGen import NormalTrafficGen
-from .PriorityTrafficGen import PriorityTrafficGen
-from .TimeManager import TimeManager
+import importlib
+import sys
+import types
+
+# Exported names and the (module, attribute) they are imported from on first access, the attribute is None for modules.
+# Importing the package stays cheap, so the spawned and forkserver children only load the components they run.
+EXPORTS = {
+	"LightColor": ("LightColor", "LightColor"),
+	"Direction": ("Direction", "Direction"),
+	"TrafficLights": ("Lights", "TrafficLights"),
+	"Coordinator": ("Coordinator", "Coordinator"),
+	"NormalTrafficGen": ("NormalTrafficGen", "NormalTrafficGen"),
+	"PriorityTrafficGen": ("PriorityTrafficGen", "PriorityTrafficGen"),
+	"TimeManager": ("TimeManager", "TimeManager"),
+	"ControlServer": ("ControlServer", "ControlServer"),
+	"SnapshotRing": ("SnapshotRing", "SnapshotRing"),
+	"SnapshotReader": ("SnapshotRing", "SnapshotReader"),
+	"Display": ("Display", None),
+}
+
+
+def __getattr__(name):
+	"""
+	Imports an exported name on first access and caches it in the package.
+
+	:param name: Exported name.
+	:return: Class or module.
+	:raises AttributeError: If the name is not exported.
+	"""
+	if name not in EXPORTS:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	module_name, attribute = EXPORTS[name]
+	module = importlib.import_module(f".{module_name}", __name__)
+	value = module if attribute is None else getattr(module, attribute)
+	globals()[name] = value
+	return value
+
+
+def __dir__():
+	return sorted(set(globals()) | set(EXPORTS))
+
+
+class LazyPackage(types.ModuleType):
+	"""
+	Keeps the import system from binding a submodule over the class exported under the same name,
+	e.g. importing crossroad_simulation.Coordinator must not replace crossroad_simulation.Coordinator the class.
+	"""
+
+	def __setattr__(self, name, value):
+		if isinstance(value, types.ModuleType) and name in EXPORTS and EXPORTS[name][1] is not None:
+			return
+		super().__setattr__(name, value)
+
 
+sys.modules[__name__].__class__ = LazyPackage
 
 __all__ = [
 	"LightColor",
@@ -31,6 +97,9 @@ __all__ = [
 	"NormalTrafficGen",
 	"PriorityTrafficGen",
 	"TimeManager",
+	"ControlServer",
+	"SnapshotRing",
+	"SnapshotReader",
 	"Display",
 #	"SIMULATION_SETTINGS",
 ]
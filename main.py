@@ -1,45 +1,100 @@
+import argparse
 import multiprocessing
+import os
+import signal
+import sys
+import threading
 import time
-import sysv_ipc
 
-from crossroad_simulation import *
-from crossroad_simulation.TimeManager import TimeManager
+from crossroad_simulation import Checkpoint
+from crossroad_simulation.ControlServer import ControlServer
+from crossroad_simulation.EventLog import EventLog, INFO, LEVELS
+from crossroad_simulation.Profiler import PROFILE_SIGNAL
+from crossroad_simulation.RunRegistry import DEFAULT_DIRECTORY, Run, cleanup_stale
+from crossroad_simulation.Simulation import Simulation, START_METHODS, fork, parse_parameters, parse_transports, set_start_method
+from crossroad_simulation.TimeManager import TimeManager, MODES, ALIASES
+from crossroad_simulation.Topology import COMPONENTS, apply_topology, load_topology
 
-if __name__ == "__main__":
+MAIN_LOOP_DELAY = 0.1  # Seconds between two checks of the stop and profiling requests by the main loop
 
-	with multiprocessing.Manager() as manager:
-		shared_lights = manager.dict({direction: LightColor.RED.value for direction in Direction})
 
-		time_manager = TimeManager("auto", 1)
+def parse_args():
+	"""
+	Parses the command line options of the simulation.
 
-		light_event = multiprocessing.Event()
-		coordinator_event = multiprocessing.Event()
-		traffic_generators_event = {traffic: multiprocessing.Event() for traffic in ["normal_traffic_generators", "priority_traffic_generators"]}
+	:return: Parsed options.
+	"""
+	parser = argparse.ArgumentParser(description="Crossroad traffic simulation.")
+	parser.add_argument("--mode", choices=MODES + list(ALIASES), help="Clock mode of the simulation, auto by default and afap for the forked continuations.")
+	parser.add_argument("--time-unit", type=float, default=1, help="Length of a tick in seconds.")
+	parser.add_argument("--factor", type=float, default=1, help="Real-time factor of the 'factor' clock mode.")
+	parser.add_argument("--control", help="Unix socket of the control channel, a socket of the run in the run registry by default.")
+	parser.add_argument("--run-dir", default=DEFAULT_DIRECTORY, help="Directory of the run registry.")
+	parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a simulation parameter (phase_ticks, normal_rate, priority_rate, seed, macro_ticks, admission, queue_capacity, spill_capacity, road_capacity, plan).")
+	parser.add_argument("--checkpoint-dir", default="checkpoints", help="Directory of the checkpoint files.")
+	parser.add_argument("--checkpoint-every", type=int, default=0, metavar="TICKS", help="Take a full-state checkpoint every TICKS ticks.")
+	parser.add_argument("--resume", metavar="FILE", help="Resume the simulation from a checkpoint file.")
+	parser.add_argument("--fork", metavar="FILE", help="Run one headless continuation of a checkpoint per --variant, in parallel.")
+	parser.add_argument("--variant", action="append", default=[], metavar="NAME=VALUE[,NAME=VALUE...]", help="Parameters of a forked continuation.")
+	parser.add_argument("--log", default="events.jsonl", help="Event log file, a SQLite database if it ends with .db or .sqlite.")
+	parser.add_argument("--log-level", default="info", choices=list(LEVELS), help="Minimum level of the logged events.")
+	parser.add_argument("--profile-dir", default="profiles", help="Directory of the profiling files and merged Chrome trace, in a sub-directory per run.")
+	parser.add_argument("--transport", action="append", default=[], metavar="CHANNEL=BACKEND", help="Backend of the vehicles, lights or display channel: sysv, shm, pipe or unix (defaults: vehicles=sysv, lights=manager, display=ring).")
+	parser.add_argument("--ticks", type=int, default=1000, help="Number of ticks simulated by each forked continuation.")
+	parser.add_argument("--start-method", default="fork", choices=START_METHODS, help="Start method of the simulation processes, forkserver preloads the simulation modules once in its server.")
+	parser.add_argument("--topology", help="JSON file placing the processes on CPUs with nice or SCHED_FIFO priorities, e.g. {\"coordinator\": {\"cpus\": [1], \"fifo\": 10}}.")
+	parser.add_argument("--place", action="append", default=[], metavar="COMPONENT.SETTING=VALUE", help=f"Setting of a process overriding the topology, components: {', '.join(COMPONENTS)}, settings: cpus, nice, fifo.")
+	return parser.parse_args()
 
-		traffic_queues = {direction: sysv_ipc.MessageQueue(key, sysv_ipc.IPC_CREAT) for key, direction in zip(range(1000, 1004), Direction)}
 
-		lights = TrafficLights(shared_lights, light_event, coordinator_event, time_manager)
+if __name__ == "__main__":
+	args = parse_args()
+	set_start_method(args.start_method)
+	topology = load_topology(args.topology, args.place)
 
-		normal_traffic_generator = NormalTrafficGen(traffic_generators_event["normal_traffic_generators"], coordinator_event, lights, traffic_queues, time_manager)
+	for run_id in cleanup_stale(args.run_dir):
+		print(f"Released the resources of crashed run {run_id}", file=sys.stderr)
 
-		priority_traffic_generator = PriorityTrafficGen(traffic_generators_event["priority_traffic_generators"], coordinator_event, lights, traffic_queues, time_manager)
+	if args.fork:
+		variants = [parse_parameters(variant.split(",")) for variant in args.variant] or [{}]
+		for params, summary in fork(args.fork, variants, args.ticks, args.checkpoint_dir, args.mode or "afap", args.time_unit, args.factor, run_directory=args.run_dir):
+			print(f"{params}: {'failed: ' if isinstance(summary, Exception) else ''}{summary}")
+		raise SystemExit
 
-		coordinator = Coordinator(coordinator_event, light_event, lights.get_shared_lights_state(), lights.getpid(), traffic_queues, traffic_generators_event.values(), time_manager)
+	run = Run(args.run_dir, " ".join(sys.argv))
+	# SIGTERM only requests the stop, the main loop then stops the components and releases the run like on Ctrl+C
+	stop = threading.Event()
+	signal.signal(signal.SIGTERM, lambda *_: stop.set())
+	try:
+		with multiprocessing.Manager() as manager:
+			time_manager = TimeManager(args.mode or "auto", args.time_unit, args.factor)
 
-		display = multiprocessing.Process(target=Display.run_display, args=(coordinator, ))
+			checkpoint = Checkpoint.load(args.resume) if args.resume else None
+			event_log = EventLog(args.log, LEVELS[args.log_level])
+			simulation = Simulation(manager, time_manager, parse_parameters(args.set), checkpoint_dir=args.checkpoint_dir, checkpoint_interval=args.checkpoint_every, checkpoint=checkpoint, profile_dir=os.path.join(args.profile_dir, run.run_id), event_log=event_log, transports=parse_transports(args.transport), run=run)
+			simulation.start()
+			for warning in apply_topology(simulation.pids(), topology):
+				print(f"Topology: {warning}", file=sys.stderr)
 
-		lights.start()
-		normal_traffic_generator.start()
-		priority_traffic_generator.start()
-		coordinator.start()
-		display.start()
+			log_profiler = event_log.emitter("profiler", INFO)
+			signal.signal(PROFILE_SIGNAL, simulation.profiler.request_toggle)
+			control = ControlServer(args.control or run.socket_path("control"), {"clock": time_manager.command, "profile": simulation.profiler.command, "admission": simulation.admission.command})
+			control.start()
 
-		try:
-			while True:
-				time.sleep(1)
-		except KeyboardInterrupt:
-			lights.terminate()
-			normal_traffic_generator.terminate()
-			priority_traffic_generator.terminate()
-			coordinator.terminate()
-			display.terminate()
+			try:
+				while not stop.is_set():
+					time.sleep(MAIN_LOOP_DELAY)
+					if simulation.profiler.toggle_requested:
+						path = simulation.profiler.toggle()
+						if path is None:
+							log_profiler("profiling_started")
+						else:
+							log_profiler("trace_written", path=path)
+			except KeyboardInterrupt:
+				pass
+			finally:
+				simulation.stop()
+				simulation.close()
+				control.close()
+	finally:
+		run.close()
@@ -0,0 +1,45 @@
+import multiprocessing
+import time
+
+from crossroad_simulation.Simulation import Simulation
+from crossroad_simulation.TimeManager import TimeManager
+
+POLL_DELAY = 0.002  # Seconds between two reads of the snapshot ring
+
+
+def simulate(params, ticks, **options):
+	"""
+	Runs a headless as-fast-as-possible simulation and collects its snapshots.
+
+	:param params: Dictionary of simulation parameters.
+	:param ticks: Number of ticks to simulate.
+	:param options: Keyword arguments of Simulation, e.g. checkpoint_dir, checkpoint_interval or checkpoint.
+	:return: Dictionary of the snapshot data per tick, the ticks the reader missed are absent.
+	"""
+	with multiprocessing.Manager() as manager:
+		simulation = Simulation(manager, TimeManager("afap", 0), params, display=False, **options)
+		reader = simulation.coordinator.snapshots.reader()
+		snapshots = {}
+		simulation.start()
+		try:
+			while simulation.tick() < ticks:
+				snapshots.update((snapshot.tick, snapshot.data) for snapshot in reader.poll())
+				time.sleep(POLL_DELAY)
+			snapshots.update((snapshot.tick, snapshot.data) for snapshot in reader.poll())
+		finally:
+			simulation.stop()
+			simulation.close()
+	return snapshots
+
+
+def differences(first, second, start, end):
+	"""
+	:param first: Dictionary of snapshot data per tick.
+	:param second: Dictionary of snapshot data per tick.
+	:param start: First compared tick.
+	:param end: Tick after the last compared one.
+	:return: Ticks in [start, end) both runs saw with different data.
+	"""
+	common = sorted(tick for tick in set(first) & set(second) if start <= tick < end)
+	assert common, "the runs share no snapshot"
+	return [tick for tick in common if first[tick] != second[tick]]
@@ -0,0 +1,141 @@
+from collections import deque
+
+import pytest
+
+from crossroad_simulation.Admission import Admission
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.Transport import create_transport
+from crossroad_simulation.Vehicle import Vehicle
+
+NORTH = Direction.NORTH
+CAPACITY = 2
+
+
+def normal(tick=None):
+	return Vehicle("normal", NORTH, Direction.SOUTH, tick=tick)
+
+
+def priority(tick=None):
+	return Vehicle("priority", NORTH, Direction.SOUTH, tick=tick)
+
+
+@pytest.fixture
+def queue():
+	transport = create_transport("shm")
+	yield transport
+	transport.remove()
+
+
+def queued(transport):
+	"""
+	:return: Types of the vehicles waiting in a transport, which is emptied.
+	"""
+	types = []
+	while transport.depth():
+		types.append(Vehicle.str_to_vehicle(transport.receive().decode()).type)
+	return types
+
+
+def counters(admission):
+	return admission.totals()[NORTH]
+
+
+def test_invalid_settings():
+	with pytest.raises(ValueError):
+		Admission("drop-random")
+	with pytest.raises(ValueError):
+		Admission(capacity=0)
+
+
+def test_drop_newest(queue):
+	admission = Admission("drop-newest", CAPACITY)
+	assert [admission.offer(queue, normal(), deque()) for _ in range(4)] == [True, True, False, False]
+	assert counters(admission) == {"accepted": 2, "dropped": 2, "spilled": 0, "blocked": 0}
+
+
+def test_drop_oldest_keeps_priority_vehicles(queue):
+	admission = Admission("drop-oldest", CAPACITY)
+	admission.offer(queue, priority(), deque())
+	admission.offer(queue, normal(), deque())
+	assert admission.offer(queue, normal(), deque())
+	assert queue.depth() == 2
+	assert counters(admission) == {"accepted": 2, "dropped": 1, "spilled": 0, "blocked": 0}
+	assert queued(queue) == ["priority", "normal"]
+
+
+def test_drop_oldest_drops_the_arrival_behind_priority_vehicles_only(queue):
+	admission = Admission("drop-oldest", CAPACITY)
+	for _ in range(CAPACITY):
+		admission.offer(queue, priority(), deque())
+	assert not admission.offer(queue, normal(), deque())
+	assert counters(admission) == {"accepted": 2, "dropped": 1, "spilled": 0, "blocked": 0}
+
+
+def test_priority_vehicles_enter_a_full_queue(queue):
+	admission = Admission("drop-newest", CAPACITY)
+	for _ in range(CAPACITY):
+		admission.offer(queue, normal(), deque())
+	assert admission.offer(queue, priority(), deque())
+	assert queue.depth() == CAPACITY + 1
+
+
+def test_spill_holds_then_retries_in_order(queue):
+	admission = Admission("spill", CAPACITY, spill_capacity=1)
+	held = {NORTH: deque()}
+	results = [admission.offer(queue, normal(tick), held[NORTH]) for tick in range(4)]
+	assert results == [True, True, False, False]
+	assert [vehicle.tick for vehicle in held[NORTH]] == [2]
+	assert counters(admission) == {"accepted": 2, "dropped": 1, "spilled": 1, "blocked": 0}
+
+	queue.receive()
+	assert not admission.retry({NORTH: queue}, held)
+	assert not held[NORTH]
+	assert counters(admission) == {"accepted": 3, "dropped": 1, "spilled": 1, "blocked": 0}
+
+
+def test_block_stops_the_arrivals_while_holding(queue):
+	admission = Admission("block", CAPACITY)
+	held = {NORTH: deque()}
+	for tick in range(3):
+		admission.offer(queue, normal(tick), held[NORTH])
+	assert admission.retry({NORTH: queue}, held)
+	assert admission.retry({NORTH: queue}, held)
+	assert counters(admission) == {"accepted": 2, "dropped": 0, "spilled": 1, "blocked": 2}
+
+	queue.receive()
+	assert not admission.retry({NORTH: queue}, held)
+	assert counters(admission)["accepted"] == 3
+
+
+def test_replay_applies_the_same_policy():
+	admission = Admission("drop-oldest", CAPACITY)
+	arrivals = deque([priority(0), normal(0), normal(1), normal(1), normal(2)])
+	waiting, held = deque(), deque()
+	admission.replay(NORTH, arrivals, waiting, held, 1)
+	assert [vehicle.type for vehicle in waiting] == ["priority", "normal"]
+	assert [vehicle.tick for vehicle in waiting] == [0, 1]
+	assert [vehicle.tick for vehicle in arrivals] == [2]
+	assert counters(admission) == {"accepted": 2, "dropped": 2, "spilled": 0, "blocked": 0}
+
+
+def test_counters_add_up_to_the_offered_vehicles(queue):
+	admission = Admission("spill", CAPACITY, spill_capacity=3)
+	held = {NORTH: deque()}
+	offered = 0
+	for tick in range(50):
+		admission.retry({NORTH: queue}, held)
+		for _ in range(tick % 3):
+			admission.offer(queue, normal(tick), held[NORTH])
+			offered += 1
+		if tick % 2:
+			queue.receive()
+	totals = counters(admission)
+	assert totals["accepted"] + totals["dropped"] + len(held[NORTH]) == offered
+	assert totals["accepted"] - queue.depth() == 25
+
+
+def test_status_command():
+	admission = Admission("block", CAPACITY)
+	assert admission.command("status").startswith(f"policy=block capacity={CAPACITY} north:accepted=0")
+	with pytest.raises(ValueError):
+		admission.command("reset")
@@ -0,0 +1,27 @@
+import pytest
+
+from crossroad_simulation.Capacity import estimate, observe
+from crossroad_simulation.Direction import Direction
+
+
+def test_low_load_estimate_is_certain():
+	estimates = estimate(0.5, 0.05)
+	for direction in Direction:
+		assert 0 < estimates[direction]["utilisation"] < 0.5
+		assert not estimates[direction]["saturated"]
+		assert not estimates[direction]["uncertain"]
+
+
+def test_high_load_estimate_is_flagged_uncertain():
+	estimates = estimate(1.0, 0.2)
+	assert all(estimates[direction]["uncertain"] for direction in Direction)
+
+
+def test_invalid_rates_are_rejected():
+	with pytest.raises(ValueError):
+		estimate(1.5, 0.1)
+
+
+def test_run_must_go_past_the_warmup():
+	with pytest.raises(ValueError):
+		observe(0.5, 0.05, ticks=1000, warmup=1000)
@@ -0,0 +1,70 @@
+import multiprocessing
+
+import pytest
+
+from crossroad_simulation import Checkpoint
+from crossroad_simulation.Simulation import fork
+from tests.helpers import differences, simulate
+
+# Priority vehicles are signalled asynchronously, so only runs without them are reproducible tick for tick
+PARAMS = {"seed": 5, "priority_rate": 0}
+
+
+def test_save_and_load(tmp_path):
+	path = str(tmp_path / "checkpoint.ckpt")
+	Checkpoint.save(path, {"version": Checkpoint.VERSION, "tick": 12})
+	assert Checkpoint.load(path)["tick"] == 12
+	Checkpoint.save(path, {"version": Checkpoint.VERSION - 1, "tick": 12})
+	with pytest.raises(ValueError):
+		Checkpoint.load(path)
+
+
+def test_due_ticks_skip_the_start_tick(tmp_path):
+	with multiprocessing.Manager() as manager:
+		checkpointer = Checkpoint.Checkpointer(manager, str(tmp_path), 100, start_tick=200)
+	assert [tick for tick in range(0, 501) if checkpointer.due(tick)] == [300, 400, 500]
+	assert checkpointer.horizon(201) == 100
+	assert checkpointer.horizon(250) == 51
+	assert checkpointer.path(300).endswith("checkpoint_0000000300.ckpt")
+
+
+def test_checkpoint_holds_the_full_state(tmp_path):
+	simulate(PARAMS, 250, checkpoint_dir=str(tmp_path), checkpoint_interval=100)
+	checkpoint = Checkpoint.load(str(tmp_path / "checkpoint_0000000200.ckpt"))
+	assert checkpoint["tick"] == 200
+	assert checkpoint["params"]["seed"] == PARAMS["seed"]
+	assert set(checkpoint["components"]) == {"lights", "normal_traffic", "priority_traffic", "coordinator"}
+	assert all(state["tick"] == 200 for state in checkpoint["components"].values())
+	assert set(checkpoint["queues"]) == set(checkpoint["lights_state"]) == {"north", "east", "south", "west"}
+
+
+@pytest.mark.parametrize("macro_ticks", [1, 8])
+def test_resume_matches_uninterrupted_run(tmp_path, macro_ticks):
+	params = dict(PARAMS, macro_ticks=macro_ticks)
+	uninterrupted = simulate(params, 1200, checkpoint_dir=str(tmp_path / "first"), checkpoint_interval=500)
+	checkpoint = Checkpoint.load(str(tmp_path / "first" / "checkpoint_0000000500.ckpt"))
+	assert checkpoint["tick"] == 500
+	resumed = simulate({}, 1200, checkpoint=checkpoint)
+	assert differences(uninterrupted, resumed, 501, 1150) == []
+
+
+def test_fork_runs_every_variant(tmp_path):
+	simulate(PARAMS, 150, checkpoint_dir=str(tmp_path / "base"), checkpoint_interval=100)
+	variants = [{"phase_ticks": 2}, {"phase_ticks": 5}]
+	results = fork(str(tmp_path / "base" / "checkpoint_0000000100.ckpt"), variants, 200, str(tmp_path / "forks"))
+	assert [params for params, _ in results] == variants
+	for params, summary in results:
+		final = Checkpoint.load(summary["checkpoint"])
+		assert final["tick"] == 300
+		assert final["params"]["phase_ticks"] == params["phase_ticks"]
+
+
+def test_failed_fork_reports_and_releases_queues(tmp_path):
+	simulate(PARAMS, 150, checkpoint_dir=str(tmp_path / "base"), checkpoint_interval=100)
+	with open("/proc/sysvipc/msg") as queues:
+		before = len(queues.readlines())
+	results = fork(str(tmp_path / "base" / "checkpoint_0000000100.ckpt"), [{"phase_ticks": 0}, {"phase_ticks": 5}], 100, str(tmp_path / "forks"))
+	assert isinstance(results[0][1], ValueError)
+	assert Checkpoint.load(results[1][1]["checkpoint"])["tick"] == 200
+	with open("/proc/sysvipc/msg") as queues:
+		assert len(queues.readlines()) == before
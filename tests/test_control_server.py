@@ -0,0 +1,32 @@
+import socket
+import time
+
+from crossroad_simulation.ControlServer import ControlServer, send_command
+
+
+def start_server(path):
+	server = ControlServer(str(path), {"echo": lambda command: command, "fail": lambda command: 1 / 0})
+	server.start()
+	while not path.exists():
+		time.sleep(0.01)
+	return server
+
+
+def test_failing_handler_is_reported(tmp_path):
+	path = tmp_path / "control.sock"
+	server = start_server(path)
+	assert send_command("fail now", str(path)) == "error: ZeroDivisionError: division by zero"
+	assert send_command("echo still alive", str(path)) == "still alive"
+	assert send_command("rewind", str(path)).startswith("error: unknown target")
+	assert server.is_alive()
+
+
+def test_client_leaving_before_reply(tmp_path):
+	path = tmp_path / "control.sock"
+	server = start_server(path)
+	for _ in range(3):
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+			client_socket.connect(str(path))
+			client_socket.sendall(b"echo " + b"x" * 100000 + b"\n")
+	assert send_command("echo still alive", str(path)) == "still alive"
+	assert server.is_alive()
@@ -0,0 +1,87 @@
+import json
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+
+from crossroad_simulation.EventLog import DEBUG, INFO, WARNING, EventLog, discard, handle_termination
+from tests.helpers import simulate
+
+THREADS = 4
+EVENTS = 20000  # Per thread, several batches each
+
+
+def test_concurrent_appends_are_all_flushed(tmp_path):
+	path = tmp_path / "events.jsonl"
+	event_log = EventLog(str(path), INFO)
+	emit = event_log.emitter("test", INFO)
+
+	def produce(thread):
+		for index in range(EVENTS):
+			emit("event", thread=thread, index=index)
+
+	emit("start")
+	producers = [threading.Thread(target=produce, args=(thread, )) for thread in range(THREADS)]
+	for producer in producers:
+		producer.start()
+	for producer in producers:
+		producer.join()
+	event_log.flush()
+
+	records = [json.loads(line) for line in path.read_text().splitlines()]
+	assert len(records) == THREADS * EVENTS + 1
+	assert {(record["thread"], record["index"]) for record in records[1:]} == {(thread, index) for thread in range(THREADS) for index in range(EVENTS)}
+
+
+def wait_on_barrier(event_log, barrier, ready):
+	handle_termination()
+	event_log.emitter("component", INFO)("waiting")
+	ready.set()
+	barrier.wait()
+
+
+def test_terminated_component_flushes_and_exits(tmp_path):
+	path = tmp_path / "events.jsonl"
+	event_log = EventLog(str(path), INFO)
+	barrier = multiprocessing.Barrier(2)
+	ready = multiprocessing.Event()
+	component = multiprocessing.Process(target=wait_on_barrier, args=(event_log, barrier, ready))
+	component.start()
+	assert ready.wait(10)
+	os.kill(component.pid, signal.SIGINT)
+	component.terminate()
+	component.join(10)
+
+	assert component.exitcode == 0
+	assert [json.loads(line)["event"] for line in path.read_text().splitlines()] == ["waiting"]
+
+
+def test_priority_announcements_are_logged_by_the_generator(tmp_path):
+	path = tmp_path / "events.jsonl"
+	simulate({"seed": 1, "priority_rate": 0.5}, 200, event_log=EventLog(str(path), INFO))
+
+	records = [json.loads(line) for line in path.read_text().splitlines()]
+	announcements = [record for record in records if record["event"] == "priority_approaching"]
+	assert announcements
+	assert {record["component"] for record in announcements} == {"priority_traffic"}
+
+
+def test_disabled_levels_resolve_to_a_no_op(tmp_path):
+	event_log = EventLog(str(tmp_path / "events.jsonl"), INFO)
+	assert event_log.emitter("test", DEBUG) is discard
+	assert event_log.emitter("test", WARNING) is not discard
+
+
+def test_sqlite_batches(tmp_path):
+	path = tmp_path / "events.db"
+	event_log = EventLog(str(path), INFO)
+	emit = event_log.emitter("test", WARNING)
+	for index in range(10):
+		emit("event", index=index)
+	event_log.flush()
+
+	with sqlite3.connect(path) as connection:
+		rows = connection.execute("SELECT level, component, event, fields FROM events").fetchall()
+	connection.close()
+	assert [(level, component, event, json.loads(fields)["index"]) for level, component, event, fields in rows] == [(WARNING, "test", "event", index) for index in range(10)]
@@ -0,0 +1,33 @@
+import multiprocessing
+
+import pytest
+
+from crossroad_simulation.LoadTest import LoadTest
+from crossroad_simulation.Metrics import LatencyHistogram
+
+RATES = [100, 400]  # Total offered vehicles per second of the ramp
+STEP_DURATION = 0.5
+
+
+def test_histogram_percentiles():
+	histogram = LatencyHistogram()
+	for microseconds in [3] * 90 + [1000] * 10:
+		histogram.record(microseconds)
+	counts = histogram.snapshot()
+	assert sum(counts) == 100
+	assert 2 <= LatencyHistogram.percentile(counts, 0.5) <= 4
+	assert 512 <= LatencyHistogram.percentile(counts, 0.99) <= 1024
+	assert LatencyHistogram.percentile([0] * len(counts), 0.5) == 0
+
+
+def test_ramp_accounts_for_every_vehicle():
+	with multiprocessing.Manager() as manager:
+		load_test = LoadTest(manager, producers=2, queue_limit=4)
+		curve = load_test.run(RATES, STEP_DURATION)
+
+	assert [measures["target"] for measures in curve] == RATES
+	for measures in curve:
+		assert measures["offered"] == pytest.approx(measures["target"], rel=0.3)
+		assert measures["offered"] == pytest.approx(measures["sent"] + measures["dropped"], rel=0.01)
+		assert 0 < measures["accepted"] <= measures["sent"] * 1.1
+		assert measures["ticks"] > 0
@@ -0,0 +1,11 @@
+from tests.helpers import differences, simulate
+
+# Priority vehicles are signalled asynchronously, so only runs without them are reproducible tick for tick
+PARAMS = {"seed": 3, "priority_rate": 0}
+
+
+def test_macro_step_matches_single_steps():
+	single = simulate(PARAMS, 1200)
+	macro = simulate(dict(PARAMS, macro_ticks=8), 1200)
+	assert differences(single, macro, 1, 1150) == []
+
@@ -0,0 +1,54 @@
+import json
+import multiprocessing
+import os
+import signal
+
+from crossroad_simulation.Profiler import NULL_SPAN, PROFILE_SIGNAL, Profiler
+from crossroad_simulation.Simulation import Simulation
+from crossroad_simulation.TimeManager import TimeManager
+
+COMPONENTS = {"lights", "normal_traffic", "priority_traffic", "coordinator"}
+
+
+def test_spans_are_no_ops_while_disabled(tmp_path):
+	profiler = Profiler(str(tmp_path))
+	profiler.poll("test")
+	assert profiler.span("work") is NULL_SPAN
+
+
+def test_signal_only_requests_the_toggle(tmp_path):
+	profiler = Profiler(str(tmp_path))
+	previous = signal.signal(PROFILE_SIGNAL, profiler.request_toggle)
+	try:
+		os.kill(os.getpid(), PROFILE_SIGNAL)
+	finally:
+		signal.signal(PROFILE_SIGNAL, previous)
+	assert profiler.toggle_requested and not profiler.enabled.value
+	assert profiler.toggle() is None
+	assert profiler.enabled.value and not profiler.toggle_requested
+	assert profiler.toggle() == str(tmp_path / "trace.json")
+	assert not profiler.enabled.value
+
+
+def test_trace_merges_every_component(tmp_path):
+	with multiprocessing.Manager() as manager:
+		simulation = Simulation(manager, TimeManager("afap", 0), {"seed": 1}, display=False, profile_dir=str(tmp_path))
+		simulation.start()
+		try:
+			simulation.wait_tick(100)
+			simulation.profiler.start()
+			simulation.wait_tick(simulation.tick() + 200)
+			path = simulation.profiler.stop()
+		finally:
+			simulation.stop()
+			simulation.close()
+
+	with open(path) as file:
+		events = json.load(file)["traceEvents"]
+	names = {event["args"]["name"] for event in events if event["ph"] == "M"}
+	assert names == COMPONENTS
+	spans = [event for event in events if event["ph"] == "X"]
+	assert {event["cat"] for event in spans} == COMPONENTS
+	assert {"wait tick", "sleep"} <= {event["name"] for event in spans}
+	assert all(event["dur"] >= 0 for event in spans)
+	assert len([name for name in os.listdir(tmp_path) if name.endswith(".prof")]) == len(COMPONENTS)
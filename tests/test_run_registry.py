@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import pytest
+import sysv_ipc
+
+from crossroad_simulation.RunRegistry import Run, cleanup_stale, find_socket, runs
+from crossroad_simulation.Simulation import Simulation
+from crossroad_simulation.TimeManager import TimeManager
+
+
+def crash(directory, connection):
+	"""
+	Creates a run owning a SysV queue and a shared memory block, then dies without releasing them.
+	"""
+	run = Run(directory, "crashing run")
+	queue = sysv_ipc.MessageQueue(None, sysv_ipc.IPC_CREX)
+	run.add("sysv", queue.key)
+	shm = shared_memory.SharedMemory(create=True, size=64)
+	run.add("shm", shm.name)
+	connection.send((run.run_id, queue.key, shm.name))
+	os._exit(1)
+
+
+def test_stale_runs_are_cleaned(tmp_path):
+	reader, writer = multiprocessing.Pipe(duplex=False)
+	process = multiprocessing.Process(target=crash, args=(str(tmp_path), writer))
+	process.start()
+	run_id, key, name = reader.recv()
+	process.join()
+
+	assert [(record["run_id"], record["alive"]) for record in runs(str(tmp_path))] == [(run_id, False)]
+	assert cleanup_stale(str(tmp_path)) == [run_id]
+	assert runs(str(tmp_path)) == []
+	with pytest.raises(sysv_ipc.ExistentialError):
+		sysv_ipc.MessageQueue(key)
+	with pytest.raises(FileNotFoundError):
+		shared_memory.SharedMemory(name=name)
+
+
+def test_live_runs_are_kept(tmp_path):
+	run = Run(str(tmp_path), "live run")
+	try:
+		path = run.socket_path("control")
+		assert cleanup_stale(str(tmp_path)) == []
+		assert find_socket("control", directory=str(tmp_path)) == path
+	finally:
+		run.close()
+	assert runs(str(tmp_path)) == []
+	with pytest.raises(ValueError):
+		find_socket("control", directory=str(tmp_path))
+
+
+def test_concurrent_simulations_own_distinct_resources(tmp_path):
+	with multiprocessing.Manager() as manager:
+		simulations = [Simulation(manager, TimeManager("afap", 0), {"seed": index}, display=False, run=Run(str(tmp_path), f"simulation {index}")) for index in range(2)]
+		resources = [{(kind, str(name)) for kind, name in simulation.run.record["resources"] if kind != "process"} for simulation in simulations]
+		assert resources[0] and resources[1]
+		assert not resources[0] & resources[1]
+		for simulation in simulations:
+			simulation.start()
+		try:
+			for simulation in simulations:
+				simulation.wait_tick(200)
+		finally:
+			for simulation in simulations:
+				simulation.stop()
+				simulation.close()
+				simulation.run.close()
+	assert runs(str(tmp_path)) == []
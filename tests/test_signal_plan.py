@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.LightColor import LightColor
+from crossroad_simulation.SignalPlan import compile_plans, default_plan, load_plans, time_of_day
+from crossroad_simulation.SnapshotRing import LIGHTS
+from tests.helpers import simulate
+
+GREEN, RED = LightColor.GREEN.value, LightColor.RED.value
+NORTH_SOUTH = {Direction.NORTH: GREEN, Direction.EAST: RED, Direction.SOUTH: GREEN, Direction.WEST: RED}
+EAST_WEST = {Direction.NORTH: RED, Direction.EAST: GREEN, Direction.SOUTH: RED, Direction.WEST: GREEN}
+ALL_RED = dict.fromkeys(Direction, RED)
+
+
+def plan(*phases, **settings):
+	"""
+	:param phases: Tuples (green directions, ticks).
+	:param settings: Optional all_red and offset of the plan.
+	:return: Plan dictionary.
+	"""
+	return {"phases": [{"green": [direction.value for direction in green], "ticks": ticks} for green, ticks in phases], **settings}
+
+
+NS = (Direction.NORTH, Direction.SOUTH)
+EW = (Direction.EAST, Direction.WEST)
+
+
+def test_default_plan_alternates_phases():
+	schedule = compile_plans(default_plan(4))
+	assert schedule.period == 8
+	assert [schedule.state(tick) for tick in range(10)] == [NORTH_SOUTH] * 4 + [EAST_WEST] * 4 + [NORTH_SOUTH] * 2
+	assert schedule.green_share(Direction.NORTH) == schedule.green_share(Direction.EAST) == 0.5
+
+
+def test_remaining_wraps_around_the_period():
+	schedule = compile_plans(default_plan(3))
+	assert [schedule.remaining(tick) for tick in range(7)] == [3, 2, 1, 3, 2, 1, 3]
+	assert [schedule.next_change(tick) for tick in (0, 2, 3, 5)] == [3, 3, 6, 6]
+
+
+def test_constant_plan_never_changes():
+	schedule = compile_plans({"plans": {"flash": plan((NS + EW, 5))}})
+	assert schedule.remaining(2) == schedule.period == 5
+	assert schedule.green_share(Direction.WEST) == 1
+
+
+def test_all_red_clearance():
+	schedule = compile_plans({"plans": {"p": plan((NS, 3), (EW, 2), all_red=1)}})
+	assert schedule.period == 7
+	assert [schedule.state(tick) for tick in range(7)] == [NORTH_SOUTH] * 3 + [ALL_RED] + [EAST_WEST] * 2 + [ALL_RED]
+	assert schedule.green_share(Direction.SOUTH) == pytest.approx(3 / 7)
+
+
+def test_offset_shifts_the_cycle():
+	shifted = compile_plans({"plans": {"p": plan((NS, 2), (EW, 2), offset=1)}})
+	aligned = compile_plans({"plans": {"p": plan((NS, 2), (EW, 2))}})
+	assert [shifted.state(tick) for tick in range(1, 9)] == [aligned.state(tick) for tick in range(8)]
+
+
+def test_time_of_day():
+	assert time_of_day("06:30", 1440) == 390
+	assert time_of_day("12:00", 96) == 48
+	assert time_of_day(10, 96) == 10
+	for value in ("24:00", 96, -1):
+		with pytest.raises(ValueError):
+			time_of_day(value, 96)
+
+
+def test_schedule_switches_plans_and_wraps_the_day():
+	spec = {
+		"day_ticks": 96,
+		"plans": {"night": plan((NS + EW, 4)), "day": plan((NS, 2), (EW, 2))},
+		"schedule": [{"at": "18:00", "plan": "night"}, {"at": 24, "plan": "day"}],
+	}
+	schedule = compile_plans(spec)
+	assert schedule.period == 96
+	everything = dict.fromkeys(Direction, GREEN)
+	assert [schedule.state(tick) for tick in range(22, 27)] == [everything] * 2 + [NORTH_SOUTH] * 2 + [EAST_WEST]
+	assert [schedule.state(tick) for tick in range(70, 74)] == [EAST_WEST] * 2 + [everything] * 2
+	# The ticks before the first switch of the day run the night plan
+	assert schedule.state(95) == schedule.state(0) == everything
+	assert schedule.remaining(72) == 48
+
+	started = compile_plans({**spec, "start": "06:00"})
+	assert started.start == 24
+	assert started.state(0) == schedule.state(24)
+
+
+@pytest.mark.parametrize("spec", [
+	{"plans": {"p": {"phases": []}}},
+	{"plans": {"p": plan((NS, 0))}},
+	{"plans": {"p": plan((NS, 2), all_red=-1)}},
+	{"plans": {}},
+	{"plans": {"a": plan((NS, 2)), "b": plan((EW, 2))}},
+	{"plans": {"a": plan((NS, 2))}, "schedule": [{"at": 0, "plan": "b"}]},
+	{"plans": {"a": plan((NS, 2))}, "schedule": [{"at": "25:00", "plan": "a"}]},
+])
+def test_invalid_plans(spec):
+	with pytest.raises(ValueError):
+		compile_plans(spec)
+
+
+def test_simulation_follows_the_plan_file(tmp_path):
+	path = tmp_path / "plan.json"
+	path.write_text(json.dumps({"plans": {"p": plan((NS, 3), (EW, 5), all_red=2, offset=1)}}))
+	schedule = load_plans(str(path))
+	snapshots = simulate({"seed": 3, "priority_rate": 0, "plan": str(path)}, 40)
+	assert len(snapshots) > 30
+	for tick, data in snapshots.items():
+		assert LIGHTS.unpack_from(data, 0) == tuple(schedule.state(tick).values())
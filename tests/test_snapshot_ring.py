@@ -0,0 +1,78 @@
+import multiprocessing
+
+import pytest
+
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.LightColor import LightColor
+from crossroad_simulation.SnapshotRing import MAX_SNAPSHOT_VEHICLES, SnapshotRing
+from crossroad_simulation.Vehicle import Vehicle
+
+CAPACITY = 8
+LIGHTS = {Direction.NORTH: LightColor.GREEN.value, Direction.EAST: LightColor.RED.value, Direction.SOUTH: LightColor.GREEN.value, Direction.WEST: LightColor.RED.value}
+
+
+def roads(length=0):
+	return {direction: [Vehicle("normal", direction, direction.get_right()) for _ in range(length)] for direction in Direction}
+
+
+@pytest.fixture
+def ring():
+	ring = SnapshotRing(capacity=CAPACITY)
+	yield ring
+	ring.close()
+	ring.unlink()
+
+
+def test_snapshot_round_trip(ring):
+	published = roads(2)
+	published[Direction.WEST].append(Vehicle("priority", Direction.WEST, Direction.EAST))
+	ring.publish(7, LIGHTS, published)
+
+	snapshot = ring.latest()
+	assert snapshot.tick == 7
+	assert snapshot.lights == LIGHTS
+	assert snapshot.queue_lengths == {Direction.NORTH: 2, Direction.EAST: 2, Direction.SOUTH: 2, Direction.WEST: 3}
+	assert [(vehicle.type, vehicle.destination) for vehicle in snapshot.vehicles(Direction.WEST)] == [(vehicle.type, vehicle.destination) for vehicle in published[Direction.WEST]]
+
+
+def test_long_roads_keep_their_length(ring):
+	ring.publish(1, LIGHTS, roads(MAX_SNAPSHOT_VEHICLES + 5))
+	snapshot = ring.latest()
+	assert snapshot.queue_lengths[Direction.NORTH] == MAX_SNAPSHOT_VEHICLES + 5
+	assert len(snapshot.vehicles(Direction.NORTH)) == MAX_SNAPSHOT_VEHICLES
+	# Without road capacity a saturated road grows past 16 bits
+	saturated = {direction: vehicles * 20000 for direction, vehicles in roads(5).items()}
+	ring.publish(2, LIGHTS, saturated)
+	assert ring.latest().queue_lengths[Direction.WEST] == 100000
+
+
+def test_reader_gets_every_snapshot_in_order(ring):
+	reader = ring.reader()
+	for tick in range(1, 6):
+		ring.publish(tick, LIGHTS, roads())
+	assert [snapshot.tick for snapshot in reader.poll()] == [1, 2, 3, 4, 5]
+	assert reader.poll() == []
+	assert reader.overruns == 0
+
+
+def test_reader_detects_overruns(ring):
+	reader = ring.reader()
+	for tick in range(1, CAPACITY + 4):
+		ring.publish(tick, LIGHTS, roads())
+	snapshots = reader.poll()
+	assert [snapshot.tick for snapshot in snapshots] == list(range(4, CAPACITY + 4))
+	assert reader.overruns == 3
+
+
+def read_latest(ring, results):
+	results.put(ring.latest().tick)
+	ring.close()
+
+
+def test_ring_is_shared_with_other_processes(ring):
+	ring.publish(42, LIGHTS, roads(1))
+	results = multiprocessing.Queue()
+	process = multiprocessing.Process(target=read_latest, args=(ring, results))
+	process.start()
+	process.join()
+	assert results.get(timeout=5) == 42
@@ -0,0 +1,40 @@
+import csv
+import json
+import multiprocessing
+
+from crossroad_simulation.Soak import FIELDS, Soak
+
+COMPONENTS = ["lights", "normal_traffic", "priority_traffic", "coordinator"]
+
+
+def test_short_soak_samples_every_component(tmp_path):
+	with multiprocessing.Manager() as manager:
+		soak = Soak(manager, 600, 200, {"seed": 1})
+		samples = soak.run()
+
+	assert [rows[0]["tick"] for rows in samples] == [200, 400, 600]
+	for rows in samples:
+		assert [row["component"] for row in rows] == COMPONENTS
+		assert all(row["rss_kb"] > 0 and row["fds"] > 0 for row in rows)
+	assert any(row["traced_kb"] > 0 for row in samples[-1])
+	assert soak.check() == []
+
+	soak.write(str(tmp_path / "soak.csv"), str(tmp_path / "allocations.jsonl"))
+	with open(tmp_path / "soak.csv") as file:
+		rows = list(csv.DictReader(file))
+	assert list(rows[0]) == FIELDS and len(rows) == 3 * len(COMPONENTS)
+	with open(tmp_path / "allocations.jsonl") as file:
+		assert len([json.loads(line) for line in file]) == 3
+
+
+def test_growth_above_the_thresholds_is_reported():
+	with multiprocessing.Manager() as manager:
+		soak = Soak(manager, 200, 100, {"seed": 1}, trace_memory=False)
+		soak.run()
+
+	soak.samples[-1] = [dict(row, rss_kb=row["rss_kb"] + 100 * 1024) for row in soak.samples[-1]]
+	soak.samples[-1][0]["road_length"] = 1000
+	violations = soak.check()
+	assert len(violations) == len(COMPONENTS) + 1
+	assert all("rss_kb grew" in violation for violation in violations[:-1])
+	assert "a road holds 1000 vehicles" in violations[-1]
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import crossroad_simulation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_SIMULATION = """
+import sys
+from crossroad_simulation.Simulation import set_start_method
+from tests.helpers import simulate
+
+if __name__ == "__main__":
+	set_start_method(sys.argv[1])
+	snapshots = simulate({"seed": 1}, 50)
+	print(max(snapshots))
+"""
+
+
+def python(code, *args):
+	"""
+	:param code: Source run by a fresh interpreter from the repository root.
+	:param args: Command line arguments of the code.
+	:return: Standard output of the interpreter.
+	"""
+	return subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, check=True, capture_output=True, text=True, timeout=120).stdout
+
+
+def test_package_import_loads_no_component():
+	loaded = python("import sys, crossroad_simulation; print(sorted(name for name in sys.modules if name.startswith('crossroad_simulation.')))")
+	assert loaded.strip() == "[]"
+
+
+def test_exports_are_imported_on_first_access():
+	from crossroad_simulation.Coordinator import Coordinator
+
+	assert crossroad_simulation.Coordinator is Coordinator
+	assert crossroad_simulation.Display.__name__ == "crossroad_simulation.Display"
+	with pytest.raises(AttributeError):
+		crossroad_simulation.Missing
+
+
+@pytest.mark.parametrize("start_method", ["spawn", "forkserver"])
+def test_simulation_runs_with_every_start_method(start_method):
+	assert int(python(RUN_SIMULATION, start_method)) >= 50
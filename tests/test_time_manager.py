@@ -0,0 +1,73 @@
+import multiprocessing
+import time
+
+import pytest
+
+from crossroad_simulation.TimeManager import TimeManager
+
+TIME_UNIT = 0.02  # Seconds of a time unit of the timed tests
+
+
+def test_aliases_and_invalid_mode():
+	assert TimeManager("auto").mode == "realtime"
+	assert TimeManager("manual").mode == "step"
+	with pytest.raises(ValueError):
+		TimeManager("slow")
+
+
+def test_periods_of_each_mode():
+	time_manager = TimeManager("realtime", 0.5, factor=10)
+	assert time_manager.period(4) == 2
+	time_manager.change_mode("factor")
+	assert time_manager.period(4) == pytest.approx(0.2)
+	time_manager.change_mode("afap")
+	assert time_manager.period(4) == 0
+
+
+def test_afap_does_not_wait():
+	time_manager = TimeManager("afap", 1)
+	start = time.monotonic()
+	for _ in range(1000):
+		time_manager.sleep()
+	assert time.monotonic() - start < 0.5
+
+
+def test_factor_sleeps_against_absolute_deadlines():
+	time_manager = TimeManager("factor", TIME_UNIT * 2, factor=2)
+	start = time.monotonic()
+	for _ in range(10):
+		time_manager.sleep()
+	assert 10 * TIME_UNIT <= time.monotonic() - start < 10 * TIME_UNIT + 0.1
+
+
+def sleep_units(time_manager, units, done):
+	for _ in range(units):
+		time_manager.sleep()
+	done.set()
+
+
+def test_step_mode_releases_units_from_another_process():
+	time_manager = TimeManager("step")
+	done = multiprocessing.Event()
+	process = multiprocessing.Process(target=sleep_units, args=(time_manager, 3, done))
+	process.start()
+	try:
+		time_manager.step(2)
+		assert not done.wait(0.2)
+		time_manager.step()
+		assert done.wait(5)
+	finally:
+		process.join(5)
+		process.kill()
+
+
+def test_commands():
+	time_manager = TimeManager("realtime", 1)
+	assert time_manager.command("mode afap").startswith("mode=afap")
+	time_manager.command("factor 4")
+	time_manager.command("unit 0.5")
+	assert (time_manager.factor, time_manager.time_unit) == (4, 0.5)
+	with pytest.raises(ValueError):
+		time_manager.command("rewind")
+	with pytest.raises(ValueError):
+		time_manager.command("factor 0")
@@ -0,0 +1,72 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from crossroad_simulation.SnapshotRing import Snapshot
+from crossroad_simulation.Topology import apply_topology, load_topology, parse_cpus, parse_placement, percentile, tick_jitter
+
+CPU = min(os.sched_getaffinity(0))
+
+
+def test_cpu_lists():
+	assert parse_cpus(str(CPU)) == [CPU]
+	assert parse_cpus(f"{CPU},{CPU}-{CPU}") == [CPU]
+	with pytest.raises(ValueError):
+		parse_cpus([max(os.sched_getaffinity(0)) + 1])
+	with pytest.raises(ValueError):
+		parse_cpus([])
+
+
+def test_invalid_placements():
+	with pytest.raises(ValueError):
+		parse_placement("gpu", {})
+	with pytest.raises(ValueError):
+		parse_placement("display", {"ionice": 3})
+	with pytest.raises(ValueError):
+		parse_placement("display", {"fifo": 1000})
+	with pytest.raises(ValueError):
+		parse_placement("display", {"nice": 5, "fifo": 10})
+
+
+def test_assignments_override_the_topology_file(tmp_path):
+	path = tmp_path / "topology.json"
+	path.write_text(json.dumps({"coordinator": {"cpus": [CPU], "nice": 5}, "display": {"nice": 10}}))
+	topology = load_topology(str(path), ["coordinator.nice=7", f"lights.cpus={CPU}"])
+	assert topology == {"coordinator": {"cpus": [CPU], "nice": 7}, "display": {"nice": 10}, "lights": {"cpus": [CPU]}}
+
+
+def idle(event):
+	event.wait()
+
+
+def test_topology_is_applied_to_every_thread():
+	event = multiprocessing.Event()
+	process = multiprocessing.Process(target=idle, args=(event, ))
+	process.start()
+	try:
+		warnings = apply_topology({"lights": process.pid}, {"lights": {"cpus": [CPU], "nice": 3}, "display": {"nice": 1}})
+		assert warnings == ["display does not run in this simulation"]
+		assert os.sched_getaffinity(process.pid) == {CPU}
+		assert os.getpriority(os.PRIO_PROCESS, process.pid) == 3
+	finally:
+		event.set()
+		process.join()
+
+
+def test_percentiles():
+	values = list(range(1, 101))
+	assert percentile(values, 0.5) == 50
+	assert percentile(values, 0.99) == 99
+	assert percentile([], 0.5) == 0
+
+
+def test_tick_jitter_skips_missed_snapshots():
+	timestamps = {1: 0.0, 2: 0.010, 3: 0.021, 5: 0.040, 6: 0.049}
+	snapshots = [Snapshot(tick, tick, timestamp, b"") for tick, timestamp in timestamps.items()]
+	measures = tick_jitter(snapshots, 0.010)
+	assert measures["ticks"] == 3
+	assert measures["period_max_ms"] == pytest.approx(11)
+	assert measures["jitter_max_ms"] == pytest.approx(1)
+	assert measures["jitter_p50_ms"] == pytest.approx(1)
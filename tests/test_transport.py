@@ -0,0 +1,136 @@
+import multiprocessing
+
+import pytest
+
+from crossroad_simulation.Direction import Direction
+from crossroad_simulation.Simulation import Simulation
+from crossroad_simulation.SnapshotRing import SnapshotChannel
+from crossroad_simulation.TimeManager import TimeManager
+from crossroad_simulation.Transport import BACKENDS, LightsChannel, PipeTransport, TransportEmpty, TransportFull, create_transport
+from tests.helpers import differences, simulate
+
+LIGHTS = {direction: 0 for direction in Direction}
+ROADS = {direction: [] for direction in Direction}
+PRODUCERS = 3
+MESSAGES = 200  # Per producer
+MAX_MESSAGES = 100000  # Non-blocking sends after which a transport that never fills up fails the test
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def transport(request):
+	transport = create_transport(request.param)
+	yield transport
+	transport.remove()
+
+
+@pytest.fixture
+def pipe():
+	transport = PipeTransport()
+	yield transport
+	transport.remove()
+
+
+def test_messages_keep_their_order_and_boundaries(transport):
+	messages = [bytes([index]) * (index + 1) for index in range(10)]
+	for message in messages:
+		transport.send(message)
+	assert transport.depth() == len(messages)
+	assert [transport.receive() for _ in messages] == messages
+	assert transport.depth() == 0
+	with pytest.raises(TransportEmpty):
+		transport.receive(block=False)
+
+
+def produce(transport, producer):
+	for index in range(MESSAGES):
+		transport.send(f"{producer}:{index}".encode())
+
+
+def test_concurrent_producers(transport):
+	producers = [multiprocessing.Process(target=produce, args=(transport, producer)) for producer in range(PRODUCERS)]
+	for producer in producers:
+		producer.start()
+	received, depths = [], []
+	for _ in range(PRODUCERS * MESSAGES):
+		received.append(transport.receive().decode().split(":"))
+		depths.append(transport.depth())
+	for producer in producers:
+		producer.join()
+	# A message is counted before the receiver can take it
+	assert min(depths) >= 0
+	for producer in range(PRODUCERS):
+		assert [int(index) for source, index in received if source == str(producer)] == list(range(MESSAGES))
+
+
+def test_non_blocking_send_reports_a_full_transport(transport):
+	with pytest.raises(TransportFull):
+		for _ in range(MAX_MESSAGES):
+			transport.send(bytes(512), block=False)
+	depth = transport.depth()
+	assert depth > 0
+	for _ in range(depth):
+		transport.receive(block=False)
+	transport.send(bytes(512), block=False)
+	assert transport.depth() == 1
+
+
+def test_unknown_backend():
+	with pytest.raises(ValueError):
+		create_transport("carrier-pigeon")
+
+
+def publish_lights(channel, lights):
+	for direction, light in lights.items():
+		channel[direction] = light
+
+
+def test_lights_channel_reader_sees_the_latest_state():
+	transport = create_transport("pipe")
+	try:
+		reader = LightsChannel(transport, LIGHTS)
+		writer = multiprocessing.Process(target=publish_lights, args=(reader, {Direction.NORTH: 1, Direction.SOUTH: 1}))
+		writer.start()
+		writer.join()
+		assert reader.copy() == {**LIGHTS, Direction.NORTH: 1, Direction.SOUTH: 1}
+		assert reader[Direction.EAST] == 0
+	finally:
+		transport.remove()
+
+
+def test_pipe_reports_full_buffer_instead_of_blocking(pipe):
+	sent = 0
+	with pytest.raises(TransportFull):
+		while True:
+			pipe.send(bytes([sent % 256]) * 100, block=False)
+			sent += 1
+	assert pipe.depth() == sent
+	for index in range(sent):
+		assert pipe.receive(block=False) == bytes([index % 256]) * 100
+	assert pipe.depth() == 0
+	with pytest.raises(TransportEmpty):
+		pipe.receive(block=False)
+
+
+def test_snapshot_channel_without_reader_drops_snapshots(pipe):
+	channel = SnapshotChannel(pipe)
+	for tick in range(1, 2001):
+		channel.publish(tick, LIGHTS, ROADS)
+	accepted = pipe.depth()
+	assert 0 < accepted < 2000
+	assert channel.latest().tick == accepted
+	assert pipe.depth() == 0
+
+
+def test_headless_simulation_has_no_display_channel():
+	with multiprocessing.Manager() as manager:
+		simulation = Simulation(manager, TimeManager("afap", 0), display=False, transports={"display": "pipe"})
+		simulation.close()
+	assert simulation.coordinator.display_channel is None
+
+
+@pytest.mark.parametrize("backend", ["shm", "pipe", "unix"])
+def test_simulation_is_independent_of_the_backends(backend):
+	params = {"seed": 3, "priority_rate": 0}
+	reference = simulate(params, 500)
+	other = simulate(params, 500, transports={"vehicles": backend, "lights": backend})
+	assert differences(reference, other, 1, 480) == []